@@ -0,0 +1,83 @@
+"""Times the solvers over generated networks of growing size.
+
+Usage: python benchmark.py [max_edges] [kind ...]
+
+Each case runs in its own worker process, so the peak memory reported is
+the one of that case alone. Cases taking longer than TIMEOUT seconds are
+stopped and reported as such. The run fails once every case is reported
+if any of them did not converge.
+"""
+import resource
+import sys
+from multiprocessing import Pool, TimeoutError
+from time import time
+
+from hydraulics import network_generator
+from hydraulics.solvers import UserSolver, RemoteNozzleSolver
+
+SIZES = (10, 100, 1000, 10000, 100000)
+TIMEOUT = 600
+
+
+def run_case(case):
+    kind, edge_count, solver_name = case
+    source = 'input' if solver_name == 'remote' else 'reservoir'
+    started = time()
+    network = network_generator.build(kind, edge_count, source)
+    build_time = time() - started
+    if solver_name == 'remote':
+        solver = RemoteNozzleSolver(network, collect_stats=True)
+    else:
+        solver = UserSolver(network, collect_stats=True)
+    started = time()
+    try:
+        solver.solve_system()
+        status = 'converged' if solver.stats.converged else 'not converged'
+    except Exception as error:
+        status = type(error).__name__
+    solve_time = time() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (kind, solver_name, len(network.get_edges()), build_time,
+            solve_time, solver.stats.iterations, peak_kb / 1024., status)
+
+
+def cases(max_edges, kinds):
+    for kind in kinds:
+        solver_names = ['user']
+        if kind in ('tree', 'grid'):
+            solver_names.append('remote')
+        for size in SIZES:
+            if size > max_edges:
+                break
+            for solver_name in solver_names:
+                yield kind, size, solver_name
+
+
+def main(argv):
+    max_edges = int(argv[1]) if len(argv) > 1 else 10000
+    kinds = argv[2:] or network_generator.KINDS
+    print "%-10s %-6s %7s %9s %9s %5s %9s  %s" % (
+        'kind', 'solver', 'edges', 'build s', 'solve s', 'iter', 'peak MB',
+        'status')
+    pool = Pool(1, maxtasksperchild=1)
+    failed = []
+    for case in cases(max_edges, kinds):
+        try:
+            result = pool.apply_async(run_case, (case,)).get(TIMEOUT)
+            print "%-10s %-6s %7d %9.3f %9.3f %5s %9.1f  %s" % result
+            if result[-1] != 'converged':
+                failed.append(case)
+        except TimeoutError:
+            pool.terminate()
+            pool = Pool(1, maxtasksperchild=1)
+            kind, edge_count, solver_name = case
+            print "%-10s %-6s %7d  timed out after %d s" % (
+                kind, solver_name, edge_count, TIMEOUT)
+            failed.append(case)
+        sys.stdout.flush()
+    pool.close()
+    assert not failed, 'Cases not converged: %s' % failed
+
+
+if __name__ == '__main__':
+    main(sys.argv)
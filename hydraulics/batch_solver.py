@@ -0,0 +1,267 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+import physics
+from compiled_network import CompiledNetwork
+from edges import Pipe
+from solvers import Solver, sparse_factor
+
+
+class BatchResults(object):
+    """
+    Solution of every scenario of a :class:`BatchSolver` run. Rows are
+    scenarios, columns follow the network's nodes or edges. Energies and
+    pressures are in psi, flows in gpm
+    """
+    def __init__(self, energies, elevations, flows, converged, iterations):
+        self.energies = energies
+        self.pressures = energies - elevations
+        self.flows = flows
+        self.converged = converged
+        self.iterations = iterations
+
+    @property
+    def scenario_count(self):
+        return len(self.energies)
+
+    def get_pressures(self, unit):
+        return physics.Pressure.convert(self.pressures, 'psi', unit)
+
+    def get_flows(self, unit):
+        return physics.VolFlow.convert(self.flows, 'gpm', unit)
+
+
+class BatchSolver(object):
+    """
+    Solves many scenarios sharing the topology of a :class:`PNetwork` at
+    once, stacking them into array shaped newton updates. The scenarios
+    only differ in the parameters given to :func:`solve`; the network's
+    nodes and edges are left untouched
+    """
+    MAX_ITERATIONS = 35
+    # Residual (gpm) under which a scenario has converged
+    TOLERANCE = 1e-4
+
+    def __init__(self, network, sparse=None):
+        if not CompiledNetwork.supports(network):
+            raise TypeError('Only pipe and nozzle networks can be batched')
+        self.network = network
+        self.compiled = CompiledNetwork(network)
+        self._sparse = sparse
+
+    def solve(self, scenario_count=None, elevations=None, pressures=None,
+              demands=None, k_factors=None, c_coefficients=None,
+              elevation_unit='m', pressure_unit='psi', flow_unit='gpm',
+              k_unit='gpm/psi^0.5'):
+        """
+        Solves every scenario. Each parameter is either None, to keep the
+        network's current value, or an array whose rows are scenarios
+        :param elevations: elevation of every node
+        :param pressures: pressure of every fixed (not connection) node
+        :param demands: output flow of every node
+        :param k_factors: factor of every nozzle, in edge order
+        :param c_coefficients: Hazen-Williams coefficient of every pipe, in
+            edge order
+        :rtype: BatchResults
+        """
+        compiled = self.compiled
+        compiled.refresh()
+        parameters = (elevations, pressures, demands, k_factors,
+                      c_coefficients)
+        count = self._scenario_count(scenario_count, parameters)
+        pipes = compiled.pipe_indexes
+        nozzles = compiled.nozzle_indexes
+        length_factor = physics.Length.factor(elevation_unit, 'm') * \
+            physics.Pressure.factor('mH2O', 'psi')
+        elevation = self._stack(elevations, count, compiled.elevation,
+                                length_factor)
+        base_pressure = compiled.energies - compiled.elevation
+        pressure_factor = physics.Pressure.factor(pressure_unit, 'psi')
+        pressure = self._stack(pressures, count, base_pressure,
+                               pressure_factor)
+        demand = self._stack(demands, count, compiled.demand,
+                             physics.VolFlow.factor(flow_unit, 'gpm'))
+        coefficient = np.tile(compiled.coefficient, (count, 1))
+        k_factor = physics.NozzleK.factor(k_unit, 'gpm/psi^0.5')
+        coefficient[:, nozzles] = self._stack(
+            k_factors, count, compiled.coefficient[nozzles], k_factor)
+        if c_coefficients is not None:
+            base_c = np.array([self.network.edge_at(index).get_c_coefficient()
+                               for index in pipes], dtype=float)
+            c_ratio = base_c / self._stack(c_coefficients, count, base_c, 1)
+            coefficient[:, pipes] *= c_ratio ** Pipe.C_POWER
+        energies = elevation + pressure
+        self._first_guess(energies, coefficient, demand)
+        converged, iterations = self._iterate(energies, coefficient, demand)
+        flows = compiled.edge_flows(energies, coefficient)
+        return BatchResults(energies, elevation, flows, converged, iterations)
+
+    @staticmethod
+    def _scenario_count(scenario_count, parameters):
+        if scenario_count is not None:
+            return scenario_count
+        for parameter in parameters:
+            if parameter is not None and np.ndim(parameter) == 2:
+                return len(parameter)
+        return 1
+
+    @staticmethod
+    def _stack(values, count, default, factor):
+        if values is None:
+            return np.tile(default, (count, 1))
+        values = np.asarray(values, dtype=float) * factor
+        return np.array(np.broadcast_to(values, (count, len(default))))
+
+    def _first_guess(self, energies, coefficient, demand):
+        """
+        Sets the active energies of every scenario following
+        :func:`Solver.linearized_guess`. Scenarios whose linear system is
+        singular keep the point they reached
+        """
+        compiled = self.compiled
+        active = compiled.active_indexes
+        fixed = np.flatnonzero(~compiled.active)
+        low = np.zeros([len(energies), 1])
+        high = np.zeros([len(energies), 1])
+        if len(fixed):
+            low[:, 0] = energies[:, fixed].min(axis=1)
+            high[:, 0] = energies[:, fixed].max(axis=1)
+        energies[:, active] = (low + high) / 2
+        reference = np.where(high > low, (high - low) / 2, 1.)
+        linear_floor = reference
+        for _ in range(Solver.GUESS_PASSES):
+            flows, slopes = compiled.linear_flows_and_slopes(
+                linear_floor, energies, coefficient)
+            f_results = compiled.active_balance(flows, demand)
+            values = compiled.jacobian_values(slopes)
+            delta, _ = self._newton_delta(values, f_results)
+            energies[:, active] += delta
+            linear_floor = reference * 1e-3
+
+    def _iterate(self, energies, coefficient, demand):
+        """
+        Newton iterations over the pending scenarios, damped scenario by
+        scenario like :func:`Solver._damped_step`. Scenarios whose jacobian
+        turns singular or whose balances stop being finite are dropped, the
+        latter keeping their last finite energies
+        :return: convergence of every scenario and the iterations taken
+        """
+        compiled = self.compiled
+        active = compiled.active_indexes
+        count = len(energies)
+        converged = np.zeros(count, dtype=bool)
+        failed = np.zeros(count, dtype=bool)
+        flows, slopes = compiled.edge_flows_and_slopes(energies, coefficient)
+        f_results = compiled.active_balance(flows, demand)
+        residual = np.sum(np.abs(f_results), axis=1)
+        iteration = 0
+        while iteration < BatchSolver.MAX_ITERATIONS:
+            pending = np.flatnonzero(~converged & ~failed)
+            if not len(pending):
+                break
+            values = compiled.jacobian_values(slopes[pending])
+            delta, singular = self._newton_delta(values, f_results[pending])
+            failed[pending[singular]] = True
+            pending, delta = pending[~singular], delta[~singular]
+            start = energies[np.ix_(pending, active)]
+            self._damped_step(energies, coefficient, demand, pending, delta,
+                              residual[pending])
+            flows, slopes = compiled.edge_flows_and_slopes(energies,
+                                                           coefficient)
+            f_results = compiled.active_balance(flows, demand)
+            finished = residual[pending] < BatchSolver.TOLERANCE
+            residual = np.sum(np.abs(f_results), axis=1)
+            broken = ~np.isfinite(residual[pending])
+            energies[np.ix_(pending[broken], active)] = start[broken]
+            failed[pending[broken]] = True
+            converged[pending[finished & ~broken]] = True
+            iteration += 1
+        converged |= ~failed & (residual < BatchSolver.TOLERANCE)
+        return converged, iteration
+
+    def _damped_step(self, energies, coefficient, demand, pending, delta,
+                     residual):
+        """
+        Moves the pending scenarios along their newton steps, halved up to
+        MAX_BACKTRACKS times until their residual falls by
+        SUFFICIENT_DECREASE of the cut the linear model promises. Scenarios
+        that already converged take the whole step
+        :param residual: residual of every pending scenario before the step
+        """
+        compiled = self.compiled
+        active = compiled.active_indexes
+        start = energies[np.ix_(pending, active)]
+        energies[np.ix_(pending, active)] = start + delta
+        lengths = np.ones(len(pending))
+        trying = np.flatnonzero(residual >= BatchSolver.TOLERANCE)
+        for _ in range(Solver.MAX_BACKTRACKS):
+            if not len(trying):
+                break
+            scenarios = pending[trying]
+            flows = compiled.edge_flows(energies[scenarios],
+                                        coefficient[scenarios])
+            trial = np.sum(np.abs(compiled.active_balance(
+                flows, demand[scenarios])), axis=1)
+            with np.errstate(invalid='ignore'):
+                short = ~(trial <= (1 - Solver.SUFFICIENT_DECREASE *
+                                    lengths[trying]) * residual[trying])
+            trying = trying[short]
+            lengths[trying] /= 2
+            energies[np.ix_(pending[trying], active)] = (
+                start[trying] + lengths[trying, np.newaxis] * delta[trying])
+
+    def _is_sparse(self, count):
+        if self._sparse is None:
+            return count * self.compiled.size > Solver.SPARSE_THRESHOLD
+        return self._sparse
+
+    def _newton_delta(self, values, f_results):
+        """
+        Solves the newton step of every scenario given, all at once and, if
+        that fails, one by one
+        :return: the steps and a mask of the scenarios whose jacobian is
+            singular, whose steps are left at zero
+        """
+        count, size = f_results.shape
+        try:
+            delta = self._stacked_delta(values, f_results)
+            if np.isfinite(delta).all():
+                return delta, np.zeros(count, dtype=bool)
+        except Solver.SINGULAR_ERRORS:
+            pass
+        delta = np.zeros([count, size])
+        singular = np.ones(count, dtype=bool)
+        for scenario in range(count):
+            try:
+                step = self._stacked_delta(values[scenario:scenario + 1],
+                                           f_results[scenario:scenario + 1])
+            except Solver.SINGULAR_ERRORS:
+                continue
+            if np.isfinite(step).all():
+                delta[scenario] = step[0]
+                singular[scenario] = False
+        return delta, singular
+
+    def _stacked_delta(self, values, f_results):
+        """
+        Solves the newton step of every scenario given, either as one block
+        diagonal sparse system or as a stack of dense ones
+        """
+        rows, cols, _ = self.compiled.jacobian_pattern()
+        count, size = f_results.shape
+        if self._is_sparse(count):
+            offsets = size * np.arange(count).reshape(count, 1)
+            shape = (count * size, count * size)
+            jacobian = scipy.sparse.coo_matrix(
+                (values.ravel(), ((rows + offsets).ravel(),
+                                  (cols + offsets).ravel())), shape=shape)
+            factor = sparse_factor(scipy.sparse.linalg.splu,
+                                   jacobian.tocsc())
+            delta = factor.solve(f_results.ravel())
+            return -np.reshape(delta, (count, size))
+        jacobian = np.zeros([count, size, size])
+        scenarios = np.arange(count).reshape(count, 1)
+        np.add.at(jacobian, (scenarios, rows, cols), values)
+        delta = np.linalg.solve(jacobian, f_results[..., np.newaxis])
+        return -delta[..., 0]
@@ -0,0 +1,179 @@
+import unittest
+
+import numpy as np
+
+import network_generator
+from batch_solver import BatchSolver
+from edges import Pipe, Nozzle
+from eductor import Eductor
+from nodes import ConnectionNode, EndNode
+from pipe_network import PNetwork
+from solvers import UserSolver
+
+
+class BatchSolverTests(unittest.TestCase):
+    def setUp(self):
+        self.network = PNetwork()
+        elevations = [100, 85, 65, 65, 70, 70]
+        for index in range(6):
+            cur_node = EndNode() if index < 4 else ConnectionNode()
+            cur_node.set_elevation(elevations[index], 'm')
+            cur_node.name = index
+            self.network.add_node(cur_node)
+        lengths = [1000, 1200, 900, 500, 600]
+        inner_diameters = [10.02, 7.981, 7.981, 6.065, 6.065]
+        for index in range(5):
+            cur_pipe = Pipe()
+            cur_pipe.set_length(lengths[index], 'm')
+            cur_pipe.set_inner_diam(inner_diameters[index], 'in')
+            cur_pipe.set_c_coefficient(100)
+            self.network.add_edge(cur_pipe)
+        for edge, up_node, down_node in ((2, 4, 5), (1, 1, 4), (0, 0, 4),
+                                         (3, 5, 2), (4, 5, 3)):
+            self.network.connect_node_downstream_edge(up_node, edge)
+            self.network.connect_node_upstream_edge(down_node, edge)
+
+    def solve_single(self):
+        for node in self.network.get_nodes()[4:]:
+            node.set_pressure(0, 'psi')
+        UserSolver(self.network).solve_system()
+        pressures = [node.get_pressure('psi')
+                     for node in self.network.get_nodes()]
+        flows = [edge.get_vol_flow('gpm') for edge in self.network.get_edges()]
+        return pressures, flows
+
+    def assert_scenario(self, results, scenario, pressures, flows):
+        self.assertTrue(results.converged[scenario])
+        for cont in range(len(pressures)):
+            self.assertAlmostEqual(results.pressures[scenario][cont],
+                                   pressures[cont], 3)
+        for cont in range(len(flows)):
+            self.assertAlmostEqual(results.flows[scenario][cont],
+                                   flows[cont], 2)
+
+    def test_dead_end_stub(self):
+        stub = ConnectionNode()
+        stub.set_elevation(70, 'm')
+        self.network.add_node(stub)
+        cur_pipe = Pipe()
+        cur_pipe.set_length(50, 'm')
+        cur_pipe.set_inner_diam(2.067, 'in')
+        cur_pipe.set_c_coefficient(100)
+        self.network.add_edge(cur_pipe)
+        self.network.connect_node_downstream_edge(5, 5)
+        self.network.connect_node_upstream_edge(6, 5)
+        results = BatchSolver(self.network).solve()
+        pressures = [0, 0, 0, 0, 27.4694, 6.39082, 6.39082]
+        test_flows = [1041.6261, -318.1786, 723.44747, 379.51588, 343.9316, 0]
+        self.assert_scenario(results, 0, pressures, test_flows)
+
+    def test_symmetric_ring(self):
+        network = network_generator.multi_reservoir(1, 5)
+        results = BatchSolver(network).solve()
+        UserSolver(network).solve_system()
+        pressures = [node.get_pressure('psi') for node in network.get_nodes()]
+        flows = [edge.get_vol_flow('gpm') for edge in network.get_edges()]
+        self.assert_scenario(results, 0, pressures, flows)
+
+    def test_default_scenario_matches_user_solver(self):
+        results = BatchSolver(self.network).solve()
+        self.assertEqual(results.scenario_count, 1)
+        test_flows = [1041.6261, -318.1786, 723.44747, 379.51588, 343.9316]
+        test_press = [0, 0, 0, 0, 27.4694, 6.39082]
+        self.assert_scenario(results, 0, test_press, test_flows)
+        self.assertAlmostEqual(results.get_pressures('kPa')[0][4],
+                               27.4694 * 6.894757, 2)
+        self.assertAlmostEqual(results.get_flows('lpm')[0][0],
+                               1041.6261 * 3.785411, 1)
+
+    def test_elevation_scenarios(self):
+        elevations = np.array([[100, 85, 65, 65, 70, 70],
+                               [110, 85, 60, 65, 70, 72],
+                               [95, 90, 65, 55, 70, 70]])
+        results = BatchSolver(self.network).solve(elevations=elevations)
+        for scenario in range(3):
+            for index in range(6):
+                self.network.node_at(index).set_elevation(
+                    elevations[scenario][index], 'm')
+            pressures, flows = self.solve_single()
+            self.assert_scenario(results, scenario, pressures, flows)
+
+    def test_sparse_and_dense_agree(self):
+        c_coefficients = [[100] * 5, [120] * 5, [90, 100, 110, 120, 130]]
+        dense = BatchSolver(self.network, sparse=False).solve(
+            c_coefficients=c_coefficients)
+        sparse = BatchSolver(self.network, sparse=True).solve(
+            c_coefficients=c_coefficients)
+        self.assertTrue(np.allclose(dense.energies, sparse.energies))
+        for cont in range(5):
+            self.network.edge_at(cont).set_c_coefficient(
+                c_coefficients[2][cont])
+            self.network.edge_at(cont).k_pipe = None
+        pressures, flows = self.solve_single()
+        self.assert_scenario(dense, 2, pressures, flows)
+
+    def test_nozzle_factors_and_demands(self):
+        nozzle_end = EndNode()
+        nozzle_end.set_elevation(70, 'm')
+        self.network.add_node(nozzle_end)
+        nozzle = Nozzle()
+        nozzle.set_factor(20, 'gpm/psi^0.5')
+        self.network.add_edge(nozzle)
+        self.network.connect_node_downstream_edge(4, 5)
+        self.network.connect_node_upstream_edge(6, 5)
+        demands = np.zeros([2, 7])
+        demands[1][5] = 100
+        results = BatchSolver(self.network).solve(k_factors=[[20], [30]],
+                                                  demands=demands)
+        nozzle.set_factor(30, 'gpm/psi^0.5')
+        self.network.node_at(5).set_output_flow(100, 'gpm')
+        pressures, flows = self.solve_single()
+        self.assert_scenario(results, 1, pressures, flows)
+
+    def test_steps_are_damped(self):
+        network = network_generator.multi_reservoir(3, 10, 35.4)
+        elevations = [234.2, 104.0, 202.4, 151.1, 12.2, 63.6, 196.9, 3.5,
+                      11.7, 80.2, 144.2, 0.7, 293.6]
+        c_coefficients = [61.8, 63.5, 136.4, 50.0, 62.3, 129.0, 102.5, 90.9,
+                          123.0, 149.5, 73.8, 96.5, 23.7]
+        results = BatchSolver(network).solve(elevations=[elevations],
+                                             c_coefficients=[c_coefficients])
+        for node, elevation in zip(network.get_nodes(), elevations):
+            node.set_elevation(elevation, 'm')
+        for edge, c_coefficient in zip(network.get_edges(), c_coefficients):
+            edge.set_c_coefficient(c_coefficient)
+            edge.k_pipe = None
+        UserSolver(network).solve_system()
+        pressures = [node.get_pressure('psi') for node in network.get_nodes()]
+        flows = [edge.get_vol_flow('gpm') for edge in network.get_edges()]
+        self.assert_scenario(results, 0, pressures, flows)
+
+    def test_singular_scenarios_are_left_out(self):
+        stub = ConnectionNode()
+        stub.set_elevation(70, 'm')
+        self.network.add_node(stub)
+        cur_pipe = Pipe()
+        cur_pipe.set_length(50, 'm')
+        cur_pipe.set_inner_diam(2.067, 'in')
+        cur_pipe.set_c_coefficient(100)
+        self.network.add_edge(cur_pipe)
+        self.network.connect_node_downstream_edge(5, 5)
+        self.network.connect_node_upstream_edge(6, 5)
+        for sparse in (False, True):
+            with np.errstate(divide='ignore'):
+                results = BatchSolver(self.network, sparse=sparse).solve(
+                    c_coefficients=[[100] * 6, [100] * 5 + [0]])
+            self.assertFalse(results.converged[1])
+            pressures = [0, 0, 0, 0, 27.4694, 6.39082, 6.39082]
+            test_flows = [1041.6261, -318.1786, 723.44747, 379.51588,
+                          343.9316, 0]
+            self.assert_scenario(results, 0, pressures, test_flows)
+
+    def test_eductor_networks_are_rejected(self):
+        self.network.add_edge(Eductor())
+        with self.assertRaises(TypeError):
+            BatchSolver(self.network)
+
+
+if __name__ == '__main__':
+    unittest.main()
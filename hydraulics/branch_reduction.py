@@ -0,0 +1,399 @@
+"""Reduction of sprinkler branch lines to equivalent emitters.
+
+A branch line is a run of pipes hanging from a node of the network, with
+a nozzle discharging at every node along the run and nothing else attached
+to it. Seen from the node it hangs from, the whole line behaves as a single
+emitter Q = K_eq * P^0.5, whose K_eq drifts with the pressure P because of
+the pipe losses along the line. :class:`BranchReducer` replaces every line
+by a :class:`TabulatedNozzle` carrying that curve, computed once for every
+distinct :func:`branch_signature`, solves the smaller network and writes
+the energies and flows back onto the original one.
+
+"""
+from bisect import bisect_right
+from math import log, sqrt
+
+import physics
+from edges import Nozzle, Pipe
+from nodes import ConnectionNode, EndNode, InputNode
+from pipe_network import PNetwork
+from tabulated_nozzle import FactorTable, TabulatedNozzle
+
+
+class BranchCharacteristic(object):
+    """
+    Flow entering a branch line against the pressure at the node it hangs
+    from. The line is traced back from the pressure at its last node
+    (the one at its far end), the one parameter that fixes every flow
+    along it. All the energies are taken relative to the elevation of the
+    node the line hangs from
+    """
+    # Span, in psi above the opening of the last nozzle, the table is
+    # traced over
+    LOWEST_HEAD = 1e-3
+    HIGHEST_HEAD = 1e4
+    POINTS_PER_DECADE = 20
+    MAX_STEPS = 100
+
+    def __init__(self, segments):
+        """
+        :param segments: for every node of the line, starting next to the
+            node it hangs from: pipe coefficient (:func:`Pipe.k_flow`),
+            nozzle factor (gpm/psi^0.5), node and nozzle outlet elevations
+            (psi) and the nozzle required pressure (psi) or None
+        """
+        self.segments = segments
+        # Heads the points of the table were traced from
+        self._heads = []
+        self.table = self._build_table()
+        self.required_pressure = self._find_required_pressure()
+
+    def trace(self, head):
+        """
+        Runs the line back from its far end
+        :param head: pressure over the opening of the last nozzle, psi
+        :return: pressure at the node the line hangs from, flow entering
+            the line, their derivatives with respect to head and the
+            energies of the line nodes
+        """
+        energy = head + self.segments[-1][3]
+        energy_slope = 1.
+        flow = flow_slope = 0.
+        energies = [0.] * len(self.segments)
+        for position in range(len(self.segments) - 1, -1, -1):
+            k_pipe, k_factor, _, outlet, _ = self.segments[position]
+            energies[position] = energy
+            nozzle_head = energy - outlet
+            if nozzle_head > 0:
+                root = sqrt(nozzle_head)
+                flow += k_factor * root
+                flow_slope += 0.5 * k_factor / root * energy_slope
+            energy += k_pipe * flow ** Pipe.C_POWER
+            energy_slope += (Pipe.C_POWER * k_pipe *
+                             flow ** (Pipe.C_POWER - 1) * flow_slope)
+        return energy, flow, energy_slope, flow_slope, energies
+
+    def _build_table(self):
+        log_pressures, log_factors, slopes = [], [], []
+        decades = log(self.HIGHEST_HEAD / self.LOWEST_HEAD, 10)
+        count = int(decades * self.POINTS_PER_DECADE) + 1
+        for point in range(count):
+            head = self.LOWEST_HEAD * 10 ** (float(point) /
+                                             self.POINTS_PER_DECADE)
+            pressure, flow, pressure_slope, flow_slope, _ = self.trace(head)
+            if pressure <= 0 or flow <= 0:
+                continue
+            if log_pressures and log(pressure) <= log_pressures[-1]:
+                continue
+            self._heads.append(head)
+            log_pressures.append(log(pressure))
+            log_factors.append(log(flow) - 0.5 * log(pressure))
+            slopes.append(pressure * flow_slope / (flow * pressure_slope) -
+                          0.5)
+        return FactorTable(log_pressures, log_factors, slopes)
+
+    def _find_head(self, pressure):
+        """
+        Head over the last nozzle opening that leaves the given pressure
+        at the node the line hangs from, by newton safeguarded with
+        bisection
+        """
+        heads = self._heads
+        index = 0
+        if pressure > 0:
+            index = bisect_right(self.table.log_pressures, log(pressure))
+        low = heads[index - 1] if index else 0.
+        high = heads[index] if index < len(heads) else self.HIGHEST_HEAD
+        while self.trace(high)[0] < pressure:
+            low, high = high, 10 * high
+        head = 0.5 * (low + high)
+        for _ in range(self.MAX_STEPS):
+            deviation, _, slope, _, _ = self.trace(head)
+            deviation -= pressure
+            if deviation > 0:
+                high = head
+            else:
+                low = head
+            if abs(deviation) < 1e-12 * max(1., pressure):
+                break
+            head -= deviation / slope
+            if not low < head < high:
+                head = 0.5 * (low + high)
+        return head
+
+    def energies_at(self, pressure):
+        """
+        Energies of the line nodes, relative to the elevation of the node
+        it hangs from, when that node stands at the given pressure (psi)
+        :rtype: list
+        """
+        if pressure <= self.trace(0)[0]:
+            return self.trace(0)[4]
+        return self.trace(self._find_head(pressure))[4]
+
+    def _lowest_ratio(self, head):
+        energies = self.trace(head)[4]
+        return min((energies[position] - segment[2]) / segment[4]
+                   for position, segment in enumerate(self.segments))
+
+    def _find_required_pressure(self):
+        """
+        Pressure at the node the line hangs from leaving every nozzle at
+        least at its required pressure, None when a nozzle lacks it
+        """
+        for segment in self.segments:
+            if not segment[4]:
+                return None
+        low, high = 0., self.HIGHEST_HEAD
+        while self._lowest_ratio(high) < 1:
+            low, high = high, 10 * high
+        for _ in range(self.MAX_STEPS):
+            head = 0.5 * (low + high)
+            if self._lowest_ratio(head) < 1:
+                low = head
+            else:
+                high = head
+        return self.trace(high)[0]
+
+
+def branch_signature(pipes, nozzles, nodes, attach_node):
+    """
+    What makes two branch lines behave alike: length (m), inner diameter
+    (in) and C coefficient of every pipe, factor (gpm/psi^0.5) and required
+    pressure (psi) of every nozzle and the elevations (m) of every node and
+    nozzle outlet over the node the line hangs from
+    :rtype: tuple
+    """
+    base = attach_node.get_elevation('m')
+    signature = []
+    for pipe, nozzle, node in zip(pipes, nozzles, nodes):
+        signature.append((pipe.get_length('m'), pipe.get_inner_diam('in'),
+                          pipe.get_c_coefficient(),
+                          nozzle.get_factor('gpm/psi^0.5'),
+                          _required_pressure(nozzle),
+                          node.get_elevation('m') - base,
+                          nozzle.output_node.get_elevation('m') - base))
+    return tuple(signature)
+
+
+def _required_pressure(nozzle):
+    try:
+        return nozzle.get_required_pressure('psi')
+    except AttributeError:
+        return None
+
+
+class BranchLine(object):
+    """
+    A branch line of a network, given by indexes: the node it hangs from
+    and, from there outwards, its pipes, nodes and nozzles
+    """
+    def __init__(self, attach_index, pipe_indexes, node_indexes,
+                 nozzle_indexes):
+        self.attach_index = attach_index
+        self.pipe_indexes = pipe_indexes
+        self.node_indexes = node_indexes
+        self.nozzle_indexes = nozzle_indexes
+        self.signature = None
+
+
+class BranchReducer(object):
+    """
+    Builds the reduced version of a network, where every branch line is a
+    :class:`TabulatedNozzle`, and expands the solution of the reduced
+    network back onto the original one. The characteristics are kept by
+    signature, so repeated lines, and later reductions by the same reducer,
+    trace each layout only once
+    """
+    def __init__(self, network):
+        # type: (PNetwork) -> None
+        self.network = network
+        self.characteristics = {}
+        self.branches = []
+        self.reduced = None
+        self.converged = None
+        self.status = None
+        self.fell_back = False
+        self._clones = None
+
+    def find_branches(self):
+        """
+        :rtype: list of :class:`BranchLine`
+        """
+        nodes = self.network.get_nodes()
+        line_nozzles = dict((node, _line_nozzle(node)) for node in nodes)
+        branches = []
+        for tail in nodes:
+            if line_nozzles[tail] is None or len(_node_pipes(tail)) != 1:
+                continue
+            line_nodes, pipes = [tail], []
+            pipe = _node_pipes(tail)[0]
+            node = _other_end(pipe, tail)
+            while (line_nozzles[node] is not None and
+                   len(_node_pipes(node)) == 2):
+                pipes.append(pipe)
+                line_nodes.append(node)
+                pipe = [each for each in _node_pipes(node)
+                        if each is not pipe][0]
+                node = _other_end(pipe, node)
+            pipes.append(pipe)
+            if line_nozzles[node] is not None or \
+                    not isinstance(node, ConnectionNode):
+                continue
+            line_nodes.reverse()
+            pipes.reverse()
+            branches.append(BranchLine(
+                self.network.get_node_index(node),
+                [self.network.get_edge_index(each) for each in pipes],
+                [self.network.get_node_index(each) for each in line_nodes],
+                [self.network.get_edge_index(line_nozzles[each])
+                 for each in line_nodes]))
+        return branches
+
+    def characteristic(self, branch):
+        """
+        The characteristic of a branch line, traced only when no line with
+        the same signature was traced before
+        :rtype: BranchCharacteristic
+        """
+        network = self.network
+        pipes = [network.edge_at(index) for index in branch.pipe_indexes]
+        nozzles = [network.edge_at(index) for index in branch.nozzle_indexes]
+        nodes = [network.node_at(index) for index in branch.node_indexes]
+        attach_node = network.node_at(branch.attach_index)
+        branch.signature = branch_signature(pipes, nozzles, nodes,
+                                            attach_node)
+        if branch.signature not in self.characteristics:
+            segments = []
+            for pipe, nozzle, values in zip(pipes, nozzles,
+                                            branch.signature):
+                segments.append((pipe.k_flow(),
+                                 nozzle.get_factor('gpm/psi^0.5'),
+                                 values[5] * physics.WMETER_TO_PSI,
+                                 values[6] * physics.WMETER_TO_PSI,
+                                 values[4]))
+            self.characteristics[branch.signature] = \
+                BranchCharacteristic(segments)
+        return self.characteristics[branch.signature]
+
+    def reduce(self):
+        """
+        Builds the reduced network: copies of every node and edge outside
+        the branch lines, in their original order, followed by an outlet
+        node and a :class:`TabulatedNozzle` for every line
+        :rtype: PNetwork
+        """
+        network = self.network
+        self.branches = self.find_branches()
+        left_out = set()
+        for branch in self.branches:
+            left_out.update(network.node_at(index)
+                            for index in branch.node_indexes)
+            left_out.update(network.edge_at(index) for index in
+                            branch.pipe_indexes + branch.nozzle_indexes)
+            left_out.update(network.edge_at(index).output_node
+                            for index in branch.nozzle_indexes)
+        reduced, clones = network.copy_without(left_out)
+        for branch in self.branches:
+            characteristic = self.characteristic(branch)
+            attach_node = clones[network.node_at(branch.attach_index)]
+            outlet = EndNode()
+            outlet.set_elevation(attach_node.get_elevation('m'), 'm')
+            reduced.add_node(outlet)
+            nozzle = TabulatedNozzle(characteristic.table)
+            if characteristic.required_pressure is not None:
+                nozzle.set_required_pressure(
+                    characteristic.required_pressure, 'psi')
+            reduced.add_edge(nozzle)
+            edge_index = len(reduced.get_edges()) - 1
+            reduced.connect_node_downstream_edge(
+                reduced.get_node_index(attach_node), edge_index)
+            reduced.connect_node_upstream_edge(
+                len(reduced.get_nodes()) - 1, edge_index)
+        self._clones = clones
+        self.reduced = reduced
+        return reduced
+
+    def expand(self):
+        """
+        Writes the energies found on the reduced network back onto the
+        original one, traces every branch line from the pressure at the
+        node it hangs from and updates the flow of every edge
+        """
+        network = self.network
+        for node in network.get_nodes():
+            clone = self._clones.get(node)
+            if clone is None:
+                continue
+            if isinstance(node, ConnectionNode):
+                node.set_energy(clone.get_energy('psi'), 'psi')
+            if isinstance(node, InputNode):
+                node.set_output_flow(clone.get_output_flow('gpm'), 'gpm')
+        for branch in self.branches:
+            attach_node = network.node_at(branch.attach_index)
+            base = attach_node.get_elevation('m') * physics.WMETER_TO_PSI
+            characteristic = self.characteristics[branch.signature]
+            energies = characteristic.energies_at(
+                attach_node.get_energy('psi') - base)
+            for index, energy in zip(branch.node_indexes, energies):
+                network.node_at(index).set_energy(base + energy, 'psi')
+        for edge in network.get_edges():
+            edge.calculate_gpm_flow()
+
+    def solve(self, solver_class, **options):
+        """
+        Reduces the network, solves it with a solver of the given class and
+        expands the solution. When the reduced solve fails, as it may where
+        steep characteristics stall the iterations, the original network
+        is solved instead and :attr:`fell_back` is set.
+        :attr:`converged` and :attr:`status` tell how the last solve ended
+        :param options: keyword arguments for the solver
+        :return: the solver, holding the reduced network or, after falling
+            back, the original one
+        """
+        solver = solver_class(self.reduce(), **options)
+        self.converged = solver.solve_system()
+        self.status = solver.status
+        self.fell_back = not self.converged
+        if self.converged:
+            self.expand()
+            return solver
+        solver = solver_class(self.network, **options)
+        self.converged = solver.solve_system()
+        self.status = solver.status
+        return solver
+
+
+def _node_pipes(node):
+    return [pipe for pipe in
+            list(node.get_input_pipes()) + list(node.get_output_pipes())
+            if isinstance(pipe, Pipe)]
+
+
+def _other_end(edge, node):
+    return edge.input_node if edge.output_node is node else edge.output_node
+
+
+def _line_nozzle(node):
+    """
+    The nozzle of a node that can be part of a branch line: a node without
+    demand holding up to two pipes and a single nozzle, which is the only
+    edge of its outlet. None for any other node
+    """
+    if not isinstance(node, ConnectionNode) or isinstance(node, InputNode):
+        return None
+    edges = list(node.get_input_pipes()) + list(node.get_output_pipes())
+    nozzles = [edge for edge in edges if isinstance(edge, Nozzle)]
+    pipes = _node_pipes(node)
+    if len(nozzles) != 1 or len(nozzles) + len(pipes) != len(edges):
+        return None
+    nozzle = nozzles[0]
+    if isinstance(nozzle, TabulatedNozzle) or nozzle.input_node is not node:
+        return None
+    outlet = nozzle.output_node
+    if len(outlet.get_input_pipes()) + len(outlet.get_output_pipes()) != 1:
+        return None
+    if not 0 < len(pipes) <= 2 or node.get_output_flow('gpm'):
+        return None
+    return nozzle
+
@@ -0,0 +1,125 @@
+import unittest
+from math import sqrt
+
+import numpy as np
+
+import network_generator
+from branch_reduction import BranchReducer
+from compiled_network import CompiledNetwork
+from solvers import UserSolver, RemoteNozzleSolver, TreeSolver
+from tabulated_nozzle import TabulatedNozzle
+
+
+class BranchReductionTests(unittest.TestCase):
+    def assert_same_solution(self, network, expected, places=6):
+        for node, other in zip(network.get_nodes(), expected.get_nodes()):
+            self.assertAlmostEqual(node.get_energy('psi'),
+                                   other.get_energy('psi'), places)
+        for edge, other in zip(network.get_edges(), expected.get_edges()):
+            self.assertAlmostEqual(edge.get_vol_flow('gpm'),
+                                   other.get_vol_flow('gpm'), places)
+
+    def test_find_branches(self):
+        network = network_generator.sprinkler_tree(3, 4)
+        reducer = BranchReducer(network)
+        branches = reducer.find_branches()
+        self.assertEqual(len(branches), 3)
+        self.assertEqual(branches[0].attach_index, 1)
+        self.assertEqual(branches[0].node_indexes, [2, 4, 6, 8])
+        self.assertEqual(branches[0].pipe_indexes, [1, 3, 5, 7])
+        self.assertEqual(branches[0].nozzle_indexes, [2, 4, 6, 8])
+
+    def test_reduce(self):
+        network = network_generator.sprinkler_tree(3, 4)
+        reducer = BranchReducer(network)
+        reduced = reducer.reduce()
+        self.assertEqual(len(reducer.characteristics), 1)
+        self.assertEqual(len(reduced.get_nodes()), 1 + 3 + 3)
+        self.assertEqual(len(reduced.get_edges()), 1 + 2 + 3)
+        self.assertTrue(isinstance(reduced.edge_at(5), TabulatedNozzle))
+        self.assertTrue(reduced.is_connected())
+        self.assertFalse(CompiledNetwork.supports(reduced))
+        self.assertFalse(TreeSolver.supports(reduced))
+        self.assertEqual(len(network.get_edges()), 1 + 2 + 3 * 4 * 2)
+        self.assertEqual(len(network.node_at(1).get_output_pipes()), 2)
+
+    def test_characteristic(self):
+        reducer = BranchReducer(network_generator.sprinkler_tree(1, 5))
+        reducer.reduce()
+        characteristic = reducer.characteristics.values()[0]
+        for head in (0.3, 7, 45):
+            pressure, flow, _, _, _ = characteristic.trace(head)
+            k_factor = characteristic.table.factor(pressure)[0]
+            self.assertAlmostEqual(k_factor * sqrt(pressure), flow, 6)
+        energies = characteristic.energies_at(
+            characteristic.required_pressure)
+        self.assertAlmostEqual(min(energies),
+                               network_generator.REQUIRED_PRESSURE)
+
+    def test_reservoir_tree(self):
+        network = network_generator.sprinkler_tree(6, 8)
+        expected = network_generator.sprinkler_tree(6, 8)
+        reducer = BranchReducer(network)
+        reducer.solve(UserSolver)
+        self.assertTrue(reducer.converged)
+        self.assertEqual(reducer.status, 'converged')
+        UserSolver(expected).solve_system()
+        self.assert_same_solution(network, expected)
+
+    def test_failed_solve_falls_back(self):
+        class ReducedNanGuessSolver(UserSolver):
+            def first_guess(self):
+                if not any(isinstance(edge, TabulatedNozzle)
+                           for edge in self.network.get_edges()):
+                    return UserSolver.first_guess(self)
+                guess = np.full([self.size, 1], float('nan'))
+                self._update_energies(guess)
+                return guess
+        network = network_generator.sprinkler_tree(2, 3)
+        expected = network_generator.sprinkler_tree(2, 3)
+        reducer = BranchReducer(network)
+        solver = reducer.solve(ReducedNanGuessSolver)
+        self.assertTrue(reducer.fell_back)
+        self.assertTrue(reducer.converged)
+        self.assertEqual(reducer.status, 'converged')
+        self.assertTrue(solver.network is network)
+        UserSolver(expected).solve_system()
+        self.assert_same_solution(network, expected)
+
+    def test_raised_branch_lines(self):
+        network = network_generator.sprinkler_tree(3, 4)
+        expected = network_generator.sprinkler_tree(3, 4)
+        for tree in (network, expected):
+            for branch in BranchReducer(tree).find_branches():
+                for index in branch.nozzle_indexes:
+                    nozzle = tree.edge_at(index)
+                    nozzle.input_node.set_elevation(40, 'm')
+                    nozzle.output_node.set_elevation(40, 'm')
+        reducer = BranchReducer(network)
+        reducer.solve(UserSolver)
+        self.assertTrue(reducer.converged)
+        self.assertFalse(reducer.fell_back)
+        UserSolver(expected).solve_system()
+        self.assert_same_solution(network, expected, 3)
+
+    def test_input_tree(self):
+        network = network_generator.sprinkler_tree(4, 5, 'input',
+                                                   compact=True)
+        expected = network_generator.sprinkler_tree(4, 5, 'input')
+        solver = BranchReducer(network).solve(RemoteNozzleSolver)
+        RemoteNozzleSolver(expected).solve_system()
+        self.assertEqual(len(solver.network.get_edges()), 1 + 3 + 4)
+        self.assert_same_solution(network, expected)
+        self.assertAlmostEqual(network.node_at(0).get_output_flow('gpm'),
+                               expected.node_at(0).get_output_flow('gpm'))
+
+    def test_gridded_system_is_left_alone(self):
+        network = network_generator.gridded_system(2, 2)
+        reducer = BranchReducer(network)
+        self.assertEqual(reducer.find_branches(), [])
+        reduced = reducer.reduce()
+        self.assertEqual(len(reduced.get_edges()), len(network.get_edges()))
+
+
+if __name__ == '__main__':
+    unittest.main()
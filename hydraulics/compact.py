@@ -0,0 +1,230 @@
+"""Memory compact nodes and edges for large networks.
+
+The classes here keep plain floats in fixed units inside ``__slots__``
+instead of one :class:`physics.Measure` per quantity, and tuples instead of
+lists for the edges at each node. Their getters and setters take units like
+the regular classes, and they are registered as virtual subclasses of them,
+so ``isinstance`` checks in the solvers still hold. Energies and pressures
+are kept in psi, elevations and lengths in m, inner diameters in in, flows
+in gpm and nozzle factors in gpm/psi^0.5.
+
+"""
+from physics import Length, NozzleK, Pressure, VolFlow
+from edges import Edge, Nozzle, Pipe
+from nodes import ConnectionNode, EndNode, InputNode, Node
+
+PSI_PER_METER = Pressure.factor('mH2O', 'psi')
+
+
+class _CompactNode(object):
+    __slots__ = ('_name', '_elevation', '_pressure', '_energy', '_out_flow',
+                 'input_pipes', 'output_pipes', '_networks')
+
+    def __init__(self):
+        self._name = None
+        self._elevation = None
+        self._pressure = None
+        self._energy = None
+        self._out_flow = 0.
+        self.input_pipes = ()
+        self.output_pipes = ()
+        self._networks = ()
+
+    name = Node.__dict__['name']
+    add_network = Node.__dict__['add_network']
+    remove_network = Node.__dict__['remove_network']
+
+    @property
+    def elevation(self):
+        return self._elevation
+
+    def set_elevation(self, value, unit):
+        self._elevation = value * Length.factor(unit, 'm')
+        self._energy = None
+
+    def get_elevation(self, unit):
+        return self._elevation * Length.factor('m', unit)
+
+    def get_pressure(self, unit):
+        return self._pressure * Pressure.factor('psi', unit)
+
+    def get_energy(self, unit):
+        if self._energy is None:
+            self._energy = self._elevation * PSI_PER_METER + self._pressure
+        return self._energy * Pressure.factor('psi', unit)
+
+    def has_energy(self):
+        if self._energy is not None:
+            return True
+        return self._elevation is not None and self._pressure is not None
+
+    def set_output_pipe(self, pipe):
+        self.output_pipes += (pipe,)
+
+    def get_output_pipes(self):
+        return self.output_pipes
+
+    def set_input_pipe(self, pipe):
+        self.input_pipes += (pipe,)
+
+    def get_input_pipes(self):
+        return self.input_pipes
+
+    def get_output_flow(self, unit):
+        return self._out_flow * VolFlow.factor('gpm', unit)
+
+    def set_output_flow(self, value, unit):
+        self._out_flow = value * VolFlow.factor(unit, 'gpm')
+
+
+class CompactConnectionNode(_CompactNode):
+    __slots__ = ()
+
+    def set_pressure(self, value, unit):
+        self._pressure = value * Pressure.factor(unit, 'psi')
+        self._energy = None
+
+    def set_energy(self, value, unit):
+        self._energy = value * Pressure.factor(unit, 'psi')
+        if self._elevation is not None:
+            self._pressure = self._energy - self._elevation * PSI_PER_METER
+
+    def remove_output(self, index):
+        pipes = self.output_pipes
+        self.output_pipes = pipes[:index] + pipes[index + 1:]
+
+    def remove_input(self, index):
+        pipes = self.input_pipes
+        self.input_pipes = pipes[:index] + pipes[index + 1:]
+
+
+class CompactEndNode(_CompactNode):
+    __slots__ = ()
+
+    def __init__(self):
+        super(CompactEndNode, self).__init__()
+        self._pressure = 0.
+
+    def set_pressure(self, value, unit):
+        self._pressure = value * Pressure.factor(unit, 'psi')
+        self._energy = None
+
+
+class CompactInputNode(CompactConnectionNode):
+    __slots__ = ()
+
+
+class _CompactEdge(object):
+    __slots__ = ('_name', '_vol_flow', '_input_node', '_output_node',
+                 '_networks')
+
+    def __init__(self):
+        self._name = None
+        self._vol_flow = None
+        self._input_node = None
+        self._output_node = None
+        self._networks = ()
+
+    name = Edge.__dict__['name']
+    add_network = Edge.__dict__['add_network']
+    remove_network = Edge.__dict__['remove_network']
+    input_node = Edge.__dict__['input_node']
+    clear_input = Edge.__dict__['clear_input']
+    clear_output = Edge.__dict__['clear_output']
+    connects = Edge.__dict__['connects']
+    _floored_flow_and_slopes = Edge.__dict__['_floored_flow_and_slopes']
+
+    def set_vol_flow(self, value, unit):
+        self._vol_flow = value * VolFlow.factor(unit, 'gpm')
+
+    def get_vol_flow(self, unit):
+        return self._vol_flow * VolFlow.factor('gpm', unit)
+
+
+class CompactNozzle(_CompactEdge):
+    __slots__ = ('_k_factor', '_required_pressure')
+
+    def __init__(self):
+        super(CompactNozzle, self).__init__()
+        self._k_factor = None
+        self._required_pressure = None
+
+    output_node = Nozzle.__dict__['output_node']
+    calculate_gpm_flow = Nozzle.__dict__['calculate_gpm_flow']
+    get_node_jacobian = Nozzle.__dict__['get_node_jacobian']
+    get_flow_and_slopes = Nozzle.__dict__['get_flow_and_slopes']
+    get_conductance = Nozzle.__dict__['get_conductance']
+
+    def set_factor(self, value, unit):
+        self._k_factor = value * NozzleK.factor(unit, 'gpm/psi^0.5')
+
+    def get_factor(self, unit):
+        return self._k_factor * NozzleK.factor('gpm/psi^0.5', unit)
+
+    def set_required_pressure(self, value, unit):
+        self._required_pressure = value * Pressure.factor(unit, 'psi')
+
+    def get_required_pressure(self, unit):
+        return self._required_pressure * Pressure.factor('psi', unit)
+
+    def is_complete(self):
+        return bool(self._k_factor and self.input_node and
+                    self.output_node and self._required_pressure)
+
+
+class CompactPipe(_CompactEdge):
+    __slots__ = ('_length', '_inner_diam', 'c_coefficient', 'k_pipe')
+
+    def __init__(self):
+        super(CompactPipe, self).__init__()
+        self._length = None
+        self._inner_diam = None
+        self.c_coefficient = None
+        self.k_pipe = None
+
+    output_node = Pipe.__dict__['output_node']
+    calculate_gpm_flow = Pipe.__dict__['calculate_gpm_flow']
+    get_node_jacobian = Pipe.__dict__['get_node_jacobian']
+    get_flow_and_slopes = Pipe.__dict__['get_flow_and_slopes']
+    get_conductance = Pipe.__dict__['get_conductance']
+    k_flow = Pipe.__dict__['k_flow']
+    _set_k_pipe = Pipe.__dict__['_set_k_pipe']
+    get_c_coefficient = Pipe.__dict__['get_c_coefficient']
+
+    @property
+    def length(self):
+        return self._length
+
+    def set_length(self, value, unit):
+        self._length = value * Length.factor(unit, 'm')
+        self.k_pipe = None
+
+    def get_length(self, unit):
+        return self._length * Length.factor('m', unit)
+
+    @property
+    def inner_diam(self):
+        return self._inner_diam
+
+    def set_inner_diam(self, value, unit):
+        self._inner_diam = value * Length.factor(unit, 'in')
+        self.k_pipe = None
+
+    def get_inner_diam(self, unit):
+        return self._inner_diam * Length.factor('in', unit)
+
+    def set_c_coefficient(self, value):
+        self.c_coefficient = value
+        self.k_pipe = None
+
+    def is_complete(self):
+        return bool(self._length and self._output_node and
+                    self._input_node and self._inner_diam and
+                    self.c_coefficient)
+
+
+ConnectionNode.register(CompactConnectionNode)
+EndNode.register(CompactEndNode)
+InputNode.register(CompactInputNode)
+Nozzle.register(CompactNozzle)
+Pipe.register(CompactPipe)
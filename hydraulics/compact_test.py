@@ -0,0 +1,113 @@
+import unittest
+
+import network_generator
+from compact import CompactConnectionNode, CompactEndNode, \
+    CompactInputNode, CompactNozzle, CompactPipe
+from compiled_network import CompiledNetwork
+from edges import Pipe, Nozzle
+from nodes import Node, ConnectionNode, EndNode, InputNode
+from solvers import UserSolver, RemoteNozzleSolver
+
+
+class CompactNodeTests(unittest.TestCase):
+    def test_node_units(self):
+        node = CompactConnectionNode()
+        node.set_elevation(10, 'm')
+        node.set_pressure(100, 'kPa')
+        self.assertAlmostEqual(node.get_elevation('ft'), 32.808399)
+        self.assertAlmostEqual(node.get_pressure('psi'), 14.5037744)
+        regular = ConnectionNode()
+        regular.set_elevation(10, 'm')
+        regular.set_pressure(node.get_pressure('psi'), 'psi')
+        self.assertAlmostEqual(node.get_energy('psi'),
+                               regular.get_energy('psi'))
+        node.set_energy(50, 'psi')
+        regular.set_energy(50, 'psi')
+        self.assertAlmostEqual(node.get_pressure('psi'),
+                               regular.get_pressure('psi'))
+        node.set_output_flow(10, 'lpm')
+        self.assertAlmostEqual(node.get_output_flow('gpm'), 2.641721, 6)
+
+    def test_isinstance(self):
+        self.assertTrue(isinstance(CompactConnectionNode(), ConnectionNode))
+        self.assertTrue(isinstance(CompactInputNode(), InputNode))
+        self.assertTrue(isinstance(CompactInputNode(), ConnectionNode))
+        self.assertTrue(isinstance(CompactEndNode(), EndNode))
+        self.assertTrue(isinstance(CompactEndNode(), Node))
+        self.assertFalse(isinstance(CompactEndNode(), ConnectionNode))
+        self.assertTrue(isinstance(CompactPipe(), Pipe))
+        self.assertTrue(isinstance(CompactNozzle(), Nozzle))
+
+    def test_no_instance_dict(self):
+        for element in (CompactConnectionNode(), CompactEndNode(),
+                        CompactInputNode(), CompactPipe(), CompactNozzle()):
+            self.assertFalse(hasattr(element, '__dict__'))
+
+    def test_pipe_connections(self):
+        node0 = CompactConnectionNode()
+        node1 = CompactEndNode()
+        pipe = CompactPipe()
+        pipe.input_node = node0
+        pipe.output_node = node1
+        node0.set_output_pipe(pipe)
+        node1.set_input_pipe(pipe)
+        self.assertEqual(node0.get_output_pipes(), (pipe,))
+        with self.assertRaises(IndexError):
+            pipe.input_node = node1
+        node0.remove_output(0)
+        self.assertEqual(node0.get_output_pipes(), ())
+        nozzle = CompactNozzle()
+        with self.assertRaises(ValueError):
+            nozzle.output_node = node0
+
+
+class CompactEdgeTests(unittest.TestCase):
+    def test_pipe_matches_regular(self):
+        pipes = (Pipe(), CompactPipe())
+        for pipe in pipes:
+            pipe.set_length(100, 'ft')
+            pipe.set_inner_diam(4.026, 'in')
+            pipe.set_c_coefficient(120)
+            pipe.set_vol_flow(200, 'gpm')
+        self.assertAlmostEqual(pipes[0].k_flow() / pipes[1].k_flow(), 1)
+        self.assertAlmostEqual(pipes[1].get_length('m'), 30.48)
+        self.assertAlmostEqual(pipes[1].get_vol_flow('lpm'),
+                               pipes[0].get_vol_flow('lpm'))
+
+    def test_nozzle_units(self):
+        nozzle = CompactNozzle()
+        nozzle.set_factor(80, 'lpm/bar^0.5')
+        nozzle.set_required_pressure(1, 'kPa')
+        regular = Nozzle()
+        regular.set_factor(80, 'lpm/bar^0.5')
+        self.assertAlmostEqual(nozzle.get_factor('gpm/psi^0.5'),
+                               regular.get_factor('gpm/psi^0.5'))
+        self.assertAlmostEqual(nozzle.get_required_pressure('kPa'), 1)
+
+
+class CompactNetworkTests(unittest.TestCase):
+    def solved_pressures(self, network):
+        return [node.get_pressure('psi') for node in network.get_nodes()]
+
+    def test_compact_grid_solves_like_regular(self):
+        regular = network_generator.gridded_system(3, 3)
+        compact = network_generator.gridded_system(3, 3, compact=True)
+        self.assertTrue(CompiledNetwork.supports(compact))
+        UserSolver(regular).solve_system()
+        UserSolver(compact).solve_system()
+        for pair in zip(self.solved_pressures(regular),
+                        self.solved_pressures(compact)):
+            self.assertAlmostEqual(pair[0], pair[1], 4)
+
+    def test_compact_remote_nozzle(self):
+        regular = network_generator.sprinkler_tree(2, 3, 'input')
+        compact = network_generator.sprinkler_tree(2, 3, 'input', True)
+        RemoteNozzleSolver(regular).solve_system()
+        RemoteNozzleSolver(compact).solve_system()
+        for pair in zip(self.solved_pressures(regular),
+                        self.solved_pressures(compact)):
+            self.assertAlmostEqual(pair[0], pair[1], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+import numpy as np
+
+import kernels
+import physics
+from edges import Edge, Pipe, Nozzle
+from compact import CompactConnectionNode, CompactEndNode, CompactInputNode
+from nodes import ConnectionNode, EndNode, InputNode
+from tabulated_nozzle import TabulatedNozzle
+
+
+class CompiledNetwork(object):
+    """
+    Struct of arrays view of a :class:`PNetwork` for the solver hot loop.
+    Energies and elevations are kept in psi and flows in gpm, indexed like
+    the network's nodes and edges. The evaluation methods take optional
+    energy and coefficient arrays whose leading dimensions stack scenarios
+    """
+    NODE_TYPES = (ConnectionNode, InputNode, EndNode, CompactConnectionNode,
+                  CompactInputNode, CompactEndNode)
+
+    def __init__(self, network):
+        nodes = network.get_nodes()
+        edges = network.get_edges()
+        self.network = network
+        self.node_count = len(nodes)
+        self.edge_count = len(edges)
+        node_indexes = dict((nodes[index], index)
+                            for index in range(self.node_count))
+        self.edge_in = np.array([node_indexes[edge.input_node]
+                                 for edge in edges], dtype=int)
+        self.edge_out = np.array([node_indexes[edge.output_node]
+                                  for edge in edges], dtype=int)
+        self.is_pipe = np.array([isinstance(edge, Pipe) for edge in edges],
+                                dtype=bool)
+        self.pipe_indexes = np.flatnonzero(self.is_pipe)
+        self.nozzle_indexes = np.flatnonzero(~self.is_pipe)
+        self.active = np.array([isinstance(node, ConnectionNode)
+                                for node in nodes], dtype=bool)
+        self.active_indexes = np.flatnonzero(self.active)
+        self.position = np.full(self.node_count, -1, dtype=int)
+        self.position[self.active_indexes] = np.arange(self.size)
+        self._pattern = self._build_jacobian_pattern()
+        self.energies = np.zeros(self.node_count)
+        self.refresh()
+
+    @classmethod
+    def of(cls, network):
+        """
+        Compiled view of the network, kept in its topology cache so solves
+        after changes to coefficients, demands or fixed energies reuse the
+        index arrays and the jacobian pattern
+        :rtype: CompiledNetwork
+        """
+        cache = network.topology_cache()
+        if 'compiled' in cache:
+            cache['compiled'].refresh()
+        else:
+            cache['compiled'] = cls(network)
+        return cache['compiled']
+
+    @classmethod
+    def supports(cls, network):
+        """
+        Tells whether every element of the network has a compiled
+        counterpart. Eductors and their nodes, as well as tabulated nozzles,
+        are left to the object path
+        :rtype: bool
+        """
+        cache = network.topology_cache()
+        if 'compiled_support' not in cache:
+            cache['compiled_support'] = cls._find_support(network)
+        return cache['compiled_support']
+
+    @classmethod
+    def _find_support(cls, network):
+        for node in network.get_nodes():
+            if type(node) not in cls.NODE_TYPES:
+                return False
+        for edge in network.get_edges():
+            if not isinstance(edge, (Pipe, Nozzle)) or \
+                    isinstance(edge, TabulatedNozzle):
+                return False
+            if not edge.connects():
+                return False
+        return True
+
+    @property
+    def size(self):
+        return len(self.active_indexes)
+
+    def refresh(self):
+        """
+        Reads the edge coefficients, node demands and fixed energies, which
+        may change between solves without changing the topology
+        """
+        nodes = self.network.get_nodes()
+        edges = self.network.get_edges()
+        self.coefficient = np.zeros(self.edge_count)
+        for index in range(self.edge_count):
+            if self.is_pipe[index]:
+                self.coefficient[index] = edges[index].k_flow()
+            else:
+                self.coefficient[index] = edges[index].get_factor(
+                    'gpm/psi^0.5')
+        self.demand = np.array([node.get_output_flow('gpm')
+                                for node in nodes])
+        self.elevation = physics.Pressure.convert(
+            [self._elevation(node) for node in nodes], 'mH2O', 'psi')
+        for index in np.flatnonzero(~self.active):
+            self.energies[index] = nodes[index].get_energy('psi')
+
+    @staticmethod
+    def _elevation(node):
+        if node.elevation is None:
+            return 0.
+        return node.get_elevation('m')
+
+    def set_active_energies(self, vector):
+        self.energies[self.active_indexes] = vector
+
+    def head_differences(self, energies=None):
+        if energies is None:
+            energies = self.energies
+        return energies[..., self.edge_in] - energies[..., self.edge_out]
+
+    def edge_flows(self, energies=None, coefficient=None):
+        """
+        :return: flow of every edge, linear under Edge.HEAD_FLOOR like the
+            one of :func:`edge_flows_and_slopes`
+        """
+        return self.edge_flows_and_slopes(energies, coefficient)[0]
+
+    def edge_flows_and_slopes(self, energies=None, coefficient=None):
+        """
+        :return: flow of every edge and its derivative with respect to its
+            input node energy, which is minus the one for its output node
+        """
+        if coefficient is None:
+            coefficient = self.coefficient
+        head = self.head_differences(energies)
+        flows = np.zeros(head.shape)
+        slopes = np.zeros(head.shape)
+        pipes = self.pipe_indexes
+        nozzles = self.nozzle_indexes
+        flows[..., pipes], slopes[..., pipes] = \
+            kernels.hazen_williams_flow_and_derivative(
+                head[..., pipes], coefficient[..., pipes], Edge.HEAD_FLOOR)
+        flows[..., nozzles], slopes[..., nozzles] = \
+            kernels.emitter_flow_and_derivative(
+                head[..., nozzles], coefficient[..., nozzles],
+                Edge.HEAD_FLOOR)
+        return flows, slopes
+
+    def edge_losses_and_slopes(self, flows, floor):
+        """
+        Inverse of :func:`edge_flows`: the head every edge needs to carry
+        the given flows
+        :param floor: minimum flow (gpm) the slopes are evaluated at
+        :return: head losses and their derivatives with respect to the
+            flows
+        """
+        losses = np.zeros(flows.shape)
+        slopes = np.zeros(flows.shape)
+        pipes = self.pipe_indexes
+        nozzles = self.nozzle_indexes
+        losses[..., pipes], slopes[..., pipes] = \
+            kernels.hazen_williams_loss_and_derivative(
+                flows[..., pipes], self.coefficient[pipes], floor)
+        losses[..., nozzles], slopes[..., nozzles] = \
+            kernels.emitter_loss_and_derivative(
+                flows[..., nozzles], self.coefficient[nozzles], floor)
+        return losses, slopes
+
+    def linear_flows_and_slopes(self, floor, energies=None,
+                                coefficient=None):
+        """
+        Replaces every edge by its secant conductance at its current energy
+        difference, never taken below floor
+        :param floor: minimum head (psi) the conductances are evaluated at
+        :return: the resulting linear flows and their slopes
+        """
+        if coefficient is None:
+            coefficient = self.coefficient
+        head = self.head_differences(energies)
+        reference = np.maximum(np.abs(head), floor)
+        slopes = np.zeros(head.shape)
+        pipes = self.pipe_indexes
+        nozzles = self.nozzle_indexes
+        slopes[..., pipes] = kernels.hazen_williams_conductance(
+            reference[..., pipes], coefficient[..., pipes])
+        slopes[..., nozzles] = kernels.emitter_conductance(
+            reference[..., nozzles], coefficient[..., nozzles])
+        return head * slopes, slopes
+
+    def f_equations(self):
+        """
+        Flow balance of every active node, entering flow minus leaving flow
+        minus the node's own output flow
+        :return: column vector ordered like the active nodes
+        """
+        balance = self.active_balance(self.edge_flows())
+        return balance.reshape(self.size, 1)
+
+    def evaluate(self, linear_floor=None):
+        """
+        Evaluates :func:`f_equations` and its jacobian with respect to the
+        active energies from a single pass over the edges
+        :param linear_floor: when given, edges are replaced by the linear
+            ones of :func:`linear_flows_and_slopes`
+        :return: balance column, jacobian rows, columns and values
+        """
+        if linear_floor is None:
+            flows, slopes = self.edge_flows_and_slopes()
+        else:
+            flows, slopes = self.linear_flows_and_slopes(linear_floor)
+        rows, cols, _ = self.jacobian_pattern()
+        balance = self.active_balance(flows).reshape(self.size, 1)
+        return balance, rows, cols, self.jacobian_values(slopes)
+
+    def active_balance(self, flows, demand=None):
+        if demand is None:
+            demand = self.demand
+        balance = kernels.node_balance(flows, self.edge_in, self.edge_out,
+                                       demand)
+        return balance[..., self.active_indexes]
+
+    def jacobian_pattern(self):
+        """
+        :return: rows and columns of the jacobian entries, along with the
+            mask selecting them from the four entries of every edge
+        """
+        return self._pattern
+
+    def _build_jacobian_pattern(self):
+        in_pos = self.position[self.edge_in]
+        out_pos = self.position[self.edge_out]
+        rows = np.concatenate((in_pos, in_pos, out_pos, out_pos))
+        cols = np.concatenate((in_pos, out_pos, in_pos, out_pos))
+        kept = (rows >= 0) & (cols >= 0)
+        return rows[kept], cols[kept], kept
+
+    def jacobian_values(self, slopes):
+        _, _, kept = self.jacobian_pattern()
+        values = np.concatenate((-slopes, slopes, slopes, -slopes), axis=-1)
+        return values[..., kept]
+
+    def write_back(self):
+        """
+        Stores the compiled energies and flows on the network's nodes and
+        edges
+        """
+        nodes = self.network.get_nodes()
+        edges = self.network.get_edges()
+        for index in self.active_indexes:
+            nodes[index].set_energy(self.energies[index], 'psi')
+        flows = self.edge_flows()
+        for index in range(self.edge_count):
+            edges[index].set_vol_flow(flows[index], 'gpm')
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+
+from compiled_network import CompiledNetwork
+from edges import Pipe, Nozzle
+from eductor import Eductor
+from nodes import ConnectionNode, EndNode, EductorInlet
+from pipe_network import PNetwork
+
+
+class CompiledNetworkTests(unittest.TestCase):
+    def setUp(self):
+        self.network = PNetwork()
+        self.reserve_node = EndNode()
+        self.reserve_node.set_elevation(27, 'm')
+        self.node1 = ConnectionNode()
+        self.node1.set_elevation(10, 'm')
+        self.node1.set_energy(25, 'mH2O')
+        self.nozzle_end = EndNode()
+        self.nozzle_end.set_elevation(23, 'm')
+        self.pipe0 = Pipe()
+        self.pipe0.set_length(1000, 'm')
+        self.pipe0.set_inner_diam(10.75, 'in')
+        self.pipe0.set_c_coefficient(100)
+        self.nozzle0 = Nozzle()
+        self.nozzle0.set_factor(1.2, 'gpm/psi^0.5')
+        self.network.add_node(self.reserve_node)
+        self.network.add_node(self.node1)
+        self.network.add_node(self.nozzle_end)
+        self.network.add_edge(self.pipe0)
+        self.network.add_edge(self.nozzle0)
+        self.network.connect_node_downstream_edge(0, 0)
+        self.network.connect_node_upstream_edge(1, 0)
+        self.network.connect_node_downstream_edge(1, 1)
+        self.network.connect_node_upstream_edge(2, 1)
+
+    def compile_with_node_energies(self):
+        compiled = CompiledNetwork(self.network)
+        compiled.set_active_energies([self.node1.get_energy('psi')])
+        return compiled
+
+    def test_index_arrays(self):
+        compiled = CompiledNetwork(self.network)
+        self.assertEqual(list(compiled.edge_in), [0, 1])
+        self.assertEqual(list(compiled.edge_out), [1, 2])
+        self.assertEqual(list(compiled.active_indexes), [1])
+        self.assertEqual(list(compiled.position), [-1, 0, -1])
+        self.assertEqual(compiled.size, 1)
+
+    def test_f_equations_match_objects(self):
+        compiled = self.compile_with_node_energies()
+        flow0 = (self.pipe0.calculate_gpm_flow() -
+                 self.nozzle0.calculate_gpm_flow())
+        self.assertAlmostEqual(float(compiled.f_equations()), flow0)
+
+    def test_jacobian_matches_objects(self):
+        compiled = self.compile_with_node_energies()
+        _, rows, cols, values = compiled.evaluate()
+        expected = (self.pipe0.get_node_jacobian(self.node1) -
+                    self.nozzle0.get_node_jacobian(self.node1))
+        self.assertEqual(list(rows), [0, 0])
+        self.assertEqual(list(cols), [0, 0])
+        self.assertAlmostEqual(np.sum(values), expected)
+
+    def test_evaluate_matches_f_equations(self):
+        compiled = self.compile_with_node_energies()
+        f_results = compiled.evaluate()[0]
+        self.assertEqual(float(f_results), float(compiled.f_equations()))
+
+    def test_write_back(self):
+        compiled = self.compile_with_node_energies()
+        compiled.set_active_energies([30.0])
+        compiled.write_back()
+        self.assertAlmostEqual(self.node1.get_energy('psi'), 30)
+        self.assertAlmostEqual(self.pipe0.get_vol_flow('gpm'),
+                               self.pipe0.calculate_gpm_flow())
+
+    def test_compiled_view_is_kept_until_topology_changes(self):
+        compiled = CompiledNetwork.of(self.network)
+        self.nozzle0.set_factor(2.4, 'gpm/psi^0.5')
+        self.assertIs(CompiledNetwork.of(self.network), compiled)
+        self.assertAlmostEqual(compiled.coefficient[1], 2.4)
+        self.network.add_node(ConnectionNode())
+        self.assertIsNot(CompiledNetwork.of(self.network), compiled)
+
+    def test_supports(self):
+        self.assertTrue(CompiledNetwork.supports(self.network))
+        self.network.add_node(EductorInlet())
+        self.assertFalse(CompiledNetwork.supports(self.network))
+
+    def test_eductor_is_not_supported(self):
+        self.network.add_edge(Eductor())
+        self.assertFalse(CompiledNetwork.supports(self.network))
+
+
+if __name__ == '__main__':
+    unittest.main()
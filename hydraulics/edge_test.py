@@ -237,6 +237,22 @@ class PipeTest(unittest.TestCase):
         self.assertAlmostEqual(self.sys_pipe.get_node_jacobian(node_o),
                                -result, 5)
 
+    def test_flow_and_slopes(self):
+        self.sys_pipe.set_length(900, 'm')
+        self.sys_pipe.set_inner_diam(7.981, 'in')
+        self.sys_pipe.set_c_coefficient(100)
+        node_i = ConnectionNode()
+        node_i.set_energy(90.01, 'psi')
+        node_o = ConnectionNode()
+        node_o.set_energy(90, 'psi')
+        self.sys_pipe.input_node = node_i
+        self.sys_pipe.output_node = node_o
+        flow, in_slope, out_slope = self.sys_pipe.get_flow_and_slopes()
+        self.assertAlmostEqual(flow, self.sys_pipe.calculate_gpm_flow())
+        self.assertAlmostEqual(self.sys_pipe.get_vol_flow('gpm'), flow)
+        self.assertAlmostEqual(in_slope, 626.507748, 5)
+        self.assertAlmostEqual(out_slope, -626.507748, 5)
+
     def test_when_create_80mm_pipe_get_also_other_unit_diameter(self):
         self.sys_pipe.set_inner_diam(25.4, 'mm')
         self.assertAlmostEqual(self.sys_pipe.get_inner_diam('in'), 1)
@@ -325,6 +341,19 @@ class NozzleTests(unittest.TestCase):
         nozzle_flow = self.nozzle0.calculate_gpm_flow()
         self.assertAlmostEqual(nozzle_flow, 12)
 
+    def test_flow_and_slopes(self):
+        self.nozzle0.set_factor(2, 'gpm/psi^0.5')
+        self.in_node.set_elevation(5, 'm')
+        self.in_node.set_pressure(36, 'psi')
+        self.out_node.set_elevation(5, 'm')
+        self.nozzle0.input_node = self.in_node
+        self.nozzle0.output_node = self.out_node
+        flow, in_slope, out_slope = self.nozzle0.get_flow_and_slopes()
+        self.assertAlmostEqual(flow, 12)
+        self.assertAlmostEqual(in_slope,
+                               self.nozzle0.get_node_jacobian(self.in_node))
+        self.assertAlmostEqual(out_slope, -in_slope)
+
     def test_required_pressure(self):
         self.nozzle0.set_required_pressure(30, 'psi')
         self.assertEqual(self.nozzle0.get_required_pressure('psi'), 30)
@@ -345,5 +374,24 @@ class NozzleTests(unittest.TestCase):
         self.assertFalse(self.nozzle0.is_complete())
 
 
+class EdgeTests(unittest.TestCase):
+    def test_edge_without_conductance(self):
+        class ValveEdge(Edge):
+            def calculate_gpm_flow(self):
+                return 5.
+
+            def is_complete(self):
+                return True
+
+            def get_node_jacobian(self, node):
+                return 1. if node is self.input_node else -1.
+        valve = ValveEdge()
+        valve.input_node = ConnectionNode()
+        valve.output_node = ConnectionNode()
+        self.assertEqual(valve.get_flow_and_slopes(), (5., 1., -1.))
+        with self.assertRaises(NotImplementedError):
+            valve.get_conductance(Edge.HEAD_FLOOR)
+
+
 if __name__ == '__main__':
     unittest.main()
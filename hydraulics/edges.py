@@ -6,12 +6,16 @@ from nodes import Node, EndNode
 
 class Edge(object):
     __metaclass__ = ABCMeta
+    # Head (psi) under which edges are taken as linear, as the slopes of
+    # their flows grow without bound where they carry no flow
+    HEAD_FLOOR = 1e-6
 
     def __init__(self):
         self._vol_flow = None
         self._name = None
         self._input_node = None
         self._output_node = None
+        self._networks = ()
 
     def clear_input(self):
         self._input_node = None
@@ -26,6 +30,18 @@ class Edge(object):
     @name.setter
     def name(self, name):
         self._name = str(name)
+        for network in self._networks:
+            network.edge_renamed()
+
+    def add_network(self, network):
+        """
+        Lets a network holding the edge know whenever it is renamed
+        """
+        self._networks += (network,)
+
+    def remove_network(self, network):
+        self._networks = tuple(owner for owner in self._networks
+                               if owner is not network)
 
     def set_vol_flow(self, value, unit):
         if self._vol_flow:
@@ -53,6 +69,41 @@ class Edge(object):
     def get_node_jacobian(self, node):
         pass
 
+    def get_flow_and_slopes(self):
+        """
+        Calculates the gpm flow along with its derivatives with respect to
+        the input and output node energies (psi)
+        :return: flow, input node slope, output node slope
+        """
+        flow = self.calculate_gpm_flow()
+        in_slope = self.get_node_jacobian(self.input_node)
+        out_slope = self.get_node_jacobian(self.output_node)
+        return flow, in_slope, out_slope
+
+    def _floored_flow_and_slopes(self, energy_diff):
+        """
+        Flow and slopes of :func:`get_flow_and_slopes`, and flow of
+        :func:`calculate_gpm_flow`, for energy differences under HEAD_FLOOR,
+        across which the edge is taken as linear with its secant conductance
+        at HEAD_FLOOR. The flow is thus continuous at the floor and the
+        slopes stay its exact derivatives
+        """
+        slope = self.get_conductance(Edge.HEAD_FLOOR)
+        q_flow = slope * energy_diff
+        self.set_vol_flow(q_flow, 'gpm')
+        return q_flow, slope, -slope
+
+    def get_conductance(self, head):
+        """
+        Secant conductance of the edge: the gpm flow it carries under a
+        positive energy difference divided by that difference. Edges
+        without one cannot be floored nor linearized
+        :param head: energy difference in psi
+        :rtype: float
+        """
+        raise NotImplementedError('%s has no conductance' %
+                                  type(self).__name__)
+
     @property
     def input_node(self):
         return self._input_node
@@ -96,12 +147,11 @@ class Nozzle(Edge):
     def calculate_gpm_flow(self):
         in_ene = self.input_node.get_energy('psi')
         out_ene = self.output_node.get_energy('psi')
-        if in_ene - out_ene == 0:
-            q_flow = 0
-        else:
-            energy_diff = (in_ene - out_ene)
-            k_fac = self.get_factor('gpm/psi^0.5')
-            q_flow = energy_diff * k_fac / sqrt(abs(energy_diff))
+        energy_diff = (in_ene - out_ene)
+        if abs(energy_diff) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(energy_diff)[0]
+        k_fac = self.get_factor('gpm/psi^0.5')
+        q_flow = energy_diff * k_fac / sqrt(abs(energy_diff))
         self.set_vol_flow(q_flow, 'gpm')
         return q_flow
 
@@ -114,6 +164,20 @@ class Nozzle(Edge):
             result += (k_factor * 0.5) / sqrt(abs(diff))
         return result
 
+    def get_flow_and_slopes(self):
+        energy_diff = (self.input_node.get_energy('psi') -
+                       self.output_node.get_energy('psi'))
+        if abs(energy_diff) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(energy_diff)
+        k_fac = self.get_factor('gpm/psi^0.5')
+        q_flow = k_fac * energy_diff / sqrt(abs(energy_diff))
+        self.set_vol_flow(q_flow, 'gpm')
+        slope = k_fac * 0.5 / sqrt(abs(energy_diff))
+        return q_flow, slope, -slope
+
+    def get_conductance(self, head):
+        return self.get_factor('gpm/psi^0.5') / sqrt(head)
+
     def is_complete(self):
         return bool(self.k_factor and self.input_node and self.output_node and
                     self._required_pressure)
@@ -205,11 +269,10 @@ class Pipe(Edge):
     def calculate_gpm_flow(self):
         in_ene = self.input_node.get_energy('psi')
         out_ene = self.output_node.get_energy('psi')
-        if in_ene - out_ene == 0:
-            q_flow = 0
-        else:
-            energy_ratio = (in_ene - out_ene) / self.k_flow()
-            q_flow = energy_ratio * abs(energy_ratio) ** (1 / Pipe.C_POWER - 1)
+        if abs(in_ene - out_ene) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(in_ene - out_ene)[0]
+        energy_ratio = (in_ene - out_ene) / self.k_flow()
+        q_flow = energy_ratio * abs(energy_ratio) ** (1 / Pipe.C_POWER - 1)
         self.set_vol_flow(q_flow, 'gpm')
         return q_flow
 
@@ -239,6 +302,22 @@ class Pipe(Edge):
                 (current_energy - output_energy) / k_fac) ** exponent
         return result
 
+    def get_flow_and_slopes(self):
+        energy_diff = (self.input_node.get_energy('psi') -
+                       self.output_node.get_energy('psi'))
+        if abs(energy_diff) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(energy_diff)
+        k_fac = self.k_flow()
+        exponent = 1 / Pipe.C_POWER - 1
+        energy_ratio = energy_diff / k_fac
+        q_flow = energy_ratio * abs(energy_ratio) ** exponent
+        self.set_vol_flow(q_flow, 'gpm')
+        slope = abs(energy_ratio) ** exponent / (Pipe.C_POWER * k_fac)
+        return q_flow, slope, -slope
+
+    def get_conductance(self, head):
+        return (head / self.k_flow()) ** (1 / Pipe.C_POWER) / head
+
     @property
     def output_node(self):
         return self._output_node
@@ -28,6 +28,9 @@ class Eductor(Edge):
         self.set_vol_flow(q_flow, 'gpm')
         return q_flow
 
+    def get_conductance(self, head):
+        return self.get_factor('gpm/psi^0.5') / sqrt(0.35 * head)
+
     def adjust_pressure(self):
         pressure = self.input_node.get_pressure('psi')
         self.output_node.set_pressure(pressure*0.65, 'psi')
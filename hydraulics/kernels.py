@@ -0,0 +1,138 @@
+"""Array versions of the edge laws used by the solvers.
+
+Every kernel works element wise over arrays of head differences (psi) and
+edge coefficients, returning flows in gpm or their derivatives in gpm/psi.
+
+"""
+import numpy as np
+
+from edges import Pipe
+
+HW_EXPONENT = 1 / Pipe.C_POWER
+
+
+def hazen_williams_flow(head_diff, k_pipe):
+    """
+    Flow through pipes whose loss follows head = k_pipe * Q^1.852
+    :param head_diff: upstream energy minus downstream energy
+    :param k_pipe: pipe coefficients, as given by :func:`Pipe.k_flow`
+    """
+    head_diff = np.asarray(head_diff, dtype=float)
+    ratio = np.abs(head_diff) / np.asarray(k_pipe, dtype=float)
+    return np.sign(head_diff) * ratio ** HW_EXPONENT
+
+
+def hazen_williams_flow_and_derivative(head_diff, k_pipe, floor):
+    """
+    Evaluates :func:`hazen_williams_flow` and its derivative with respect
+    to the upstream energy, sharing a single power per pipe
+    :param floor: head (psi) under which pipes are taken as linear, with
+        their secant conductance at the floor
+    """
+    head_diff = np.asarray(head_diff, dtype=float)
+    k_pipe = np.asarray(k_pipe, dtype=float)
+    head = np.abs(head_diff)
+    floored = np.maximum(head, floor)
+    scale = (floored / k_pipe) ** HW_EXPONENT / floored
+    derivative = np.where(head < floor, scale, HW_EXPONENT * scale)
+    return head_diff * scale, derivative
+
+
+def emitter_flow(head_diff, k_factor):
+    """
+    Flow through nozzles following Q = K * P^0.5
+    :param head_diff: upstream energy minus downstream energy
+    :param k_factor: nozzle factors in gpm/psi^0.5
+    """
+    head_diff = np.asarray(head_diff, dtype=float)
+    k_factor = np.asarray(k_factor, dtype=float)
+    return np.sign(head_diff) * k_factor * np.sqrt(np.abs(head_diff))
+
+
+def emitter_flow_and_derivative(head_diff, k_factor, floor):
+    """
+    Evaluates :func:`emitter_flow` and its derivative with respect to the
+    upstream energy, sharing a single square root per nozzle
+    :param floor: head (psi) under which nozzles are taken as linear, with
+        their secant conductance at the floor
+    """
+    head_diff = np.asarray(head_diff, dtype=float)
+    k_factor = np.asarray(k_factor, dtype=float)
+    head = np.abs(head_diff)
+    scale = k_factor / np.sqrt(np.maximum(head, floor))
+    derivative = np.where(head < floor, scale, 0.5 * scale)
+    return head_diff * scale, derivative
+
+
+def hazen_williams_loss_and_derivative(flow, k_pipe, floor):
+    """
+    Head loss of pipes carrying the given flows, k_pipe * Q * |Q|^0.852,
+    and its derivative with respect to the flow
+    :param floor: minimum flow (gpm) the derivative is evaluated at, as it
+        vanishes along with the flow
+    """
+    flow = np.asarray(flow, dtype=float)
+    k_pipe = np.asarray(k_pipe, dtype=float)
+    scale = k_pipe * np.abs(flow) ** (Pipe.C_POWER - 1)
+    derivative = (Pipe.C_POWER * k_pipe *
+                  np.maximum(np.abs(flow), floor) ** (Pipe.C_POWER - 1))
+    return flow * scale, derivative
+
+
+def emitter_loss_and_derivative(flow, k_factor, floor):
+    """
+    Head across nozzles discharging the given flows, Q * |Q| / K^2, and its
+    derivative with respect to the flow
+    :param floor: minimum flow (gpm) the derivative is evaluated at
+    """
+    flow = np.asarray(flow, dtype=float)
+    inverse = 1 / np.asarray(k_factor, dtype=float) ** 2
+    derivative = 2 * inverse * np.maximum(np.abs(flow), floor)
+    return flow * np.abs(flow) * inverse, derivative
+
+
+def hazen_williams_conductance(head, k_pipe):
+    """
+    Secant conductance of pipes, :func:`hazen_williams_flow` divided by the
+    head difference
+    :param head: positive head differences
+    """
+    head = np.asarray(head, dtype=float)
+    k_pipe = np.asarray(k_pipe, dtype=float)
+    return (head / k_pipe) ** HW_EXPONENT / head
+
+
+def emitter_conductance(head, k_factor):
+    """
+    Secant conductance of nozzles, :func:`emitter_flow` divided by the
+    head difference
+    :param head: positive head differences
+    """
+    head = np.asarray(head, dtype=float)
+    return np.asarray(k_factor, dtype=float) / np.sqrt(head)
+
+
+def node_balance(flows, edge_in, edge_out, demand):
+    """
+    Flow entering each node minus flow leaving it minus its own demand
+    :param flows: flow of every edge, positive from input to output node.
+        Leading dimensions stack independent scenarios
+    :param edge_in: input node index of every edge
+    :param edge_out: output node index of every edge
+    :param demand: output flow of every node, broadcast against the
+        scenarios
+    """
+    flows = np.asarray(flows, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    node_count = demand.shape[-1]
+    stacked_shape = flows.shape[:-1]
+    count = int(np.prod(stacked_shape))
+    offsets = node_count * np.arange(count).reshape(count, 1)
+    weights = flows.reshape(count, len(edge_in)).ravel()
+    length = node_count * count
+    entering = np.bincount((edge_out + offsets).ravel(), weights=weights,
+                           minlength=length)
+    leaving = np.bincount((edge_in + offsets).ravel(), weights=weights,
+                          minlength=length)
+    balance = (entering - leaving).reshape(stacked_shape + (node_count,))
+    return balance - demand
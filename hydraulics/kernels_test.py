@@ -0,0 +1,129 @@
+import unittest
+
+import numpy as np
+
+import kernels
+from edges import Pipe, Nozzle
+from nodes import ConnectionNode, EndNode
+
+
+class KernelTests(unittest.TestCase):
+    def setUp(self):
+        self.node0 = ConnectionNode()
+        self.node0.set_elevation(10, 'm')
+        self.node1 = ConnectionNode()
+        self.node1.set_elevation(10, 'm')
+        self.pipe = Pipe()
+        self.pipe.set_c_coefficient(100)
+        self.pipe.set_length(100, 'm')
+        self.pipe.set_inner_diam(10.75, 'in')
+        self.pipe.input_node = self.node0
+        self.pipe.output_node = self.node1
+
+    def pipe_values(self, in_pressure, out_pressure):
+        self.node0.set_pressure(in_pressure, 'psi')
+        self.node1.set_pressure(out_pressure, 'psi')
+        head = self.node0.get_energy('psi') - self.node1.get_energy('psi')
+        return head, self.pipe.calculate_gpm_flow(), \
+            self.pipe.get_node_jacobian(self.node0)
+
+    def test_hazen_williams_matches_pipe(self):
+        heads, flows, slopes = zip(self.pipe_values(11.26528826, 10),
+                                   self.pipe_values(10, 11.26528826),
+                                   self.pipe_values(30, 12))
+        k_pipe = np.full(3, self.pipe.k_flow())
+        batch_flows = kernels.hazen_williams_flow(heads, k_pipe)
+        batch_slopes = kernels.hazen_williams_flow_and_derivative(
+            heads, k_pipe, 1e-6)[1]
+        for cont in range(3):
+            self.assertAlmostEqual(batch_flows[cont] / flows[cont], 1)
+            self.assertAlmostEqual(batch_slopes[cont] / slopes[cont], 1)
+
+    def test_fused_kernels_match_separate_ones(self):
+        heads = np.array([-3.0, 0.5, 12.0])
+        coefficients = np.array([2e-5, 1e-4, 3e-6])
+        flows, slopes = kernels.hazen_williams_flow_and_derivative(
+            heads, coefficients, 1e-6)
+        self.assertTrue(np.allclose(
+            flows, kernels.hazen_williams_flow(heads, coefficients)))
+        self.assertTrue(np.allclose(slopes,
+                                    kernels.HW_EXPONENT * flows / heads))
+        flows, slopes = kernels.emitter_flow_and_derivative(heads, 2.0, 1e-6)
+        self.assertTrue(np.allclose(flows, kernels.emitter_flow(heads, 2.0)))
+        self.assertTrue(np.allclose(slopes, 0.5 * flows / heads))
+
+    def test_zero_head_gives_no_flow(self):
+        flows = kernels.hazen_williams_flow([0.0], [1e-5])
+        self.assertEqual(flows[0], 0)
+        self.assertEqual(kernels.emitter_flow([0.0], [2.0])[0], 0)
+
+    def test_fused_flows_are_linear_under_floor(self):
+        heads = np.array([0.0, 1e-9, -1e-9, 1e-3])
+        flows, slopes = kernels.hazen_williams_flow_and_derivative(
+            heads, 1e-4, 1e-6)
+        conductance = kernels.hazen_williams_conductance(1e-6, 1e-4)
+        self.assertTrue(np.allclose(flows[:3], conductance * heads[:3]))
+        self.assertTrue(np.allclose(slopes[:3], conductance))
+        self.assertAlmostEqual(flows[3],
+                               kernels.hazen_williams_flow(1e-3, 1e-4))
+        flows, slopes = kernels.emitter_flow_and_derivative(heads, 2.0, 1e-6)
+        conductance = kernels.emitter_conductance(1e-6, 2.0)
+        self.assertTrue(np.allclose(flows[:3], conductance * heads[:3]))
+        self.assertTrue(np.allclose(slopes[:3], conductance))
+        self.assertAlmostEqual(flows[3], kernels.emitter_flow(1e-3, 2.0))
+
+    def test_emitter_matches_nozzle(self):
+        end = EndNode()
+        end.set_elevation(10, 'm')
+        nozzle = Nozzle()
+        nozzle.set_factor(2, 'gpm/psi^0.5')
+        nozzle.input_node = self.node0
+        nozzle.output_node = end
+        self.node0.set_pressure(25, 'psi')
+        head = [self.node0.get_energy('psi') - end.get_energy('psi')]
+        self.assertAlmostEqual(kernels.emitter_flow(head, [2.0])[0],
+                               nozzle.calculate_gpm_flow())
+        slopes = kernels.emitter_flow_and_derivative(head, [2.0], 1e-6)[1]
+        self.assertAlmostEqual(slopes[0],
+                               nozzle.get_node_jacobian(self.node0))
+
+    def test_conductances_match_edges(self):
+        self.assertAlmostEqual(
+            kernels.hazen_williams_conductance([4.0], [self.pipe.k_flow()])[0],
+            self.pipe.get_conductance(4.0))
+        nozzle = Nozzle()
+        nozzle.set_factor(2, 'gpm/psi^0.5')
+        self.assertAlmostEqual(kernels.emitter_conductance([4.0], [2.0])[0],
+                               nozzle.get_conductance(4.0))
+        self.assertAlmostEqual(nozzle.get_conductance(4.0) * 4, 4)
+
+    def test_losses_invert_flows(self):
+        heads = np.array([-3.0, 0.5, 12.0])
+        coefficients = np.array([2e-5, 1e-4, 3e-6])
+        flows, slopes = kernels.hazen_williams_flow_and_derivative(
+            heads, coefficients, 1e-6)
+        losses, loss_slopes = kernels.hazen_williams_loss_and_derivative(
+            flows, coefficients, 1e-6)
+        for cont in range(3):
+            self.assertAlmostEqual(losses[cont], heads[cont])
+            self.assertAlmostEqual(loss_slopes[cont] * slopes[cont], 1)
+        factors = np.array([5.6, 1.2, 8.0])
+        flows, slopes = kernels.emitter_flow_and_derivative(
+            heads, factors, 1e-6)
+        losses, loss_slopes = kernels.emitter_loss_and_derivative(
+            flows, factors, 1e-6)
+        for cont in range(3):
+            self.assertAlmostEqual(losses[cont], heads[cont])
+            self.assertAlmostEqual(loss_slopes[cont] * slopes[cont], 1)
+
+    def test_node_balance(self):
+        flows = np.array([10.0, 4.0, 6.0])
+        edge_in = np.array([0, 1, 1])
+        edge_out = np.array([1, 2, 3])
+        demand = np.array([0.0, 0.0, 4.0, 1.0])
+        balance = kernels.node_balance(flows, edge_in, edge_out, demand)
+        self.assertEqual(list(balance), [-10, 0, 0, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+"""Synthetic networks for benchmarking the solvers.
+
+Every generator returns a fully connected :class:`PNetwork`. Networks fed
+from a reservoir (``source='reservoir'``) suit :class:`UserSolver`, those
+fed from an :class:`InputNode` (``source='input'``) suit
+:class:`RemoteNozzleSolver`. With ``compact=True`` the networks are built
+from the classes of :mod:`compact`.
+
+"""
+from math import sqrt
+
+from compact import CompactConnectionNode, CompactEndNode, \
+    CompactInputNode, CompactNozzle, CompactPipe
+from edges import Pipe, Nozzle
+from eductor import Eductor
+from nodes import ConnectionNode, EndNode, InputNode, EductorInlet, \
+    EductorOutlet
+from pipe_network import PNetwork
+
+# Smallest inner diameters (in) of the pipes, wider ones being sized by
+# :func:`sized_diameter` for the flow they carry
+BRANCH_DIAMETER = 1.049
+MAIN_DIAMETER = 2.469
+FEED_DIAMETER = 4.026
+NOZZLE_FACTOR = 5.6
+REQUIRED_PRESSURE = 7
+RESERVOIR_ELEVATION = 60
+KINDS = ('tree', 'grid', 'reservoirs', 'deluge')
+# Flow (gpm) a nozzle discharges at its required pressure
+NOZZLE_FLOW = NOZZLE_FACTOR * sqrt(REQUIRED_PRESSURE)
+# Velocity (ft/s) pipes are sized for at the flow they carry downstream
+DESIGN_VELOCITY = 10.
+
+
+def sized_diameter(flow, smallest):
+    """
+    Inner diameter (in) carrying a flow at DESIGN_VELOCITY, the velocity
+    in ft/s being 0.4085 times the gpm flow over the squared diameter
+    :param flow: gpm
+    :param smallest: diameter (in) never gone below
+    """
+    return max(smallest, sqrt(0.4085 * flow / DESIGN_VELOCITY))
+
+
+class _Builder(object):
+    """Keeps the indexes of the nodes and edges added to a network"""
+    def __init__(self, compact=False):
+        self.network = PNetwork()
+        if compact:
+            self.connection_node = CompactConnectionNode
+            self.end_node = CompactEndNode
+            self.input_node = CompactInputNode
+            self.pipe = CompactPipe
+            self.nozzle = CompactNozzle
+        else:
+            self.connection_node = ConnectionNode
+            self.end_node = EndNode
+            self.input_node = InputNode
+            self.pipe = Pipe
+            self.nozzle = Nozzle
+
+    def add_node(self, node, elevation=0):
+        node.set_elevation(elevation, 'm')
+        if isinstance(node, ConnectionNode):
+            node.set_pressure(0, 'psi')
+        nodes = self.network.get_nodes()
+        node.name = "n%d" % len(nodes)
+        self.network.add_node(node)
+        return len(nodes) - 1
+
+    def add_edge(self, edge, up_node, down_node):
+        edges = self.network.get_edges()
+        edge.name = "e%d" % len(edges)
+        self.network.add_edge(edge)
+        edge_index = len(edges) - 1
+        self.network.connect_node_downstream_edge(up_node, edge_index)
+        self.network.connect_node_upstream_edge(down_node, edge_index)
+        return edge_index
+
+    def add_pipe(self, up_node, down_node, length, diameter):
+        pipe = self.pipe()
+        pipe.set_length(length, 'm')
+        pipe.set_inner_diam(diameter, 'in')
+        pipe.set_c_coefficient(120)
+        return self.add_edge(pipe, up_node, down_node)
+
+    def add_nozzle(self, up_node, elevation=0):
+        nozzle = self.nozzle()
+        nozzle.set_factor(NOZZLE_FACTOR, 'gpm/psi^0.5')
+        nozzle.set_required_pressure(REQUIRED_PRESSURE, 'psi')
+        end_node = self.add_node(self.end_node(), elevation)
+        return self.add_edge(nozzle, up_node, end_node)
+
+    def add_source(self, source):
+        if source == 'input':
+            return self.add_node(self.input_node())
+        if source == 'reservoir':
+            return self.add_node(self.end_node(), RESERVOIR_ELEVATION)
+        raise ValueError('Unknown source %s' % source)
+
+
+def sprinkler_tree(branches, heads_per_branch, source='reservoir',
+                   compact=False):
+    """
+    Branched sprinkler system: a feed main ending in a cross main that
+    feeds every branch line, each holding a nozzle at every head
+    :param branches: number of branch lines
+    :param heads_per_branch: nozzles along each branch line
+    :param source: 'reservoir' or 'input'
+    :rtype: PNetwork
+    """
+    builder = _Builder(compact)
+    supply = builder.add_source(source)
+    main_node = builder.add_node(builder.connection_node())
+    branch_flow = heads_per_branch * NOZZLE_FLOW
+    builder.add_pipe(supply, main_node, 30,
+                     sized_diameter(branches * branch_flow, FEED_DIAMETER))
+    for branch in range(branches):
+        if branch:
+            next_main = builder.add_node(builder.connection_node())
+            builder.add_pipe(main_node, next_main, 3, sized_diameter(
+                (branches - branch) * branch_flow, MAIN_DIAMETER))
+            main_node = next_main
+        line_node = main_node
+        for head in range(heads_per_branch):
+            head_node = builder.add_node(builder.connection_node())
+            builder.add_pipe(line_node, head_node, 3, sized_diameter(
+                (heads_per_branch - head) * NOZZLE_FLOW, BRANCH_DIAMETER))
+            builder.add_nozzle(head_node)
+            line_node = head_node
+    return builder.network
+
+
+def gridded_system(rows, columns, source='reservoir', compact=False):
+    """
+    Looped system: a rows x columns grid of pipes, fed at one corner, with
+    a nozzle at every crossing. Every pipe is sized for half the nozzles
+    from its downstream crossing to the far corner, as it shares them with
+    the pipe reaching that crossing from the other side
+    :rtype: PNetwork
+    """
+    builder = _Builder(compact)
+    supply = builder.add_source(source)
+    grid = [[builder.add_node(builder.connection_node())
+             for _ in range(columns)] for _ in range(rows)]
+    builder.add_pipe(supply, grid[0][0], 30, sized_diameter(
+        rows * columns * NOZZLE_FLOW, FEED_DIAMETER))
+
+    def diameter(row, column):
+        nozzles = (rows - row) * (columns - column)
+        return sized_diameter(nozzles * NOZZLE_FLOW / 2., MAIN_DIAMETER)
+    for row in range(rows):
+        for column in range(columns):
+            if column + 1 < columns:
+                builder.add_pipe(grid[row][column], grid[row][column + 1], 3,
+                                 diameter(row, column + 1))
+            if row + 1 < rows:
+                builder.add_pipe(grid[row][column], grid[row + 1][column], 3,
+                                 diameter(row + 1, column))
+            builder.add_nozzle(grid[row][column])
+    return builder.network
+
+
+def multi_reservoir(reservoirs, junctions, demand=50, compact=False):
+    """
+    Ring main of junctions drawing demand gpm each, fed by reservoirs of
+    decreasing elevation spread evenly along the ring
+    :rtype: PNetwork
+    """
+    assert 0 < reservoirs <= junctions
+    builder = _Builder(compact)
+    ring = []
+    for _ in range(junctions):
+        ring.append(builder.add_node(builder.connection_node()))
+        builder.network.node_at(ring[-1]).set_output_flow(demand, 'gpm')
+    for position in range(junctions):
+        builder.add_pipe(ring[position], ring[(position + 1) % junctions],
+                         200, 8)
+    for reservoir in range(reservoirs):
+        elevation = RESERVOIR_ELEVATION - 5 * reservoir / float(reservoirs)
+        tank = builder.add_node(builder.end_node(), elevation)
+        junction = ring[reservoir * junctions // reservoirs]
+        builder.add_pipe(tank, junction, 500, 10)
+    return builder.network
+
+
+def eductor_deluge(sets, nozzles_per_set, compact=False):
+    """
+    Foam deluge sets fed from a reservoir: each one draws concentrate
+    through an eductor and discharges it through nozzles in parallel
+    :rtype: PNetwork
+    """
+    builder = _Builder(compact)
+    header = builder.add_source('reservoir')
+    set_flow = nozzles_per_set * NOZZLE_FLOW
+    set_diameter = sized_diameter(set_flow, MAIN_DIAMETER)
+    for cont in range(sets):
+        next_header = builder.add_node(builder.connection_node())
+        builder.add_pipe(header, next_header, 10, sized_diameter(
+            (sets - cont) * set_flow, FEED_DIAMETER))
+        header = next_header
+        inlet = builder.add_node(EductorInlet())
+        builder.add_pipe(header, inlet, 3, set_diameter)
+        outlet = builder.add_node(EductorOutlet())
+        eductor = Eductor()
+        eductor.set_factor(7.0, 'gpm/psi^0.5')
+        eductor.concentration = 0.03
+        builder.add_edge(eductor, inlet, outlet)
+        manifold = builder.add_node(builder.connection_node())
+        builder.add_pipe(outlet, manifold, 2, set_diameter)
+        for _ in range(nozzles_per_set):
+            builder.add_nozzle(manifold)
+    return builder.network
+
+
+def build(kind, edge_count, source='reservoir', compact=False):
+    """
+    Builds a network of the given kind with about edge_count edges
+    :param kind: one of :data:`KINDS`
+    :rtype: PNetwork
+    """
+    if kind == 'tree':
+        heads = min(10, max(1, edge_count // 2))
+        return sprinkler_tree(max(1, edge_count // (2 * heads + 1)), heads,
+                              source, compact)
+    if kind == 'grid':
+        side = max(1, int((edge_count / 3.) ** 0.5))
+        return gridded_system(side, side, source, compact)
+    if kind == 'reservoirs':
+        junctions = max(2, edge_count // 2)
+        return multi_reservoir(max(1, junctions // 10), junctions,
+                               compact=compact)
+    if kind == 'deluge':
+        nozzles = 4
+        return eductor_deluge(max(1, edge_count // (nozzles + 4)), nozzles,
+                              compact)
+    raise ValueError('Unknown network kind %s' % kind)
@@ -0,0 +1,85 @@
+import unittest
+
+import network_generator
+from edges import Nozzle, Pipe
+from eductor import Eductor
+from nodes import InputNode, EndNode
+from solvers import UserSolver, RemoteNozzleSolver
+
+
+class NetworkGeneratorTests(unittest.TestCase):
+    def test_sprinkler_tree(self):
+        network = network_generator.sprinkler_tree(3, 4, 'input')
+        self.assertTrue(network.is_connected())
+        self.assertEqual(len(network.get_edges()), 1 + 2 + 3 * 4 * 2)
+        self.assertTrue(isinstance(network.node_at(0), InputNode))
+        nozzles = [edge for edge in network.get_edges()
+                   if isinstance(edge, Nozzle)]
+        self.assertEqual(len(nozzles), 12)
+
+    def test_gridded_system(self):
+        network = network_generator.gridded_system(3, 4)
+        self.assertTrue(network.is_connected())
+        self.assertTrue(isinstance(network.node_at(0), EndNode))
+        self.assertEqual(len(network.get_edges()), 1 + 3 * 3 + 2 * 4 + 12)
+
+    def test_multi_reservoir(self):
+        network = network_generator.multi_reservoir(2, 6)
+        self.assertTrue(network.is_connected())
+        self.assertEqual(len(network.get_nodes()), 8)
+        self.assertEqual(len(network.get_edges()), 8)
+
+    def test_eductor_deluge(self):
+        network = network_generator.eductor_deluge(2, 3)
+        self.assertTrue(network.is_connected())
+        eductors = [edge for edge in network.get_edges()
+                    if isinstance(edge, Eductor)]
+        self.assertEqual(len(eductors), 2)
+
+    def test_build_sizes(self):
+        for kind in network_generator.KINDS:
+            network = network_generator.build(kind, 200)
+            self.assertTrue(network.is_connected())
+            self.assertTrue(100 < len(network.get_edges()) <= 200)
+        self.assertRaises(ValueError, network_generator.build, 'ring', 10)
+
+    def test_generated_networks_solve(self):
+        network = network_generator.sprinkler_tree(2, 3, 'input')
+        RemoteNozzleSolver(network).solve_system()
+        for edge in network.get_edges():
+            if isinstance(edge, Nozzle):
+                pressure = edge.input_node.get_pressure('psi')
+                self.assertGreaterEqual(pressure, 7 - 1e-6)
+        solver = UserSolver(network_generator.gridded_system(3, 3),
+                            collect_stats=True)
+        solver.solve_system()
+        self.assertTrue(solver.stats.converged)
+
+    def test_built_networks_converge(self):
+        for kind in network_generator.KINDS:
+            for edge_count in (1, 10, 100):
+                network = network_generator.build(kind, edge_count)
+                self.assertTrue(UserSolver(network).solve_system())
+                if kind in ('tree', 'grid'):
+                    network = network_generator.build(kind, edge_count,
+                                                      'input')
+                    self.assertTrue(
+                        RemoteNozzleSolver(network).solve_system())
+
+    def test_pipes_are_sized_for_their_demand(self):
+        network = network_generator.build('tree', 1000)
+        diameters = []
+        for edge in network.get_edges()[1:]:
+            downstream = edge.output_node.get_output_pipes()
+            if isinstance(edge, Pipe) and not any(
+                    isinstance(pipe, Nozzle) for pipe in downstream):
+                diameters.append(edge.get_inner_diam('in'))
+        self.assertEqual(diameters, sorted(diameters, reverse=True))
+        self.assertGreater(diameters[0], diameters[-1])
+        self.assertGreater(network.edge_at(0).get_inner_diam('in'),
+                           network_generator.FEED_DIAMETER)
+        self.assertAlmostEqual(network_generator.sized_diameter(0, 2.), 2.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -110,6 +110,108 @@ class NetworkTests(unittest.TestCase):
         with self.assertRaises(IndexError):
             self.four_res.set_pipe_name(1, 0)
 
+    def test_renamed_elements_are_found(self):
+        self.four_res.set_node_name(1, 'n1')
+        self.node1.name = 'junction'
+        self.assertEqual(self.four_res.get_node_index_by_name('junction'), 1)
+        with self.assertRaises(ValueError):
+            self.four_res.get_node_index_by_name('n1')
+        self.four_res.set_pipe_name(-1, 'z0')
+        self.assertEqual(self.four_res.get_edge_index_by_name('z0'), 1)
+        self.four_res.set_pipe_name(1, 'z1')
+        with self.assertRaises(IndexError):
+            self.four_res.get_edge_index_by_name('z0')
+        self.four_res.set_pipe_name(0, 'z0')
+        self.assertEqual(self.four_res.get_edge_index_by_name('z0'), 0)
+
+    def test_renames_reach_their_networks_alone(self):
+        self.four_res.set_node_name(1, 'n1')
+        self.four_res.set_pipe_name(0, 'p0')
+        other = PNetwork()
+        other_node = ConnectionNode()
+        other.add_node(other_node)
+        other_node.name = 'other'
+        self.assertEqual(other.get_node_index_by_name('other'), 0)
+        with self.assertRaises(ValueError):
+            self.four_res.get_node_index_by_name('other')
+        copy, clones = self.four_res.copy_without(set())
+        clones[self.pipe0].name = 'copied'
+        self.assertEqual(copy.get_edge_index_by_name('copied'), 0)
+        self.assertEqual(self.four_res.get_edge_index_by_name('p0'), 0)
+        with self.assertRaises(IndexError):
+            self.four_res.get_edge_index_by_name('copied')
+        removed = ConnectionNode()
+        self.four_res.add_node(removed)
+        self.four_res.remove_node(3)
+        removed.name = 'removed'
+        with self.assertRaises(ValueError):
+            self.four_res.get_node_index_by_name('removed')
+        with self.assertRaises(ValueError):
+            self.four_res.get_node_index(removed)
+        self.assertEqual(self.four_res.get_node_index_by_name('n1'), 1)
+
+    def test_indexes_follow_removals_and_renames(self):
+        input_node = InputNode()
+        self.four_res.add_node(ConnectionNode())
+        self.four_res.add_node(input_node)
+        pipe1 = Pipe()
+        self.four_res.add_edge(Pipe())
+        self.four_res.add_edge(pipe1)
+        self.assertEqual(self.four_res.search_input_index(), 4)
+        self.four_res.remove_node(3)
+        self.four_res.remove_edge(2)
+        input_node.name = 'input'
+        pipe1.name = 'p1'
+        self.assertEqual(self.four_res.get_node_index(input_node), 3)
+        self.assertEqual(self.four_res.get_node_index_by_name('input'), 3)
+        self.assertEqual(self.four_res.search_input_index(), 3)
+        self.assertEqual(self.four_res.get_edge_index(pipe1), 2)
+        self.assertEqual(self.four_res.get_edge_index_by_name('p1'), 2)
+        self.assertEqual(self.four_res.get_node_index(self.nozzle_end), 2)
+        self.assertEqual(self.four_res.get_edge_index(self.nozzle0), 1)
+
+    def test_element_index(self):
+        self.assertEqual(self.four_res.get_node_index(self.nozzle_end), 2)
+        self.assertEqual(self.four_res.get_edge_index(self.nozzle0), 1)
+        with self.assertRaises(ValueError):
+            self.four_res.get_node_index(EndNode())
+        with self.assertRaises(IndexError):
+            self.four_res.get_edge_index(Pipe())
+
+    def test_remove_elements(self):
+        self.four_res.add_node(ConnectionNode())
+        input_node = InputNode()
+        input_node.name = 'input'
+        self.four_res.add_node(input_node)
+        self.four_res.add_edge(Pipe())
+        pipe2 = Pipe()
+        pipe2.name = 'p2'
+        self.four_res.add_edge(pipe2)
+        with self.assertRaises(IndexError):
+            self.four_res.remove_edge(0)
+        with self.assertRaises(IndexError):
+            self.four_res.remove_node(0)
+        self.four_res.remove_edge(2)
+        self.four_res.remove_node(3)
+        self.assertEqual(self.four_res.get_edge_index(pipe2), 2)
+        self.assertEqual(self.four_res.get_edge_index_by_name('p2'), 2)
+        self.assertEqual(self.four_res.get_node_index_by_name('input'), 3)
+        self.assertEqual(self.four_res.search_input_index(), 3)
+        self.four_res.remove_node(3)
+        self.assertIsNone(self.four_res.search_input_index())
+        self.four_res.add_node(InputNode())
+
+    def test_topology_version(self):
+        version = self.four_res.topology_version
+        self.four_res.topology_cache()['key'] = 'value'
+        self.four_res.set_pipe_name(0, 'p0')
+        self.assertEqual(self.four_res.topology_version, version)
+        self.assertEqual(self.four_res.topology_cache(), {'key': 'value'})
+        self.four_res.separate_node_from_edge(1, 1)
+        self.four_res.connect_node_downstream_edge(1, 1)
+        self.assertEqual(self.four_res.topology_version, version + 2)
+        self.assertEqual(self.four_res.topology_cache(), {})
+
     def test_detach_node_and_downstream(self):
         nozzle = Nozzle()
         self.four_res.add_edge(nozzle)
@@ -184,6 +286,31 @@ class CompletenessTests(unittest.TestCase):
         p_network.add_node(node2)
         self.assertFalse(p_network.is_connected())
 
+    def test_components_and_orphan_edges(self):
+        p_network = self.build_small_network()
+        p_network.connect_node_downstream_edge(0, 0)
+        p_network.connect_node_upstream_edge(1, 0)
+        p_network.add_node(ConnectionNode())
+        p_network.add_node(EndNode())
+        p_network.add_edge(Pipe())
+        p_network.add_edge(Pipe())
+        p_network.connect_node_downstream_edge(2, 2)
+        p_network.connect_node_upstream_edge(3, 2)
+        p_network.connect_node_downstream_edge(2, 1)
+        components, orphan_edges = p_network.connectivity()
+        self.assertEqual(components, [[0, 1], [2, 3]])
+        self.assertEqual(orphan_edges, [1])
+
+    def test_long_pipeline_is_connected(self):
+        p_network = PNetwork()
+        p_network.add_node(EndNode())
+        for cont in range(5000):
+            p_network.add_node(ConnectionNode())
+            p_network.add_edge(Pipe())
+            p_network.connect_node_downstream_edge(cont, cont)
+            p_network.connect_node_upstream_edge(cont + 1, cont)
+        self.assertTrue(p_network.is_connected())
+
 
 if __name__ == '__main__':
     unittest.main()
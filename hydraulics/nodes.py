@@ -13,6 +13,7 @@ class Node(object):
         self.output_pipes = []
         self.input_pipes = []
         self._name = None
+        self._networks = ()
         self.energy = None
         self._out_flow = physics.VolFlow(0, 'gpm')
 
@@ -29,8 +30,19 @@ class Node(object):
 
     @name.setter
     def name(self, name):
-        name = str(name)
-        self._name = name
+        self._name = str(name)
+        for network in self._networks:
+            network.node_renamed()
+
+    def add_network(self, network):
+        """
+        Lets a network holding the node know whenever it is renamed
+        """
+        self._networks += (network,)
+
+    def remove_network(self, network):
+        self._networks = tuple(owner for owner in self._networks
+                               if owner is not network)
 
     def get_elevation(self, unit):
         return self.elevation.values[unit]
@@ -48,6 +60,11 @@ class Node(object):
             self.energy = physics.Pressure(elevation_m + press_meters, 'mH2O')
             return self.energy.values[unit]
 
+    def has_energy(self):
+        if self.energy:
+            return True
+        return self.elevation is not None and self._pressure is not None
+
     def set_output_pipe(self, pipe):
         self.output_pipes.append(pipe)
 
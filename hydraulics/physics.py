@@ -1,32 +1,103 @@
+import numpy as np
+
 WMETER_TO_PSI = 1.4219702
 # GAL_TO_LT = 3.785411
 PSI_TO_KPA = 6.894757
 IN_TO_MM = 25.4
 
 
+class _MeasureType(type):
+    """
+    Keeps every :class:`Measure` subclass free of an instance dict and
+    indexes its units once
+    """
+    def __new__(mcs, name, bases, attributes):
+        attributes.setdefault('__slots__', ())
+        return super(_MeasureType, mcs).__new__(mcs, name, bases, attributes)
+
+    def __init__(cls, name, bases, attributes):
+        super(_MeasureType, cls).__init__(name, bases, attributes)
+        cls.unit_indexes = dict((unit, index)
+                                for index, unit in enumerate(cls.units))
+
+
 class Measure(object):
+    """
+    A value along with the unit it was given in. Conversions to other
+    units happen only when they are read, through ``values[unit]``
+    """
+    __metaclass__ = _MeasureType
+    __slots__ = ('_value', '_unit_index')
     units = []
     conversion = [[]]
 
     def __init__(self, value=None, unit=None):
-        self.values = {}
+        self._value = None
+        self._unit_index = None
         if unit:
             self.set_single_value(value, unit)
 
     def set_single_value(self, value, unit):
         """
-        Define the values for the whole list of possible units
+        Define the value of the measure
         :param value: the referential value
         :type value: float
         :param unit: the referential unit
         :type unit: str
         :return:
         """
-        u_index = self.__class__.units.index(unit)
-        conversion_factors = self.__class__.conversion[u_index]
-        for cont in range(len(self.__class__.units)):
-            current_unit = self.__class__.units[cont]
-            self.values[current_unit] = value * conversion_factors[cont]
+        try:
+            self._unit_index = self.unit_indexes[unit]
+        except KeyError:
+            raise ValueError('%s is not a unit of %s' %
+                             (unit, self.__class__.__name__))
+        self._value = value
+
+    @property
+    def values(self):
+        """
+        Read only mapping from every unit to the value in it, kept for the
+        ``values[unit]`` access of the former dict
+        """
+        return self
+
+    def __getitem__(self, unit):
+        if self._unit_index is None:
+            raise KeyError(unit)
+        factors = self.conversion[self._unit_index]
+        return self._value * factors[self.unit_indexes[unit]]
+
+    @classmethod
+    def factor(cls, from_unit, to_unit):
+        """
+        Factor taking values in from_unit to to_unit
+        :rtype: float
+        """
+        try:
+            return cls.conversion[cls.unit_indexes[from_unit]][
+                cls.unit_indexes[to_unit]]
+        except KeyError as error:
+            raise ValueError('%s is not a unit of %s' %
+                             (error.args[0], cls.__name__))
+
+    @classmethod
+    def convert(cls, values, from_unit, to_unit):
+        """
+        Converts a whole array of values at once, without creating a
+        measure per value
+        :param values: array like of values in from_unit
+        :rtype: numpy.ndarray
+        """
+        return np.asarray(values, dtype=float) * cls.factor(from_unit,
+                                                            to_unit)
+
+    def keys(self):
+        if self._unit_index is None:
+            return []
+        return list(self.units)
+
+    def items(self):
+        return [(unit, self[unit]) for unit in self.keys()]
 
 
 class Pressure(Measure):
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+import physics
+
+
+class MeasureTests(unittest.TestCase):
+    def test_conversions(self):
+        pressure = physics.Pressure(1, 'psi')
+        self.assertEqual(pressure.values['psi'], 1)
+        self.assertAlmostEqual(pressure.values['kPa'], physics.PSI_TO_KPA)
+        self.assertAlmostEqual(pressure.values['mH2O'],
+                               1 / physics.WMETER_TO_PSI)
+        length = physics.Length(1, 'ft')
+        self.assertAlmostEqual(length.values['in'], 12)
+        self.assertAlmostEqual(length.values['m'], 0.3048)
+
+    def test_reset_value(self):
+        pressure = physics.Pressure(1, 'psi')
+        pressure.set_single_value(10, 'mH2O')
+        self.assertEqual(pressure.values['mH2O'], 10)
+        self.assertAlmostEqual(pressure.values['psi'],
+                               10 * physics.WMETER_TO_PSI)
+
+    def test_unknown_units(self):
+        pressure = physics.Pressure(1, 'psi')
+        self.assertRaises(ValueError, pressure.set_single_value, 1, 'bar')
+        self.assertRaises(KeyError, lambda: pressure.values['bar'])
+        self.assertRaises(KeyError, lambda: physics.Pressure().values['psi'])
+
+    def test_values_mapping(self):
+        flow = physics.VolFlow(10, 'gpm')
+        self.assertEqual(sorted(flow.values.keys()), sorted(flow.units))
+        self.assertEqual(dict(flow.values.items())['gpm'], 10)
+        self.assertEqual(physics.VolFlow().values.keys(), [])
+
+    def test_array_conversion(self):
+        pressures = [1, 10.5, 30]
+        kpa = physics.Pressure.convert(pressures, 'psi', 'kPa')
+        for cont in range(3):
+            measure = physics.Pressure(pressures[cont], 'psi')
+            self.assertEqual(kpa[cont], measure.values['kPa'])
+        self.assertTrue(np.allclose(
+            physics.Pressure.convert(kpa, 'kPa', 'psi'), pressures))
+        flows = np.array([[10, 20], [30, 40]])
+        self.assertEqual(physics.VolFlow.convert(flows, 'gpm', 'lpm').shape,
+                         (2, 2))
+        self.assertAlmostEqual(physics.Length.factor('ft', 'in'), 12)
+        self.assertAlmostEqual(
+            physics.NozzleK.convert([1], 'gpm/psi^0.5', 'lpm/bar^0.5')[0],
+            physics.NozzleK(1, 'gpm/psi^0.5').values['lpm/bar^0.5'])
+        self.assertRaises(ValueError, physics.Length.convert, [1], 'm', 'yd')
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            physics.Length(1, 'm').extra = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,50 @@
+import copy
+
 from nodes import InputNode, EndNode
 
 
 class PNetwork(object):
+    """
+    Nodes and edges of a piping system. Besides the lists, the network keeps
+    the index of every element and of the first element holding each name,
+    so adding, naming and searching take constant time. Elements given a
+    name directly tell the networks holding them, through
+    :func:`node_renamed` and :func:`edge_renamed`, and the name index of
+    those networks alone is rebuilt on their next search.
+
+    Every change to the nodes, edges or their connections made through the
+    network bumps :attr:`topology_version` and empties
+    :func:`topology_cache`, where the solvers keep what they derive from the
+    topology alone
+    """
     def __init__(self):
         self._net_nodes = []
         self._net_edges = []
+        self._node_indexes = {}
+        self._edge_indexes = {}
+        self._node_names = {}
+        self._edge_names = {}
+        self._are_node_names_stale = False
+        self._are_edge_names_stale = False
+        self._input_index = None
+        self._topology_version = 0
+        self._topology_cache = {}
         self._deleted_edge = None
         self.detached_nozzle_index = None
         self.unplugged_node_index = None
-        self._visited_nodes = None
 
     def add_node(self, node):
-        assert node not in self._net_nodes
+        assert node not in self._node_indexes
         if isinstance(node, InputNode):
-            for each_node in self._net_nodes:
-                if isinstance(each_node, InputNode):
-                    raise AttributeError
+            if self._input_index is not None:
+                raise AttributeError
+            self._input_index = len(self._net_nodes)
+        self._node_indexes[node] = len(self._net_nodes)
+        if node.name is not None:
+            self._node_names.setdefault(node.name, len(self._net_nodes))
         self._net_nodes.append(node)
+        node.add_network(self)
+        self._topology_changed()
 
     def get_nodes(self):
         return self._net_nodes
@@ -25,8 +53,13 @@ class PNetwork(object):
         return self._net_nodes[node_index]
 
     def add_edge(self, edge):
-        assert edge not in self._net_edges
+        assert edge not in self._edge_indexes
+        self._edge_indexes[edge] = len(self._net_edges)
+        if edge.name is not None:
+            self._edge_names.setdefault(edge.name, len(self._net_edges))
         self._net_edges.append(edge)
+        edge.add_network(self)
+        self._topology_changed()
 
     def get_edges(self):
         return self._net_edges
@@ -34,45 +67,130 @@ class PNetwork(object):
     def edge_at(self, edge_index):
         return self._net_edges[edge_index]
 
+    @property
+    def topology_version(self):
+        """
+        Count of the changes made to the nodes, edges and connections
+        :rtype: int
+        """
+        return self._topology_version
+
+    def topology_cache(self):
+        """
+        Dict for structures derived from the topology alone. It is emptied
+        whenever the topology changes, so whatever is found in it is current
+        :rtype: dict
+        """
+        return self._topology_cache
+
+    def _topology_changed(self):
+        self._topology_version += 1
+        self._topology_cache = {}
+
+    def get_node_index(self, node):
+        """
+        :return: position of node in the network
+        :raise ValueError: if node is not part of it
+        """
+        try:
+            return self._node_indexes[node]
+        except KeyError:
+            raise ValueError
+
+    def get_edge_index(self, edge):
+        """
+        :return: position of edge in the network
+        :raise IndexError: if edge is not part of it
+        """
+        try:
+            return self._edge_indexes[edge]
+        except KeyError:
+            raise IndexError
+
     def get_node_index_by_name(self, name):
-        cont = 0
-        for node in self._net_nodes:
-            if node.name == name:
-                return cont
-            cont += 1
-        raise ValueError
+        self._update_node_names()
+        try:
+            return self._node_names[name]
+        except KeyError:
+            raise ValueError
 
     def get_edge_index_by_name(self, name):
-        cont = 0
-        for edge in self.get_edges():
-            if edge.name == name:
-                return cont
-            cont += 1
-        raise IndexError
+        self._update_edge_names()
+        try:
+            return self._edge_names[name]
+        except KeyError:
+            raise IndexError
+
+    def node_renamed(self):
+        """
+        Called by the nodes of the network whenever they are renamed
+        """
+        self._are_node_names_stale = True
+
+    def edge_renamed(self):
+        """
+        Called by the edges of the network whenever they are renamed
+        """
+        self._are_edge_names_stale = True
+
+    def _update_node_names(self):
+        if self._are_node_names_stale:
+            self._node_names = self._index_names(self._net_nodes)
+            self._are_node_names_stale = False
+
+    def _update_edge_names(self):
+        if self._are_edge_names_stale:
+            self._edge_names = self._index_names(self._net_edges)
+            self._are_edge_names_stale = False
+
+    @staticmethod
+    def _index_names(elements):
+        names = {}
+        for index in range(len(elements) - 1, -1, -1):
+            if elements[index].name is not None:
+                names[elements[index].name] = index
+        return names
 
     def connect_node_upstream_edge(self, node_index, edge_index):
         node = self.node_at(node_index)
         edge = self.edge_at(edge_index)
         node.set_input_pipe(edge)
         edge.output_node = node
+        self._topology_changed()
 
     def connect_node_downstream_edge(self, node_index, edge_index):
         node = self.node_at(node_index)
         edge = self.edge_at(edge_index)
         node.set_output_pipe(edge)
         edge.input_node = node
+        self._topology_changed()
 
     def set_node_name(self, index, name):
-        for node in self._net_nodes:
-            if node.name == name:
-                raise IndexError
-        self._net_nodes[index].name = name
+        self._update_node_names()
+        if str(name) in self._node_names:
+            raise IndexError
+        node = self._net_nodes[index]
+        index = self._node_indexes[node]
+        self._forget_name(self._node_names, node.name, index)
+        node.name = name
+        self._node_names[node.name] = index
+        self._are_node_names_stale = False
 
     def set_pipe_name(self, index, name):
-        for pipe in self._net_edges:
-            if pipe.name == str(name):
-                raise IndexError('Nombre %s usado para %d' % (str(name), index))
-        self.edge_at(index).name = name
+        self._update_edge_names()
+        if str(name) in self._edge_names:
+            raise IndexError('Nombre %s usado para %d' % (str(name), index))
+        edge = self.edge_at(index)
+        index = self._edge_indexes[edge]
+        self._forget_name(self._edge_names, edge.name, index)
+        edge.name = name
+        self._edge_names[edge.name] = index
+        self._are_edge_names_stale = False
+
+    @staticmethod
+    def _forget_name(names, old_name, index):
+        if old_name is not None and names.get(old_name) == index:
+            del names[old_name]
 
     def separate_node_from_edge(self, node_index, edge_index):
         edge = self.edge_at(edge_index)
@@ -83,6 +201,7 @@ class PNetwork(object):
             self._separate_edge_from_output(edge_index, node_index)
         else:
             raise IndexError
+        self._topology_changed()
 
     def _separate_edge_from_output(self, edge_index, node_index):
         connected_pipes = self.node_at(node_index).get_input_pipes()
@@ -101,10 +220,50 @@ class PNetwork(object):
                 break
         self.edge_at(edge_index).clear_input()
 
+    def remove_node(self, node_index):
+        """
+        Takes a node without edges out of the network. The nodes after it
+        move one position back
+        :raise IndexError: if the node still has edges
+        """
+        node = self.node_at(node_index)
+        if node.get_input_pipes() or node.get_output_pipes():
+            raise IndexError
+        node_index = self._node_indexes[node]
+        del self._net_nodes[node_index]
+        node.remove_network(self)
+        self._node_indexes = self._index_elements(self._net_nodes)
+        self._node_names = self._index_names(self._net_nodes)
+        self._are_node_names_stale = False
+        if self._input_index == node_index:
+            self._input_index = None
+        elif self._input_index > node_index:
+            self._input_index -= 1
+        self._topology_changed()
+
+    def remove_edge(self, edge_index):
+        """
+        Takes an edge detached from its nodes out of the network. The edges
+        after it move one position back
+        :raise IndexError: if the edge still has a node
+        """
+        edge = self.edge_at(edge_index)
+        if edge.input_node is not None or edge.output_node is not None:
+            raise IndexError
+        del self._net_edges[self._edge_indexes[edge]]
+        edge.remove_network(self)
+        self._edge_indexes = self._index_elements(self._net_edges)
+        self._edge_names = self._index_names(self._net_edges)
+        self._are_edge_names_stale = False
+        self._topology_changed()
+
+    @staticmethod
+    def _index_elements(elements):
+        return dict((elements[index], index)
+                    for index in range(len(elements)))
+
     def search_input_index(self):
-        for cont in range(len(self._net_nodes)):
-            if isinstance(self.node_at(cont), InputNode):
-                return cont
+        return self._input_index
 
     def show_network(self):
         print "Node Pressure"
@@ -116,17 +275,101 @@ class PNetwork(object):
             print "%s: %.4f gpm" % (edge.name, edge.calculate_gpm_flow())
 
     def is_connected(self):
+        if not self._net_nodes:
+            raise IndexError
+        components, orphan_edges = self.connectivity()
+        return not orphan_edges and len(components) == 1
+
+    def connectivity(self):
+        """
+        Groups the nodes joined through edges, in a single pass over the
+        edges
+        :return: the components, each a list of node indexes, ordered by
+            their first node, and the indexes of the orphan edges, those
+            lacking a network node at some end
+        """
+        parents = range(len(self._net_nodes))
+        orphan_edges = []
+        for edge_index in range(len(self._net_edges)):
+            edge = self._net_edges[edge_index]
+            ends = (self._node_indexes.get(edge.input_node),
+                    self._node_indexes.get(edge.output_node))
+            if None in ends:
+                orphan_edges.append(edge_index)
+                continue
+            in_root = _find_root(parents, ends[0])
+            out_root = _find_root(parents, ends[1])
+            if in_root != out_root:
+                parents[max(in_root, out_root)] = min(in_root, out_root)
+        components = []
+        component_at = {}
+        for node_index in range(len(parents)):
+            root = _find_root(parents, node_index)
+            if root not in component_at:
+                component_at[root] = len(components)
+                components.append([])
+            components[component_at[root]].append(node_index)
+        return components, orphan_edges
+
+    def copy_without(self, elements):
+        """
+        Copy of the network leaving some nodes and edges out. Kept edges
+        must not end at a node left out. The copies own their measures, so
+        solving the copy leaves the network untouched
+        :param elements: set of the nodes and edges to leave out
+        :return: the copy and a dict from every kept element to its copy
+        """
+        network = PNetwork()
+        clones = {}
+        for node in self._net_nodes:
+            if node not in elements:
+                clones[node] = _clone(node)
+                network.add_node(clones[node])
         for edge in self._net_edges:
-            if not edge.connects():
-                return False
-        self._visited_nodes = []
-        self._visit(self.node_at(0))
-        return set(self._visited_nodes) == set(self._net_nodes)
-
-    def _visit(self, cur_node):
-        down_nodes = [edge.output_node for edge in cur_node.get_output_pipes()]
-        up_nodes = [edge.input_node for edge in cur_node.get_input_pipes()]
-        self._visited_nodes.append(cur_node)
-        for node in (down_nodes + up_nodes):
-            if node not in self._visited_nodes:
-                self._visit(node)
+            if edge not in elements:
+                clones[edge] = _clone(edge)
+                clones[edge]._input_node = clones[edge.input_node]
+                clones[edge]._output_node = clones[edge.output_node]
+                network.add_edge(clones[edge])
+        for node in self._net_nodes:
+            if node not in elements:
+                kind = type(node.input_pipes)
+                clones[node].input_pipes = kind(
+                    clones[pipe] for pipe in node.input_pipes
+                    if pipe not in elements)
+                clones[node].output_pipes = kind(
+                    clones[pipe] for pipe in node.output_pipes
+                    if pipe not in elements)
+        return network, clones
+
+    def cyclomatic_number(self):
+        """
+        Number of independent loops: connected edges minus nodes plus
+        components. It is zero when the network holds no loop
+        :rtype: int
+        """
+        components, orphan_edges = self.connectivity()
+        return (len(self._net_edges) - len(orphan_edges) -
+                len(self._net_nodes) + len(components))
+
+
+def _find_root(parents, index):
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def _clone(element):
+    """
+    Shallow copy of a node or an edge owning copies of its measures, held
+    by no network yet
+    """
+    clone = copy.copy(element)
+    clone._networks = ()
+    # Measures are told by their interface: nodes and edges import the
+    # physics module under different names
+    for name, value in getattr(clone, '__dict__', {}).items():
+        if hasattr(value, 'set_single_value'):
+            setattr(clone, name, copy.copy(value))
+    return clone
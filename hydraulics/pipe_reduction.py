@@ -0,0 +1,291 @@
+"""Series and parallel reduction of the pipes of a network.
+
+Pipes joined end to end through connection nodes that draw no flow and
+hold nothing else carry the same flow, so their Hazen-Williams losses add
+up: the chain behaves as one pipe whose coefficient is the sum of theirs.
+Pipes joining the same pair of nodes share their head instead, and behave
+as one pipe of coefficient (sum k^(-0.54))^(-1/0.54). :class:`PipeReducer`
+replaces both by an :class:`EquivalentPipe`, pass after pass while any is
+found, solves the smaller network and rebuilds the energies of the nodes
+left out and the flows of every original edge.
+
+"""
+from edges import Pipe
+from compact import CompactConnectionNode
+from nodes import ConnectionNode
+from pipe_network import PNetwork
+
+INNER_NODE_TYPES = (ConnectionNode, CompactConnectionNode)
+
+
+class EquivalentPipe(Pipe):
+    """
+    Pipe given by its coefficient alone, standing for several pipes in
+    series or in parallel
+    """
+    def __init__(self, k_pipe):
+        super(EquivalentPipe, self).__init__()
+        self.k_pipe = k_pipe
+
+    def k_flow(self):
+        return self.k_pipe
+
+
+def series_coefficient(k_pipes):
+    return sum(k_pipes)
+
+
+def parallel_coefficient(k_pipes):
+    exponent = 1 / Pipe.C_POWER
+    return sum(k_pipe ** -exponent for k_pipe in k_pipes) ** -Pipe.C_POWER
+
+
+class SeriesChain(object):
+    """
+    Pipes joined end to end between two nodes: pipes[0] leaves start,
+    pipes[i] joins inner_nodes[i - 1] and inner_nodes[i] and the last
+    pipe reaches end
+    """
+    def __init__(self, start, pipes, inner_nodes, end):
+        self.start = start
+        self.pipes = pipes
+        self.inner_nodes = inner_nodes
+        self.end = end
+
+    def k_flow(self):
+        return series_coefficient(pipe.k_flow() for pipe in self.pipes)
+
+    def ends(self):
+        return self.start, self.end
+
+
+class _ReductionPass(object):
+    """
+    One round of reduction: every series chain of the network is merged,
+    then every group of pipes or chains joining the same pair of nodes
+    """
+    def __init__(self, network):
+        # type: (PNetwork) -> None
+        self.network = network
+        self.chains = []
+        self.groups = []
+        self.reduced = None
+        self._clones = None
+
+    def is_trivial(self):
+        return not self.chains and not self.groups
+
+    def find_chains(self):
+        """
+        :rtype: list of :class:`SeriesChain`
+        """
+        chains = []
+        seen = set()
+        for node in self.network.get_nodes():
+            if node in seen or not _is_inner(node):
+                continue
+            first, second = _node_edges(node)
+            back_nodes, back_pipes, start = _walk(node, first)
+            if start is node:
+                seen.update(back_nodes)
+                continue
+            nodes, pipes, end = _walk(node, second)
+            back_nodes.reverse()
+            back_pipes.reverse()
+            inner_nodes = back_nodes + [node] + nodes
+            seen.update(inner_nodes)
+            if start is not end:
+                chains.append(SeriesChain(start, back_pipes + pipes,
+                                          inner_nodes, end))
+        return chains
+
+    def find_groups(self, chains):
+        """
+        Pipes and chains sharing both ends
+        :return: list of groups, each a list of pipes and chains
+        """
+        in_chains = set()
+        for chain in chains:
+            in_chains.update(chain.pipes)
+        branches = [edge for edge in self.network.get_edges()
+                    if isinstance(edge, Pipe) and edge not in in_chains and
+                    edge.input_node is not edge.output_node]
+        branches.extend(chains)
+        by_ends = {}
+        order = []
+        for branch in branches:
+            if isinstance(branch, SeriesChain):
+                ends = frozenset(branch.ends())
+            else:
+                ends = frozenset((branch.input_node, branch.output_node))
+            if ends not in by_ends:
+                by_ends[ends] = []
+                order.append(ends)
+            by_ends[ends].append(branch)
+        return [by_ends[ends] for ends in order if len(by_ends[ends]) > 1]
+
+    def reduce(self):
+        """
+        Builds the network of this pass, copies of every node and edge
+        that remains followed by an :class:`EquivalentPipe` for every chain
+        and group
+        :rtype: PNetwork
+        """
+        self.chains = self.find_chains()
+        self.groups = self.find_groups(self.chains)
+        left_out = set()
+        for chain in self.chains:
+            left_out.update(chain.pipes)
+            left_out.update(chain.inner_nodes)
+        grouped = set()
+        for group in self.groups:
+            grouped.update(group)
+            left_out.update(branch for branch in group
+                            if not isinstance(branch, SeriesChain))
+        reduced, clones = self.network.copy_without(left_out)
+        for chain in self.chains:
+            if chain not in grouped:
+                self._add_equivalent(reduced, clones, chain.ends(),
+                                     chain.k_flow())
+        for group in self.groups:
+            ends = _branch_ends(group[0])
+            k_pipe = parallel_coefficient(branch.k_flow()
+                                          for branch in group)
+            self._add_equivalent(reduced, clones, ends, k_pipe)
+        self._clones = clones
+        self.reduced = reduced
+        return reduced
+
+    @staticmethod
+    def _add_equivalent(reduced, clones, ends, k_pipe):
+        reduced.add_edge(EquivalentPipe(k_pipe))
+        edge_index = len(reduced.get_edges()) - 1
+        reduced.connect_node_downstream_edge(
+            reduced.get_node_index(clones[ends[0]]), edge_index)
+        reduced.connect_node_upstream_edge(
+            reduced.get_node_index(clones[ends[1]]), edge_index)
+
+    def expand(self):
+        """
+        Writes the energies of the reduced network back, rebuilds those of
+        the inner nodes of every chain from the flow along it and updates
+        the flow of every edge
+        """
+        for node in self.network.get_nodes():
+            clone = self._clones.get(node)
+            if clone is None:
+                continue
+            if isinstance(node, ConnectionNode):
+                node.set_energy(clone.get_energy('psi'), 'psi')
+            node.set_output_flow(clone.get_output_flow('gpm'), 'gpm')
+        for chain in self.chains:
+            energy = chain.start.get_energy('psi')
+            head = energy - chain.end.get_energy('psi')
+            flow = 0
+            if head:
+                ratio = head / chain.k_flow()
+                flow = ratio * abs(ratio) ** (1 / Pipe.C_POWER - 1)
+            for pipe, node in zip(chain.pipes, chain.inner_nodes):
+                energy -= (pipe.k_flow() * flow *
+                           abs(flow) ** (Pipe.C_POWER - 1))
+                node.set_energy(energy, 'psi')
+        for edge in self.network.get_edges():
+            edge.calculate_gpm_flow()
+
+
+class PipeReducer(object):
+    """
+    Reduces series chains and parallel pipes of a network, pass after
+    pass, as merging parallel pipes may leave new chains and the other
+    way round
+    """
+    def __init__(self, network):
+        # type: (PNetwork) -> None
+        self.network = network
+        self.passes = []
+        self.reduced = None
+        self.converged = None
+        self.status = None
+
+    def reduce(self):
+        """
+        :return: the network left by the last pass, the original one when
+            nothing could be reduced
+        :rtype: PNetwork
+        """
+        self.passes = []
+        network = self.network
+        while True:
+            reduction = _ReductionPass(network)
+            reduced = reduction.reduce()
+            if reduction.is_trivial():
+                break
+            self.passes.append(reduction)
+            network = reduced
+        self.reduced = network
+        return network
+
+    def expand(self):
+        """
+        Carries the solution of the reduced network back to the original
+        one, through every pass in reverse
+        """
+        for reduction in reversed(self.passes):
+            reduction.expand()
+
+    def solve(self, solver_class, **options):
+        """
+        Reduces the network, solves it with a solver of the given class and
+        expands the solution, unless the solve failed. :attr:`converged`
+        and :attr:`status` tell how it ended
+        :param options: keyword arguments for the solver
+        :return: the solver, holding the reduced network
+        """
+        solver = solver_class(self.reduce(), **options)
+        self.converged = solver.solve_system()
+        self.status = solver.status
+        if self.converged:
+            self.expand()
+        return solver
+
+
+def _node_edges(node):
+    return list(node.get_input_pipes()) + list(node.get_output_pipes())
+
+
+def _other_end(edge, node):
+    return edge.input_node if edge.output_node is node else edge.output_node
+
+
+def _branch_ends(branch):
+    if isinstance(branch, SeriesChain):
+        return branch.ends()
+    return branch.input_node, branch.output_node
+
+
+def _is_inner(node):
+    """
+    Tells whether a node can be merged away: a plain connection node
+    drawing no flow and joining two different pipes
+    """
+    if type(node) not in INNER_NODE_TYPES or node.get_output_flow('gpm'):
+        return False
+    edges = _node_edges(node)
+    return (len(edges) == 2 and edges[0] is not edges[1] and
+            isinstance(edges[0], Pipe) and isinstance(edges[1], Pipe))
+
+
+def _walk(node, pipe):
+    """
+    Follows pipe away from node through inner nodes
+    :return: the inner nodes passed, the pipes taken and the node the walk
+        stopped at, which is node itself around a closed ring
+    """
+    nodes, pipes = [], [pipe]
+    current = _other_end(pipe, node)
+    while current is not node and _is_inner(current):
+        nodes.append(current)
+        pipe = [edge for edge in _node_edges(current) if edge is not pipe][0]
+        pipes.append(pipe)
+        current = _other_end(pipe, current)
+    return nodes, pipes, current
@@ -0,0 +1,149 @@
+import unittest
+
+import numpy as np
+
+import network_generator
+from compact import CompactConnectionNode, CompactEndNode, \
+    CompactInputNode, CompactNozzle, CompactPipe
+from edges import Nozzle, Pipe
+from nodes import ConnectionNode, EndNode, InputNode
+from pipe_network import PNetwork
+from pipe_reduction import PipeReducer, EquivalentPipe, parallel_coefficient
+from solvers import UserSolver, RemoteNozzleSolver
+
+LADDER_PIPES = [(0, 1, 20, 4.026), (1, 2, 20, 4.026), (2, 3, 20, 4.026),
+                (3, 4, 20, 4.026), (4, 5, 20, 4.026), (5, 6, 10, 2.469),
+                (6, 5, 12, 2.067), (5, 7, 5, 2.469), (7, 6, 5, 2.469)]
+
+
+def ladder_network(source='reservoir', compact=False):
+    """
+    A feed of five pipes in series reaching a loop of two parallel pipes
+    and a detour of two more through an inner node, feeding two nozzles
+    """
+    if compact:
+        connection_node, end_node, input_node, pipe_class, nozzle_class = (
+            CompactConnectionNode, CompactEndNode, CompactInputNode,
+            CompactPipe, CompactNozzle)
+    else:
+        connection_node, end_node, input_node, pipe_class, nozzle_class = (
+            ConnectionNode, EndNode, InputNode, Pipe, Nozzle)
+    network = PNetwork()
+    if source == 'input':
+        nodes = [(input_node(), 0)]
+    else:
+        nodes = [(end_node(), network_generator.RESERVOIR_ELEVATION)]
+    nodes += [(connection_node(), elevation)
+              for elevation in (0, 1, 2, 3, 0, 0, 0)]
+    nodes += [(end_node(), 0), (end_node(), 0)]
+    for node_index, (node, elevation) in enumerate(nodes):
+        node.set_elevation(elevation, 'm')
+        if isinstance(node, ConnectionNode):
+            node.set_pressure(0, 'psi')
+        node.name = "n%d" % node_index
+        network.add_node(node)
+    edges = []
+    for up_node, down_node, length, diameter in LADDER_PIPES:
+        pipe = pipe_class()
+        pipe.set_length(length, 'm')
+        pipe.set_inner_diam(diameter, 'in')
+        pipe.set_c_coefficient(120)
+        edges.append((pipe, up_node, down_node))
+    for end_index in (8, 9):
+        nozzle = nozzle_class()
+        nozzle.set_factor(network_generator.NOZZLE_FACTOR, 'gpm/psi^0.5')
+        nozzle.set_required_pressure(network_generator.REQUIRED_PRESSURE,
+                                     'psi')
+        edges.append((nozzle, 6, end_index))
+    for edge_index, (edge, up_node, down_node) in enumerate(edges):
+        edge.name = "e%d" % edge_index
+        network.add_edge(edge)
+        network.connect_node_downstream_edge(up_node, edge_index)
+        network.connect_node_upstream_edge(down_node, edge_index)
+    return network
+
+
+class PipeReductionTests(unittest.TestCase):
+    def assert_same_solution(self, network, expected):
+        for node, other in zip(network.get_nodes(), expected.get_nodes()):
+            self.assertAlmostEqual(node.get_energy('psi'),
+                                   other.get_energy('psi'), 8)
+        for edge, other in zip(network.get_edges(), expected.get_edges()):
+            self.assertAlmostEqual(edge.get_vol_flow('gpm'),
+                                   other.get_vol_flow('gpm'), 8)
+
+    def test_parallel_coefficient(self):
+        k_pipe = parallel_coefficient([2., 2.])
+        self.assertAlmostEqual(k_pipe, 2 * 2 ** -Pipe.C_POWER)
+        head = 3.
+        flow = 2 * (head / 2.) ** (1 / Pipe.C_POWER)
+        self.assertAlmostEqual(k_pipe * flow ** Pipe.C_POWER, head)
+
+    def test_reduce(self):
+        network = ladder_network()
+        reducer = PipeReducer(network)
+        reduced = reducer.reduce()
+        self.assertEqual(len(reducer.passes), 2)
+        self.assertEqual(len(reducer.passes[0].chains), 2)
+        self.assertEqual(len(reducer.passes[0].groups), 1)
+        self.assertEqual(len(reducer.passes[1].chains), 1)
+        self.assertEqual(len(reduced.get_nodes()), 4)
+        self.assertEqual(len(reduced.get_edges()), 3)
+        self.assertTrue(isinstance(reduced.edge_at(2), EquivalentPipe))
+        self.assertTrue(reduced.is_connected())
+        self.assertEqual(len(network.get_edges()), 11)
+
+    def test_sprinkler_tree(self):
+        network = network_generator.sprinkler_tree(3, 4)
+        reducer = PipeReducer(network)
+        reduced = reducer.reduce()
+        self.assertEqual(len(reducer.passes), 1)
+        chain = reducer.passes[0].chains[0]
+        self.assertEqual(chain.inner_nodes, [network.node_at(19)])
+        self.assertEqual(len(reduced.get_edges()),
+                         len(network.get_edges()) - 1)
+
+    def test_gridded_system_is_left_alone(self):
+        network = network_generator.gridded_system(3, 3)
+        reducer = PipeReducer(network)
+        self.assertTrue(reducer.reduce() is network)
+        self.assertEqual(reducer.passes, [])
+
+    def test_user_solver(self):
+        network = ladder_network()
+        expected = ladder_network()
+        reducer = PipeReducer(network)
+        reducer.solve(UserSolver)
+        self.assertTrue(reducer.converged)
+        self.assertEqual(reducer.status, 'converged')
+        UserSolver(expected).solve_system()
+        self.assert_same_solution(network, expected)
+
+    def test_failed_solve_is_not_expanded(self):
+        class NanGuessSolver(UserSolver):
+            def first_guess(self):
+                guess = np.full([self.size, 1], float('nan'))
+                self._update_energies(guess)
+                return guess
+        network = ladder_network()
+        energies = [node.get_energy('psi') for node in network.get_nodes()]
+        reducer = PipeReducer(network)
+        reducer.solve(NanGuessSolver)
+        self.assertFalse(reducer.converged)
+        self.assertEqual(reducer.status, 'diverged')
+        self.assertEqual(
+            [node.get_energy('psi') for node in network.get_nodes()],
+            energies)
+
+    def test_remote_nozzle_solver(self):
+        network = ladder_network('input', compact=True)
+        expected = ladder_network('input')
+        PipeReducer(network).solve(RemoteNozzleSolver)
+        RemoteNozzleSolver(expected).solve_system()
+        self.assert_same_solution(network, expected)
+        self.assertAlmostEqual(network.node_at(0).get_output_flow('gpm'),
+                               expected.node_at(0).get_output_flow('gpm'))
+
+
+if __name__ == '__main__':
+    unittest.main()
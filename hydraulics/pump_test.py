@@ -41,6 +41,9 @@ class Pump(Edge):
     def get_node_jacobian(self, node):
         pass
 
+    def get_conductance(self, head):
+        pass
+
     def is_complete(self):
         pass
 
@@ -0,0 +1,99 @@
+from time import time
+
+PHASES = ('guess', 'residual', 'jacobian', 'linear_solve', 'update')
+
+
+class SolveStats(object):
+    """
+    Record of a single solve: newton iterations, the residual (sum of the
+    absolute balances) found at each evaluation, wall time in seconds spent
+    in every phase of :data:`PHASES`, edge flow evaluations, jacobian
+    factorizations, iterations of the iterative linear solver, if any, and
+    whether the solve converged
+    """
+    def __init__(self):
+        self.iterations = 0
+        self.residuals = []
+        self.times = dict((phase, 0.) for phase in PHASES)
+        self.flow_evaluations = 0
+        self.factorizations = 0
+        self.linear_iterations = 0
+        self.converged = False
+
+    @staticmethod
+    def clock():
+        return time()
+
+    def add_time(self, phase, started):
+        self.times[phase] += time() - started
+
+    def add_residual(self, f_results):
+        self.residuals.append(float(abs(f_results).sum()))
+
+    def add_flow_evaluations(self, count):
+        self.flow_evaluations += count
+
+    def add_factorization(self):
+        self.factorizations += 1
+
+    def add_linear_iterations(self, count):
+        self.linear_iterations += count
+
+    def add_iteration(self):
+        self.iterations += 1
+
+    def set_converged(self, converged):
+        self.converged = bool(converged)
+
+    @property
+    def total_time(self):
+        return sum(self.times.values())
+
+    def __str__(self):
+        lines = ["iterations: %d, converged: %s, flow evaluations: %d" %
+                 (self.iterations, self.converged, self.flow_evaluations)]
+        for phase in PHASES:
+            lines.append("%12s: %.6f s" % (phase, self.times[phase]))
+        return "\n".join(lines)
+
+
+class NullSolveStats(object):
+    """
+    Stands for :class:`SolveStats` when statistics are not collected, so the
+    solvers can report unconditionally at the cost of an empty call
+    """
+    iterations = None
+    residuals = None
+    times = None
+    flow_evaluations = None
+    factorizations = None
+    linear_iterations = None
+    converged = None
+
+    @staticmethod
+    def clock():
+        return 0
+
+    def add_time(self, phase, started):
+        pass
+
+    def add_residual(self, f_results):
+        pass
+
+    def add_flow_evaluations(self, count):
+        pass
+
+    def add_factorization(self):
+        pass
+
+    def add_linear_iterations(self, count):
+        pass
+
+    def add_iteration(self):
+        pass
+
+    def set_converged(self, converged):
+        pass
+
+
+NULL_STATS = NullSolveStats()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from solve_stats import SolveStats, NULL_STATS, PHASES
+
+
+class SolveStatsTests(unittest.TestCase):
+    def test_records(self):
+        stats = SolveStats()
+        started = stats.clock()
+        stats.add_time('residual', started)
+        stats.add_residual(np.array([[1.5], [-2.5]]))
+        stats.add_flow_evaluations(8)
+        stats.add_factorization()
+        stats.add_linear_iterations(12)
+        stats.add_iteration()
+        stats.set_converged(True)
+        self.assertEqual(stats.iterations, 1)
+        self.assertEqual(stats.residuals, [4])
+        self.assertEqual(stats.flow_evaluations, 8)
+        self.assertEqual(stats.factorizations, 1)
+        self.assertEqual(stats.linear_iterations, 12)
+        self.assertTrue(stats.converged)
+        self.assertEqual(sorted(stats.times), sorted(PHASES))
+        self.assertGreaterEqual(stats.total_time, 0)
+
+    def test_null_stats_keep_nothing(self):
+        started = NULL_STATS.clock()
+        NULL_STATS.add_time('residual', started)
+        NULL_STATS.add_residual(np.array([[1.5]]))
+        NULL_STATS.add_factorization()
+        NULL_STATS.add_linear_iterations(3)
+        NULL_STATS.add_iteration()
+        NULL_STATS.set_converged(True)
+        self.assertEqual(NULL_STATS.iterations, None)
+        self.assertEqual(NULL_STATS.converged, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,24 +1,121 @@
-import random
+import heapq
 from abc import abstractmethod, ABCMeta
 from math import sqrt
 
 import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+from scipy.sparse.csgraph import reverse_cuthill_mckee
 
-from edges import Nozzle
+import physics
+from compiled_network import CompiledNetwork
+from edges import Nozzle, Pipe
 from nodes import ConnectionNode, InputNode
 from pipe_network import PNetwork
+from solve_stats import SolveStats, NULL_STATS
+from tabulated_nozzle import TabulatedNozzle
+
+
+def sparse_factor(factorization, matrix, **options):
+    """
+    Runs a SuperLU factorization of scipy, splu or spilu, raising
+    LinAlgError instead of the bare RuntimeError they raise on singular
+    matrices
+    :param options: keyword arguments for the factorization
+    """
+    try:
+        return factorization(matrix, **options)
+    except RuntimeError as error:
+        raise np.linalg.LinAlgError(str(error))
+
+
+class Solution(object):
+    """
+    Energies (psi) of the nodes of a network, in node order, saved after a
+    converged solve so they can seed later solves of the same network
+    """
+    def __init__(self, network):
+        # type: (PNetwork) -> None
+        self.energies = [node.get_energy('psi')
+                         for node in network.get_nodes()]
+
+    def fits(self, network):
+        return len(self.energies) == len(network.get_nodes())
 
 
 class Solver(object):
     __metaclass__ = ABCMeta
+    SPARSE_THRESHOLD = 60
+    GUESS_PASSES = 3
+    # Column ordering SuperLU refines the reverse Cuthill-McKee order with
+    COLUMN_ORDERING = 'MMD_AT_PLUS_A'
+    LINEAR_SOLVERS = ('direct', 'cg')
+    PRECONDITIONERS = ('jacobi', 'ilu')
+    # Largest and smallest relative tolerances of the inexact newton steps
+    # taken with conjugate gradients, the smallest staying clear of the
+    # rounding errors they would never get past
+    MAX_FORCING = 1e-2
+    MIN_FORCING = 1e-8
+    ILU_DROP_TOLERANCE = 1e-4
+    # How the last iterations ended
+    STATUSES = ('converged', 'max_iterations', 'stagnated', 'diverged')
+    # Largest change (psi) a newton step may bring to any energy once the
+    # iterations had to restart
+    MAX_ENERGY_CHANGE = 100.
+    # Share of the residual cut the linear model promises that a damped
+    # step must reach
+    SUFFICIENT_DECREASE = 1e-4
+    MAX_BACKTRACKS = 10
+    # Iterations without a new lowest residual before giving up
+    STAGNATION_ITERATIONS = 8
+    # Growth of the residual over the starting one taken as divergence
+    DIVERGENCE_RATIO = 1e8
+    MAX_RESTARTS = 2
+    # Endings worth starting over from, unlike slow but steady progress
+    RESTARTED_STATUSES = ('stagnated', 'diverged')
+    RESTART_DIVISOR = 10.
+    # Share of the way towards the middle of the fixed energies a restart
+    # moves a starting point the failed iterations never improved on
+    RESTART_PERTURBATION = 0.5
+    # Raised when factoring or solving a singular jacobian, sparse
+    # factorizations going through :func:`sparse_factor`
+    SINGULAR_ERRORS = (np.linalg.LinAlgError,)
 
-    def __init__(self, network, is_inspectable=False):
+    def __init__(self, network, is_inspectable=False, sparse=None,
+                 compiled=False, collect_stats=False, linear_solver='direct',
+                 preconditioner='jacobi'):
         # type: (PNetwork) -> None
+        """
+        :param linear_solver: 'direct' factors the jacobian, 'cg' runs
+            preconditioned conjugate gradients on a sparse jacobian, which
+            must be symmetric: networks of pipes and nozzles solved for
+            their energies alone
+        :param preconditioner: 'jacobi' or 'ilu', for conjugate gradients
+        """
         assert isinstance(network, PNetwork)
+        if linear_solver not in Solver.LINEAR_SOLVERS:
+            raise ValueError('Unknown linear solver %s' % linear_solver)
+        if preconditioner not in Solver.PRECONDITIONERS:
+            raise ValueError('Unknown preconditioner %s' % preconditioner)
         self.network = network
         self.size = None
         self.jacobian = None
         self._is_inspectable = is_inspectable
+        self._collect_stats = collect_stats
+        self.stats = NULL_STATS
+        self._sparse = sparse
+        self._compiled = compiled
+        self._linear_solver = linear_solver
+        self._preconditioner = preconditioner
+        self._previous_delta = None
+        self._first_residual = None
+        self._max_energy_change = None
+        self._start_vector = None
+        self._best_vector = None
+        self._active_positions = None
+        self.compiled = None
+        self.status = None
         self.active_energy_vectors = []
 
     @abstractmethod
@@ -42,78 +139,654 @@ class Solver(object):
         return deviation < 1e-4
 
     def _set_active_nodes_indexes(self):
-        all_nodes = self.network.get_nodes()
-        self._active_indexes = [index for index in xrange(len(all_nodes))
-                                if isinstance(all_nodes[index], ConnectionNode)]
+        cache = self.network.topology_cache()
+        if 'active_indexes' not in cache:
+            all_nodes = self.network.get_nodes()
+            cache['active_indexes'] = [
+                index for index in xrange(len(all_nodes))
+                if isinstance(all_nodes[index], ConnectionNode)]
+        self._active_indexes = cache['active_indexes']
 
     def f_equations(self):
+        """
+        Flow balances of the active nodes, from a single pass over the edges
+        :return: column vector ordered like the active nodes
+        """
+        if self.compiled is not None:
+            return self.compiled.f_equations()
         resp = np.zeros([self.size, 1])
-        for node_index in self._active_indexes:
-            input_flow = self.get_node_input_flow(node_index)
-            resp[self._active_indexes.index(node_index)][0] = input_flow
+        for edge in self.network.get_edges():
+            flow = edge.calculate_gpm_flow()
+            in_position = self._active_positions.get(edge.input_node)
+            out_position = self._active_positions.get(edge.output_node)
+            if in_position is not None:
+                resp[in_position][0] -= flow
+            if out_position is not None:
+                resp[out_position][0] += flow
+        for node, position in self._active_positions.iteritems():
+            resp[position][0] -= node.get_output_flow('gpm')
         return resp
 
-    def _cell_jacob(self, row_index, col_index):
-        partial_jac = 0
-        evaluated_node = self.network.node_at(col_index)
-        reference_node = self.network.node_at(row_index)
-        for connected_pipe in reference_node.get_input_pipes():
-            partial_jac += connected_pipe.get_node_jacobian(evaluated_node)
-        for connected_pipe in reference_node.get_output_pipes():
-            partial_jac -= connected_pipe.get_node_jacobian(evaluated_node)
-        return partial_jac
+    def _set_active_positions(self):
+        cache = self.network.topology_cache()
+        if 'active_positions' not in cache:
+            positions = {}
+            for position in range(len(self._active_indexes)):
+                node = self.network.node_at(self._active_indexes[position])
+                positions[node] = position
+            cache['active_positions'] = positions
+        self._active_positions = cache['active_positions']
+
+    def is_sparse(self):
+        """
+        Tells whether the jacobian is assembled as a sparse matrix. When the
+        solver was not told explicitly, tiny systems stay dense. Conjugate
+        gradients always work on sparse jacobians
+        :rtype: bool
+        """
+        if self._linear_solver == 'cg':
+            return True
+        if self._sparse is None:
+            return self.size > Solver.SPARSE_THRESHOLD
+        return self._sparse
+
+    def evaluate_system(self):
+        """
+        Evaluates the flow balances and fills the jacobian from a single pass
+        over the edges
+        :return: column vector of the balances, as :func:`f_equations`
+        """
+        stats = self.stats
+        started = stats.clock()
+        f_results, rows, cols, values = self._system_terms()
+        stats.add_time('residual', started)
+        started = stats.clock()
+        self._build_jacobian(rows, cols, values)
+        stats.add_time('jacobian', started)
+        stats.add_flow_evaluations(len(self.network.get_edges()))
+        stats.add_residual(f_results)
+        return f_results
+
+    def evaluate_residual(self):
+        """
+        Evaluates the flow balances alone, leaving the jacobian as it was
+        :return: column vector of the balances, as :func:`f_equations`
+        """
+        stats = self.stats
+        started = stats.clock()
+        f_results = self.f_equations()
+        stats.add_time('residual', started)
+        stats.add_flow_evaluations(len(self.network.get_edges()))
+        stats.add_residual(f_results)
+        return f_results
+
+    def _newton_step(self, energy_vector, f_results):
+        """
+        Applies one newton update to the unknowns
+        :return: the updated column vector
+        """
+        stats = self.stats
+        delta = self._search_direction(f_results)
+        energy_vector = np.add(energy_vector, delta)
+        started = stats.clock()
+        self._update_energies(energy_vector)
+        stats.add_time('update', started)
+        stats.add_iteration()
+        return energy_vector
+
+    def _damped_iterate(self, energy_vector, max_iterations):
+        """
+        Newton iterations globalized by :func:`_damped_step`. They stop once
+        the balances converge, after max_iterations, when the residual
+        fails to reach a new low for STAGNATION_ITERATIONS iterations or
+        when it grows DIVERGENCE_RATIO times past the starting one, stops
+        being finite or the jacobian turns singular. :attr:`status` tells
+        which. Iterations ending on energies that are not finite leave the
+        last finite ones instead, as does the extra step taken once the
+        balances converge when they no longer do after it
+        :return: the last energies column
+        """
+        f_results = self.evaluate_system()
+        residual = abs(f_results).sum()
+        starting = lowest = residual
+        finite = self._start_vector = energy_vector
+        stalled = 0
+        self._best_vector = None
+        self.status = 'converged'
+        if self.has_converged(f_results):
+            return energy_vector
+        for _ in range(max_iterations):
+            try:
+                if self.has_converged(f_results):
+                    converged_vector = energy_vector
+                    energy_vector = self._newton_step(energy_vector,
+                                                      f_results)
+                    self._on_step(energy_vector)
+                    if not self.has_converged(self._evaluate_trial()):
+                        return self._fall_back(converged_vector)
+                    return energy_vector
+                energy_vector, f_results, residual = self._damped_step(
+                    energy_vector, f_results, residual)
+            except Solver.SINGULAR_ERRORS:
+                self.status = 'diverged'
+                return self._fall_back(finite)
+            self._on_step(energy_vector)
+            if not np.isfinite(residual):
+                self.status = 'diverged'
+                return self._fall_back(finite)
+            finite = energy_vector
+            if residual > Solver.DIVERGENCE_RATIO * starting:
+                self.status = 'diverged'
+                return energy_vector
+            if residual < lowest:
+                lowest = residual
+                self._best_vector = energy_vector
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled == Solver.STAGNATION_ITERATIONS:
+                    self.status = 'stagnated'
+                    return energy_vector
+        if not self.has_converged(f_results):
+            self.status = 'max_iterations'
+        return energy_vector
+
+    def _damped_step(self, energy_vector, f_results, residual):
+        """
+        Newton step scaled down so that no energy changes by more than the
+        clamp :func:`_restart` sets, if any, then halved up to
+        MAX_BACKTRACKS times until the residual falls by SUFFICIENT_DECREASE
+        of the cut the linear model promises. The last one tried is taken
+        when none does. Trials evaluate the balances alone, the jacobian
+        being only updated at the step taken
+        :return: the new energies column, its balances and residual
+        """
+        stats = self.stats
+        delta = self._search_direction(f_results)
+        if self._max_energy_change is not None:
+            largest = abs(delta[:len(self._active_indexes)]).max()
+            if largest > self._max_energy_change:
+                delta *= self._max_energy_change / largest
+        length = 1.
+        for _ in range(Solver.MAX_BACKTRACKS + 1):
+            trial = np.add(energy_vector, length * delta)
+            started = stats.clock()
+            self._update_energies(trial)
+            stats.add_time('update', started)
+            trial_results = self._evaluate_trial()
+            trial_residual = abs(trial_results).sum()
+            if trial_residual <= (
+                    1 - Solver.SUFFICIENT_DECREASE * length) * residual:
+                break
+            length /= 2
+        stats.add_iteration()
+        self._update_jacobian()
+        self._accept_step(length * delta, trial_results - f_results,
+                          trial_residual / residual)
+        return trial, trial_results, trial_residual
+
+    def _search_direction(self, f_results):
+        """
+        Newton step for the balances, from the jacobian of the last
+        evaluation
+        """
+        started = self.stats.clock()
+        delta = self._newton_delta(f_results)
+        self.stats.add_time('linear_solve', started)
+        return delta
+
+    def _evaluate_trial(self):
+        """
+        Evaluates the balances at the energies a step tries
+        """
+        return self.evaluate_residual()
+
+    def _update_jacobian(self):
+        """
+        Builds the jacobian at the energies a damped step was taken to
+        """
+        started = self.stats.clock()
+        self.fill_jacobian()
+        self.stats.add_time('jacobian', started)
+
+    def _accept_step(self, step, change, ratio):
+        """
+        Called once a damped step is taken
+        :param step: change of the unknowns
+        :param change: change of the balances it brought
+        :param ratio: residual after the step over the one before
+        """
+        pass
+
+    def _on_step(self, energy_vector):
+        pass
+
+    def _fall_back(self, energy_vector):
+        """
+        Sets the unknowns back to energy_vector, along with the flows
+        """
+        self._update_energies(energy_vector)
+        self.evaluate_residual()
+        return energy_vector
+
+    def _restart(self, energy_vector, max_iterations):
+        """
+        Starts over from :func:`_restart_guess` after iterations that ended
+        in one of RESTARTED_STATUSES, up to MAX_RESTARTS times, with the
+        energy changes clamped to MAX_ENERGY_CHANGE first and that clamp
+        divided by RESTART_DIVISOR every time after
+        :param energy_vector: energies column the failed iterations ended at
+        :return: the energies column the last attempt ended at
+        """
+        self._max_energy_change = Solver.MAX_ENERGY_CHANGE
+        for _ in range(Solver.MAX_RESTARTS):
+            if self.status not in Solver.RESTARTED_STATUSES:
+                break
+            energy_vector = self._restart_guess()
+            self._update_energies(energy_vector)
+            energy_vector = self._iterate(energy_vector, max_iterations)
+            if self.status == 'converged':
+                break
+            self._max_energy_change /= Solver.RESTART_DIVISOR
+        return energy_vector
+
+    def _restart_guess(self):
+        """
+        Point a restart starts from: the lowest residual one the failed
+        iterations reached or, when none improved on their start, that
+        start moved RESTART_PERTURBATION of the way towards the middle of
+        the fixed energies
+        """
+        if self._best_vector is not None:
+            return self._best_vector
+        guess = np.array(self._start_vector, dtype=float)
+        energies = guess[:len(self._active_indexes)]
+        energies += Solver.RESTART_PERTURBATION * (
+            self._middle_energy() - energies)
+        return guess
+
+    def fill_jacobian(self):
+        _, rows, cols, values = self._system_terms()
+        self._build_jacobian(rows, cols, values)
+
+    def _system_terms(self, linear_floor=None):
+        if self.compiled is not None:
+            return self.compiled.evaluate(linear_floor)
+        return self._edge_terms(linear_floor=linear_floor)
+
+    def _edge_terms(self, skipped_column=None, linear_floor=None):
+        """
+        Visits every edge once, adding its flow to the balances of its two
+        nodes and scattering the derivatives of that flow into their rows
+        :param skipped_column: active position whose column is left empty
+        :param linear_floor: when given, every edge is replaced by its secant
+            conductance at its current head, never taken below linear_floor
+        :return: balance column, jacobian rows, columns and values
+        """
+        resp = np.zeros([self.size, 1])
+        rows, cols, values = [], [], []
+        for edge in self.network.get_edges():
+            if linear_floor is None:
+                flow, in_slope, out_slope = edge.get_flow_and_slopes()
+            else:
+                head = (edge.input_node.get_energy('psi') -
+                        edge.output_node.get_energy('psi'))
+                in_slope = edge.get_conductance(max(abs(head), linear_floor))
+                flow, out_slope = in_slope * head, -in_slope
+            in_position = self._active_positions.get(edge.input_node)
+            out_position = self._active_positions.get(edge.output_node)
+            if in_position is not None:
+                resp[in_position][0] -= flow
+            if out_position is not None:
+                resp[out_position][0] += flow
+            for col, slope in ((in_position, in_slope),
+                               (out_position, out_slope)):
+                if col is None or col == skipped_column:
+                    continue
+                if in_position is not None:
+                    rows.append(in_position)
+                    cols.append(col)
+                    values.append(-slope)
+                if out_position is not None:
+                    rows.append(out_position)
+                    cols.append(col)
+                    values.append(slope)
+        for node, position in self._active_positions.iteritems():
+            resp[position][0] -= node.get_output_flow('gpm')
+        return resp, rows, cols, values
+
+    def _build_jacobian(self, rows, cols, values):
+        if self.is_sparse():
+            shape = (self.size, self.size)
+            coo = scipy.sparse.coo_matrix((values, (rows, cols)), shape=shape)
+            self.jacobian = coo.tocsc()
+        else:
+            self.jacobian = np.zeros([self.size, self.size])
+            np.add.at(self.jacobian, (rows, cols), values)
+
+    def _newton_delta(self, f_results):
+        if self._linear_solver == 'cg':
+            return self._conjugate_gradient_delta(f_results)
+        if scipy.sparse.issparse(self.jacobian):
+            return -self.factor_jacobian()(f_results)
+        self.stats.add_factorization()
+        return -np.linalg.solve(self.jacobian, f_results)
+
+    def factor_jacobian(self):
+        """
+        LU factorization of the jacobian, sparse ones taken in
+        :func:`fill_reducing_order`
+        :return: function solving the jacobian for a column vector
+        """
+        self.stats.add_factorization()
+        if not scipy.sparse.issparse(self.jacobian):
+            factor = scipy.linalg.lu_factor(self.jacobian, check_finite=False)
+            return lambda vector: scipy.linalg.lu_solve(factor, vector,
+                                                        check_finite=False)
+        order = self.fill_reducing_order()
+        factor = sparse_factor(scipy.sparse.linalg.splu,
+                               self.jacobian[order][:, order].tocsc(),
+                               permc_spec=Solver.COLUMN_ORDERING)
+
+        def solve(vector):
+            result = np.empty(vector.shape)
+            result[order] = factor.solve(vector[order])
+            return result
+        return solve
+
+    def _conjugate_gradient_delta(self, f_results):
+        """
+        Newton step from preconditioned conjugate gradients on minus the
+        jacobian, which is definite. They start from the previous step and
+        stop at a relative tolerance that tightens along with the balances,
+        following their ratio to the first ones of the solve, as an exact
+        step is only worth its cost near the solution. A breakdown, which
+        leaves a step that is not finite, raises LinAlgError
+        """
+        matrix = -self.jacobian
+        rhs = f_results[:, 0]
+        residual = abs(rhs).sum()
+        if self._first_residual is None:
+            self._first_residual = residual
+        tolerance = Solver.MAX_FORCING
+        if residual < self._first_residual:
+            tolerance = max(Solver.MIN_FORCING,
+                            tolerance * residual / self._first_residual)
+        start = self._previous_delta
+        if start is not None and len(start) != self.size:
+            start = None
+        steps = [0]
+
+        def count(_):
+            steps[0] += 1
+        delta, info = scipy.sparse.linalg.cg(
+            matrix, rhs, x0=start, tol=tolerance, atol=0,
+            M=self._preconditioner_of(matrix), callback=count)
+        if info < 0 or not np.isfinite(delta).all():
+            raise np.linalg.LinAlgError('Conjugate gradients broke down')
+        self.stats.add_linear_iterations(steps[0])
+        self._previous_delta = delta
+        return np.reshape(delta, f_results.shape)
+
+    def _preconditioner_of(self, matrix):
+        """
+        Jacobi preconditioner, or an incomplete LU factorization, which
+        stands for the incomplete Cholesky one scipy lacks. It is taken in
+        symmetric mode, ordering rows and columns alike and pivoting on the
+        diagonal, as conjugate gradients stall on an unsymmetric one
+        :rtype: scipy.sparse.linalg.LinearOperator
+        """
+        if self._preconditioner == 'ilu':
+            factor = sparse_factor(
+                scipy.sparse.linalg.spilu, matrix.tocsc(),
+                drop_tol=Solver.ILU_DROP_TOLERANCE,
+                permc_spec=Solver.COLUMN_ORDERING, diag_pivot_thresh=0.,
+                options=dict(SymmetricMode=True))
+            return scipy.sparse.linalg.LinearOperator(matrix.shape,
+                                                      factor.solve)
+        return scipy.sparse.diags(1 / matrix.diagonal())
+
+    def fill_reducing_order(self):
+        """
+        Order the unknowns are factored in: the active nodes in reverse
+        Cuthill-McKee order, which keeps the jacobian banded whatever order
+        the nodes were added in, followed by any other unknown. The node
+        order is found once per topology
+        :rtype: numpy.ndarray
+        """
+        cache = self.network.topology_cache()
+        if 'active_order' not in cache:
+            cache['active_order'] = self._active_order()
+        order = cache['active_order']
+        if len(order) < self.size:
+            order = np.concatenate((order, np.arange(len(order), self.size)))
+        return order
+
+    def _active_order(self):
+        count = len(self._active_indexes)
+        rows, cols = [], []
+        for edge in self.network.get_edges():
+            in_position = self._active_positions.get(edge.input_node)
+            out_position = self._active_positions.get(edge.output_node)
+            if in_position is not None and out_position is not None:
+                rows.append(in_position)
+                cols.append(out_position)
+        adjacency = scipy.sparse.coo_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(count, count))
+        return reverse_cuthill_mckee(adjacency.tocsr(),
+                                     symmetric_mode=False)
+
+    def reset_stats(self):
+        """
+        Starts a new :class:`SolveStats` record, or keeps the null one when
+        the solver does not collect statistics
+        """
+        self.stats = SolveStats() if self._collect_stats else NULL_STATS
 
     def prepare_solving_conditions(self):
         self._set_active_nodes_indexes()
         self.size = len(self._active_indexes)
-        self.jacobian = np.zeros([self.size, self.size])
+        self._set_active_positions()
+        self.jacobian = None
+        self.compiled = None
+        self._previous_delta = None
+        self._first_residual = None
+        self._max_energy_change = None
+        self._start_vector = None
+        self._best_vector = None
+        self.status = None
 
-    def _get_max_energy(self):
-        max_energy = self.network.node_at(0).get_energy('psi')
-        for node in self.network.get_nodes():
-            max_energy = max(max_energy, node.get_energy('psi'))
-        return max_energy
+    def _uses_compiled_network(self):
+        """
+        Tells whether the iterations run over a :class:`CompiledNetwork`.
+        Unless told explicitly, it is used whenever the network supports it
+        and the solver is not being inspected
+        :rtype: bool
+        """
+        if self._compiled is None:
+            return (not self._is_inspectable and
+                    CompiledNetwork.supports(self.network))
+        return self._compiled
 
-    def _get_min_energy(self):
-        min_energy = self.network.node_at(0).get_energy('psi')
-        for node in self.network.get_nodes():
-            min_energy = min(min_energy, node.get_energy('psi'))
-        return min_energy
+    def _fixed_energies(self):
+        return [node.get_energy('psi') for node in self.network.get_nodes()
+                if node not in self._active_positions]
+
+    def linearized_guess(self, energy_vector):
+        """
+        Improves a starting point by solving the network with every edge
+        replaced by a linear one. The first pass evaluates all the
+        conductances at half the span of the fixed energies; the following
+        ones at the heads the previous pass found. A pass whose linear
+        system cannot be solved ends them, keeping the last point reached
+        :param energy_vector: column vector the passes start from
+        :return: the improved column vector, also set into the unknowns
+        """
+        fixed = self._fixed_energies()
+        reference = 1.
+        if fixed and max(fixed) > min(fixed):
+            reference = (max(fixed) - min(fixed)) / 2.
+        linear_floor = reference
+        for _ in range(Solver.GUESS_PASSES):
+            f_results, rows, cols, values = self._system_terms(linear_floor)
+            self._build_jacobian(rows, cols, values)
+            try:
+                delta = self._newton_delta(f_results)
+            except Solver.SINGULAR_ERRORS:
+                break
+            energy_vector = np.add(energy_vector, delta)
+            self._update_energies(energy_vector)
+            linear_floor = reference * 1e-3
+        return energy_vector
+
+    def _middle_energy(self):
+        fixed = self._fixed_energies()
+        if not fixed:
+            return 0
+        return (max(fixed) + min(fixed)) / 2.
 
 
 class UserSolver(Solver):
-    def __init__(self, network, is_inspectable=False):
+    MAX_ITERATIONS = 35
+    WARM_ITERATIONS = 10
+    JACOBIAN_UPDATES = ('newton', 'chord', 'broyden')
+    # Residual reduction a step must reach for a factorization to be kept
+    STALL_RATIO = 0.5
+    MAX_BROYDEN_UPDATES = 10
+
+    def __init__(self, network, is_inspectable=False, sparse=None,
+                 compiled=None, warm_start=False, collect_stats=False,
+                 linear_solver='direct', preconditioner='jacobi',
+                 jacobian_update='newton'):
         # type: (PNetwork) -> None
-        Solver.__init__(self, network, is_inspectable)
+        """
+        :param jacobian_update: 'newton' builds and factors the jacobian at
+            every iteration, 'chord' keeps a factorization as long as the
+            steps it gives cut the residual by STALL_RATIO, and 'broyden'
+            also corrects it with a rank one update after every step. Both
+            need the direct linear solver
+        """
+        Solver.__init__(self, network, is_inspectable, sparse, compiled,
+                        collect_stats, linear_solver, preconditioner)
+        if jacobian_update not in UserSolver.JACOBIAN_UPDATES:
+            raise ValueError('Unknown jacobian update %s' % jacobian_update)
+        if jacobian_update != 'newton' and linear_solver != 'direct':
+            raise ValueError('%s steps need the direct linear solver' %
+                             jacobian_update)
+        self._warm_start = warm_start
+        self._jacobian_update = jacobian_update
+        self._inverse = None
+        self._is_jacobian_current = True
+        self.solution = None
 
-    def solve_system(self):
+    def solve_system(self, solution=None):
+        """
+        Solves the network. A warm start is tried first when a solution is
+        given or the solver was built with warm_start, in which case the
+        energies already on the nodes are used. Should it not converge
+        within WARM_ITERATIONS, the solve restarts from :func:`first_guess`,
+        and again through :func:`_restart` should that fail too
+        :param solution: a :class:`Solution` of this same network
+        :return: whether the solve converged, :attr:`status` telling how
+            it ended otherwise
+        """
+        self.reset_stats()
         self.prepare_solving_conditions()
-        self._iterate(self.first_guess())
+        if self._uses_compiled_network():
+            self.compiled = CompiledNetwork.of(self.network)
+        energy_vector = self.warm_guess(solution)
+        if energy_vector is not None:
+            self._update_energies(energy_vector)
+            self._iterate(energy_vector, UserSolver.WARM_ITERATIONS)
+        if self.status != 'converged':
+            started = self.stats.clock()
+            energy_vector = self.first_guess()
+            self.stats.add_time('guess', started)
+            energy_vector = self._iterate(energy_vector)
+            self._restart(energy_vector, UserSolver.MAX_ITERATIONS)
+        if self.compiled is not None:
+            self.compiled.write_back()
+        converged = self.status == 'converged'
+        if converged:
+            self.solution = Solution(self.network)
+        self.stats.set_converged(converged)
+        return converged
 
-    def first_guess(self):
-        max_energy = self._get_max_energy()
-        min_energy = self._get_min_energy()
+    def warm_guess(self, solution=None):
+        """
+        Active energies to warm start from, or None when there are none
+        :param solution: a :class:`Solution`, otherwise the energies set on
+            the nodes are taken
+        """
         guess = np.zeros([self.size, 1])
+        if solution is not None:
+            if not solution.fits(self.network):
+                return None
+            for cont in range(self.size):
+                index = self._active_indexes[cont]
+                guess[cont][0] = solution.energies[index]
+            return guess
+        if not self._warm_start:
+            return None
         for cont in range(self.size):
-            guess[cont][0] = random.uniform(min_energy, max_energy)
             cur_node = self.network.node_at(self._active_indexes[cont])
-            cur_node.set_energy(guess[cont][0], 'psi')
+            if not cur_node.has_energy():
+                return None
+            guess[cont][0] = cur_node.get_energy('psi')
         return guess
 
-    def _iterate(self, energy_vector):
-        iteration = 0
-        f_results = self.f_equations()
-        while not self.has_converged(f_results) and iteration < 35:
-            self.fill_jacobian()
-            f_results = self.f_equations()
-            delta = -np.linalg.solve(self.jacobian, f_results)
-            energy_vector = np.add(energy_vector, delta)
-            self.feed_partial_results(energy_vector)
-            self._update_energies(energy_vector)
-            iteration += 1
+    def first_guess(self):
+        guess = np.full([self.size, 1], self._middle_energy())
+        self._update_energies(guess)
+        return self.linearized_guess(guess)
+
+    def _iterate(self, energy_vector, max_iterations=MAX_ITERATIONS):
+        self._inverse = None
+        self._is_jacobian_current = True
+        energy_vector = self._damped_iterate(energy_vector, max_iterations)
         if self._is_inspectable:
-            print iteration
-            self.print_f(f_results)
+            print self.status
+            self.print_f(self.f_equations())
+        return energy_vector
+
+    def _on_step(self, energy_vector):
+        if self._is_inspectable:
+            self.print_jacobian()
+        self.feed_partial_results(energy_vector)
+
+    def _search_direction(self, f_results):
+        """
+        Chord and broyden steps come from a factored jacobian kept across
+        iterations, which is only built and factored again once a step
+        fails to cut the residual by STALL_RATIO, or after
+        MAX_BROYDEN_UPDATES broyden updates
+        """
+        if self._jacobian_update == 'newton':
+            return Solver._search_direction(self, f_results)
+        stats = self.stats
+        if self._inverse is None and not self._is_jacobian_current:
+            Solver._update_jacobian(self)
+        started = stats.clock()
+        if self._inverse is None:
+            self._inverse = _BroydenInverse(self.factor_jacobian())
+        step = self._inverse.solve(-f_results)
+        stats.add_time('linear_solve', started)
+        return step
+
+    def _update_jacobian(self):
+        if self._jacobian_update == 'newton':
+            Solver._update_jacobian(self)
+        else:
+            self._is_jacobian_current = False
+
+    def _accept_step(self, step, change, ratio):
+        if self._inverse is None:
+            return
+        if (ratio > UserSolver.STALL_RATIO or
+                len(self._inverse.updates) == UserSolver.MAX_BROYDEN_UPDATES):
+            self._inverse = None
+        elif self._jacobian_update == 'broyden':
+            self._inverse.update(step, change)
 
     def feed_partial_results(self, vector):
         energy_vector = [pair[0] for pair in vector]
@@ -126,16 +799,6 @@ class UserSolver(Solver):
             deviation += abs(vertical_v[cont][0])
         print deviation
 
-    def fill_jacobian(self):
-        for cont1 in range(self.size):
-            row_index = self._active_indexes[cont1]
-            for cont2 in range(self.size):
-                col_index = self._active_indexes[cont2]
-                self.jacobian[cont1][cont2] = self._cell_jacob(row_index,
-                                                               col_index)
-        if self._is_inspectable:
-            self.print_jacobian()
-
     def print_jacobian(self):
         # print len(self.jacobian)
         print "        ",
@@ -144,7 +807,10 @@ class UserSolver(Solver):
             print "{:7}".format(self.network.node_at(this_index).name),
         print
         x_index = 0
-        for row in self.jacobian:
+        jacobian = self.jacobian
+        if scipy.sparse.issparse(jacobian):
+            jacobian = jacobian.toarray()
+        for row in jacobian:
             this_index = self._active_indexes[x_index]
             print "{:3} [".format(self.network.node_at(this_index).name),
             for elem in row:
@@ -154,6 +820,9 @@ class UserSolver(Solver):
         print
 
     def _update_energies(self, energy_vector):
+        if self.compiled is not None:
+            self.compiled.set_active_energies(energy_vector[:, 0])
+            return
         for index in range(self.size):
             this_node = self.network.node_at(self._active_indexes[index])
             this_node.set_energy(energy_vector[index][0], 'psi')
@@ -171,138 +840,820 @@ class UserSolver(Solver):
         print format_string % tuple(energies)
 
 
+class _BroydenInverse(object):
+    """
+    Inverse of a factored jacobian, corrected by the rank one updates of
+    Broyden's good method, each one kept as a pair of vectors so that
+    applying it costs two dot products rather than a factorization
+    """
+    def __init__(self, factored_solve):
+        self._factored_solve = factored_solve
+        self.updates = []
+
+    def solve(self, vector):
+        result = self._factored_solve(vector)
+        for step, correction in self.updates:
+            result += correction * np.vdot(step, result)
+        return result
+
+    def update(self, step, change):
+        """
+        Makes the inverse map the change of the balances a step caused onto
+        that step
+        """
+        estimate = self.solve(change)
+        scale = np.vdot(step, estimate)
+        if scale:
+            self.updates.append((step, (step - estimate) / scale))
+
+
+class GradientSolver(Solver):
+    """
+    Solves the same problem as :class:`UserSolver` through the global
+    gradient algorithm of Todini and Pilati, taking edge flows as unknowns
+    along with the active energies. Each iteration solves a system on the
+    energies alone, the network laplacian weighted by the inverse slopes
+    of the edge head losses, and then corrects the flows from the energies
+    found. The flows keep the balances of the active nodes after every
+    iteration, which keeps the method steady on looped networks
+    """
+    MAX_ITERATIONS = 35
+    # Flow (gpm) the head loss slopes are never evaluated below
+    FLOW_FLOOR = 1e-6
+
+    def __init__(self, network, sparse=None, collect_stats=False,
+                 linear_solver='direct', preconditioner='jacobi'):
+        Solver.__init__(self, network, sparse=sparse, compiled=True,
+                        collect_stats=collect_stats,
+                        linear_solver=linear_solver,
+                        preconditioner=preconditioner)
+        self.flows = None
+
+    def solve_system(self):
+        """
+        Solves the network, leaving energies and flows on its nodes and
+        edges like :class:`UserSolver`
+        :return: whether the solve converged, :attr:`status` telling how
+            it ended otherwise
+        """
+        if not CompiledNetwork.supports(self.network):
+            raise ValueError('The network holds elements without compiled '
+                             'counterpart')
+        self.reset_stats()
+        self.prepare_solving_conditions()
+        self.compiled = CompiledNetwork.of(self.network)
+        started = self.stats.clock()
+        energy_vector = self.first_guess()
+        self.flows = self.compiled.edge_flows()
+        self.stats.add_time('guess', started)
+        converged = self._gradient_iterate(energy_vector)
+        self.compiled.write_back()
+        self.stats.set_converged(converged)
+        return converged
+
+    def _gradient_iterate(self, energy_vector):
+        """
+        Gradient iterations from energy_vector. Like
+        :func:`Solver._damped_iterate` they stop once the balances
+        converge, after MAX_ITERATIONS, when the residual fails to reach a
+        new low for STAGNATION_ITERATIONS iterations or when it grows
+        DIVERGENCE_RATIO times past the starting one, stops being finite or
+        the system turns singular, :attr:`status` telling which. Energies
+        and flows that are not finite are set back to the last finite ones
+        :return: whether the balances converged
+        """
+        f_results = self.compiled.f_equations()
+        self.stats.add_residual(f_results)
+        residual = abs(f_results).sum()
+        starting = lowest = residual
+        finite = energy_vector, self.flows
+        stalled = 0
+        self.status = 'converged'
+        if self.has_converged(f_results):
+            return True
+        for _ in range(GradientSolver.MAX_ITERATIONS):
+            try:
+                energy_vector = self._gradient_step(energy_vector)
+            except Solver.SINGULAR_ERRORS:
+                self.status = 'diverged'
+                self._gradient_fall_back(*finite)
+                return False
+            started = self.stats.clock()
+            f_results = self.compiled.f_equations()
+            self.stats.add_time('residual', started)
+            self.stats.add_residual(f_results)
+            residual = abs(f_results).sum()
+            if not np.isfinite(residual):
+                self.status = 'diverged'
+                self._gradient_fall_back(*finite)
+                return False
+            finite = energy_vector, self.flows
+            if self.has_converged(f_results):
+                return True
+            if residual > Solver.DIVERGENCE_RATIO * starting:
+                self.status = 'diverged'
+                return False
+            if residual < lowest:
+                lowest = residual
+                stalled = 0
+            else:
+                stalled += 1
+                if stalled == Solver.STAGNATION_ITERATIONS:
+                    self.status = 'stagnated'
+                    return False
+        self.status = 'max_iterations'
+        return False
+
+    def _gradient_fall_back(self, energy_vector, flows):
+        """
+        Sets the energies and flows back to the given ones
+        """
+        self._update_energies(energy_vector)
+        self.flows = flows
+
+    def first_guess(self):
+        guess = np.full([self.size, 1], self._middle_energy())
+        self._update_energies(guess)
+        return self.linearized_guess(guess)
+
+    def _update_energies(self, energy_vector):
+        self.compiled.set_active_energies(energy_vector[:, 0])
+
+    def _gradient_step(self, energy_vector):
+        """
+        One iteration of the global gradient algorithm over the flows and
+        the active energies
+        :return: the updated energies column
+        """
+        stats = self.stats
+        compiled = self.compiled
+        started = stats.clock()
+        losses, slopes = compiled.edge_losses_and_slopes(
+            self.flows, GradientSolver.FLOW_FLOOR)
+        loss_residual = losses - compiled.head_differences()
+        no_demand = np.zeros(compiled.node_count)
+        right_side = (compiled.active_balance(loss_residual / slopes,
+                                              no_demand) -
+                      compiled.active_balance(self.flows))
+        stats.add_time('residual', started)
+        started = stats.clock()
+        rows, cols, _ = compiled.jacobian_pattern()
+        self._build_jacobian(rows, cols,
+                             compiled.jacobian_values(1 / slopes))
+        stats.add_time('jacobian', started)
+        started = stats.clock()
+        delta = self._newton_delta(-right_side.reshape(self.size, 1))
+        stats.add_time('linear_solve', started)
+        started = stats.clock()
+        energy_delta = np.zeros(compiled.node_count)
+        energy_delta[compiled.active_indexes] = delta[:, 0]
+        self.flows = self.flows - (
+            loss_residual - compiled.head_differences(energy_delta)) / slopes
+        energy_vector = np.add(energy_vector, delta)
+        self._update_energies(energy_vector)
+        stats.add_time('update', started)
+        stats.add_flow_evaluations(compiled.edge_count)
+        stats.add_iteration()
+        return energy_vector
+
+
 class RemoteNozzleSolver(Solver):
-    def __init__(self, network):
-        Solver.__init__(self, network)
-        self.unplugged_node_index = None
-        self.detached_nozzle_index = None
-        self._deleted_edge = None
+    """
+    Finds the supply flow that leaves the most demanding nozzle exactly at
+    its required pressure. The supply flow is an extra unknown, set as the
+    negative output flow of the input node, and the pressure of the
+    governing nozzle an extra equation of the same newton system
+    """
+    PRESSURE_TOLERANCE = 1e-6
+    MAX_ITERATIONS = 35
+
+    def __init__(self, network, sparse=None, collect_stats=False):
+        Solver.__init__(self, network, sparse=sparse,
+                        collect_stats=collect_stats)
+        self.governing_index = None
+        self.governing_history = []
+        self._supply_position = None
+
+    @staticmethod
+    def for_network(network, sparse=None, collect_stats=False):
+        """
+        Solver suiting the network: a :class:`TreeSolver` when it is a tree
+        of pipes and nozzles, which it solves without matrices, and a
+        :class:`RemoteNozzleSolver` otherwise
+        :rtype: RemoteNozzleSolver
+        """
+        if TreeSolver.supports(network):
+            return TreeSolver(network, collect_stats=collect_stats)
+        return RemoteNozzleSolver(network, sparse=sparse,
+                                  collect_stats=collect_stats)
 
     def solve_system(self):
+        """
+        Solves the network for every governing nozzle in turn, until one
+        leaves all the others above their required pressure
+        :return: whether the solve converged, :attr:`status` telling how
+            it ended otherwise
+        """
         output_flow = 0
+        self.reset_stats()
         self.remote_nozzle_initialize()
-        self._initialize_solved_nozzles()
-        cont = 0
-        while not self._all_nozzles_solved():
-            pair = self._nozzle_index_solved_status_hash[cont]
-            if not pair[1]:
-                self._solve_this_one(pair[0])
-                pair[1] = True
-                self._update_solved_nozzles()
-            cont += 1
-        for pair in self._nozzle_index_solved_status_hash:
-            output_flow -= self.network.edge_at(pair[0]).calculate_gpm_flow()
+        self.prepare_solving_conditions()
+        started = self.stats.clock()
+        nozzle_indexes = self._nozzle_indexes()
+        self.governing_index = self.initial_governing_index(nozzle_indexes)
+        self.governing_history = []
+        energy_vector = self.first_guess()
+        self.stats.add_time('guess', started)
+        while self.governing_index not in self.governing_history:
+            self.governing_history.append(self.governing_index)
+            energy_vector = self._iterate(energy_vector)
+            energy_vector = self._restart(energy_vector,
+                                          RemoteNozzleSolver.MAX_ITERATIONS)
+            if self.status != 'converged':
+                break
+            self.governing_index = self._lowest_pressure_index(nozzle_indexes)
+        converged = self.status == 'converged'
+        if converged:
+            self._settle_governing_node()
+        for noz_index in nozzle_indexes:
+            output_flow -= self.network.edge_at(noz_index).calculate_gpm_flow()
         input_index = self.network.search_input_index()
         self.network.node_at(input_index).set_output_flow(output_flow, 'gpm')
+        self.stats.set_converged(converged)
+        return converged
 
     def remote_nozzle_initialize(self):
         for node in self.network.get_nodes():
             if isinstance(node, ConnectionNode):
                 node.set_pressure(0, 'psi')
 
-    def _initialize_solved_nozzles(self):
-        self._nozzle_index_solved_status_hash = []
-        for noz_index in range(len(self.network.get_edges())):
-            if isinstance(self.network.edge_at(noz_index), Nozzle):
-                self._nozzle_index_solved_status_hash.append([noz_index, False])
+    def prepare_solving_conditions(self):
+        Solver.prepare_solving_conditions(self)
+        self._supply_position = self.size
+        self.size += 1
 
-    def _all_nozzles_solved(self):
-        for nozzle_number_status_pair in self._nozzle_index_solved_status_hash:
-            if not nozzle_number_status_pair[1]:
-                return False
-        return True
+    def _nozzle_indexes(self):
+        cache = self.network.topology_cache()
+        if 'nozzle_indexes' not in cache:
+            edges = self.network.get_edges()
+            cache['nozzle_indexes'] = [index for index in range(len(edges))
+                                       if isinstance(edges[index], Nozzle)]
+        return cache['nozzle_indexes']
 
-    def _solve_this_one(self, nozzle_index):
-        self.hold_nozzle(nozzle_index)
-        self.prepare_solving_conditions()
-        initial_guess = self.first_guess()
-        self._iterate(initial_guess)
-        self.reinsert_nozzle()
-
-    def hold_nozzle(self, noz_index):
-        assert isinstance(self.network.edge_at(noz_index), Nozzle)
-        input_node_name = self.network.edge_at(noz_index).input_node.name
-        input_index = self.network.get_node_index_by_name(input_node_name)
-        assert isinstance(self.network.node_at(input_index), ConnectionNode)
-        self._set_nozzle_output_flow(noz_index, input_index)
-        self.unplugged_node_index = input_index
-        self.network.separate_node_from_edge(input_index, noz_index)
-        self.detached_nozzle_index = noz_index
-        self._deleted_edge = self.network.get_edges().pop(noz_index)  # CHECK
-        req_pressure = self._deleted_edge.get_required_pressure('psi')
-        self.network.node_at(input_index).set_pressure(req_pressure, 'psi')
-
-    def _set_nozzle_output_flow(self, noz_index, input_index):
-        detached_nozzle = self.network.edge_at(noz_index)
-        k_factor = detached_nozzle.get_factor('gpm/psi^0.5')
-        pressure = detached_nozzle.get_required_pressure('psi')
-        out_flow = k_factor * sqrt(pressure)
-        self.network.node_at(input_index).set_output_flow(out_flow, 'gpm')
+    def initial_governing_index(self, nozzle_indexes):
+        return self.rank_nozzles(nozzle_indexes)[0]
+
+    def rank_nozzles(self, nozzle_indexes):
+        """
+        Orders nozzles by the energy they are estimated to need at the input
+        node, most demanding first: their required energy plus the losses
+        along the least resistance path from the input node, each pipe on it
+        carrying the required flows of all the nozzles fed through it. The
+        pipe flows are summed in one pass up the tree from its leaves, the
+        path losses in one pass down from the input node
+        :rtype: list
+        """
+        parent_pipes, order = self._least_resistance_tree()
+        node_flows = {}
+        for noz_index in nozzle_indexes:
+            nozzle = self.network.edge_at(noz_index)
+            req_flow = (nozzle.get_factor('gpm/psi^0.5') *
+                        sqrt(nozzle.get_required_pressure('psi')))
+            node = nozzle.input_node
+            node_flows[node] = node_flows.get(node, 0) + req_flow
+        for node in reversed(order):
+            if node in parent_pipes:
+                parent = self._other_end(parent_pipes[node], node)
+                node_flows[parent] = (node_flows.get(parent, 0) +
+                                      node_flows.get(node, 0))
+        losses = {}
+        for node in order:
+            losses[node] = 0
+            if node in parent_pipes:
+                pipe = parent_pipes[node]
+                losses[node] = (losses[self._other_end(pipe, node)] +
+                                pipe.k_flow() *
+                                node_flows.get(node, 0) ** Pipe.C_POWER)
+        demands = {}
+        for noz_index in nozzle_indexes:
+            node = self.network.edge_at(noz_index).input_node
+            demands[noz_index] = (self._required_energy(noz_index) +
+                                  losses.get(node, 0))
+        return sorted(nozzle_indexes, key=lambda index: demands[index],
+                      reverse=True)
+
+    @staticmethod
+    def _other_end(pipe, node):
+        if pipe.output_node is node:
+            return pipe.input_node
+        return pipe.output_node
+
+    def _least_resistance_tree(self):
+        """
+        Runs Dijkstra from the input node along pipes in either direction,
+        weighting each one by its :func:`Pipe.k_flow`
+        :return: dict holding, for every reached node, the pipe it is
+            reached through, and the list of the reached nodes in the order
+            they were settled, every one after the node it is reached from
+        """
+        source = self.network.node_at(self.network.search_input_index())
+        distances = {source: 0}
+        parent_pipes = {}
+        order = []
+        heap = [(0, 0, source)]
+        pushed = 1
+        while heap:
+            distance, _, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            order.append(node)
+            for pipe in node.get_input_pipes() + node.get_output_pipes():
+                if not isinstance(pipe, Pipe):
+                    continue
+                neighbour = self._other_end(pipe, node)
+                new_distance = distance + pipe.k_flow()
+                if new_distance < distances.get(neighbour, float('inf')):
+                    distances[neighbour] = new_distance
+                    parent_pipes[neighbour] = pipe
+                    heapq.heappush(heap, (new_distance, pushed, neighbour))
+                    pushed += 1
+        return parent_pipes, order
+
+    def _required_energy(self, noz_index):
+        nozzle = self.network.edge_at(noz_index)
+        assert isinstance(nozzle.input_node, ConnectionNode)
+        elevation = nozzle.input_node.get_elevation('m')
+        return (elevation * physics.WMETER_TO_PSI +
+                nozzle.get_required_pressure('psi'))
+
+    def _lowest_pressure_index(self, nozzle_indexes):
+        """
+        Keeps the governing nozzle unless another one falls below its
+        required pressure, in which case the one furthest below it is
+        returned
+        """
+        lowest_index = self.governing_index
+        lowest_ratio = 1 - RemoteNozzleSolver.PRESSURE_TOLERANCE
+        for noz_index in nozzle_indexes:
+            nozzle = self.network.edge_at(noz_index)
+            pressure = nozzle.input_node.get_pressure('psi')
+            ratio = pressure / nozzle.get_required_pressure('psi')
+            if ratio < lowest_ratio:
+                lowest_index, lowest_ratio = noz_index, ratio
+        return lowest_index
+
+    def _settle_governing_node(self):
+        nozzle = self.network.edge_at(self.governing_index)
+        req_pressure = nozzle.get_required_pressure('psi')
+        nozzle.input_node.set_pressure(req_pressure, 'psi')
 
     def get_problem_size(self):
-        return len(self._active_indexes)
+        return self.size
 
     def first_guess(self):
-        max_energy = self._get_max_energy()
-        min_energy = self._get_min_energy()
-        guess = np.zeros([self.size, 1])
-        for cont in range(self.size):
-            if self._active_indexes[cont] == self.unplugged_node_index:
-                out_node = self.network.node_at(self.unplugged_node_index)
-                guess[cont][0] = out_node.get_output_flow('gpm')
-            else:
-                guess[cont][0] = random.uniform(min_energy, max_energy)
-                cur_node = self.network.node_at(self._active_indexes[cont])
-                cur_node.set_energy(guess[cont][0], 'psi')
-        return guess
+        guess = np.full([self.size, 1], self._middle_energy())
+        supply_flow = 0
+        for noz_index in self._nozzle_indexes():
+            nozzle = self.network.edge_at(noz_index)
+            supply_flow += (nozzle.get_factor('gpm/psi^0.5') *
+                            sqrt(nozzle.get_required_pressure('psi')))
+        guess[self._supply_position][0] = supply_flow
+        self._update_energies(guess)
+        return self.linearized_guess(guess)
 
-    def _iterate(self, energy_vector):
-        iteration = 0
-        f_results = self.f_equations()
-        while not self.has_converged(f_results):
-            self.fill_jacobian()
-            f_results = self.f_equations()
-            delta = -np.linalg.solve(self.jacobian, f_results)
-            energy_vector = np.add(energy_vector, delta)
-            self._update_energies(energy_vector)
-            iteration += 1
-        # print "There were %d iterations" % iteration
+    def _fixed_energies(self):
+        fixed = Solver._fixed_energies(self)
+        fixed.append(self._required_energy(self.governing_index))
+        return fixed
 
-    def fill_jacobian(self):
-        for cont1 in range(self.size):
-            row_index = self._active_indexes[cont1]
-            is_row_input = row_index == self.network.search_input_index()
-            for cont2 in range(self.size):
-                col_index = self._active_indexes[cont2]
-                if col_index == self.unplugged_node_index:
-                    self.jacobian[cont1][cont2] = 1 if is_row_input else 0
-                else:
-                    self.jacobian[cont1][cont2] = self._cell_jacob(row_index,
-                                                                   col_index)
+    def _iterate(self, energy_vector, max_iterations=MAX_ITERATIONS):
+        return self._damped_iterate(energy_vector, max_iterations)
+
+    def _system_terms(self, linear_floor=None):
+        f_results, rows, cols, values = self._edge_terms(
+            linear_floor=linear_floor)
+        input_node = self.network.node_at(self.network.search_input_index())
+        rows.append(self._active_positions[input_node])
+        cols.append(self._supply_position)
+        values.append(1)
+        governing_node = self.network.edge_at(self.governing_index).input_node
+        f_results[self._supply_position][0] = self._governing_deviation()
+        rows.append(self._supply_position)
+        cols.append(self._active_positions[governing_node])
+        values.append(1)
+        return f_results, rows, cols, values
+
+    def f_equations(self):
+        """
+        Flow balances of the active nodes followed by
+        :func:`_governing_deviation`
+        """
+        f_results = Solver.f_equations(self)
+        f_results[self._supply_position][0] = self._governing_deviation()
+        return f_results
+
+    def _governing_deviation(self):
+        """
+        Energy of the governing nozzle's node over the one it requires
+        """
+        governing_node = self.network.edge_at(self.governing_index).input_node
+        return (governing_node.get_energy('psi') -
+                self._required_energy(self.governing_index))
 
     def _update_energies(self, energy_vector):
-        for index in range(self.size):
-            if self._active_indexes[index] == self.unplugged_node_index:
-                input_index = self.network.search_input_index()
-                this_node = self.network.node_at(input_index)
-                assert isinstance(this_node, InputNode)
-                this_node.set_output_flow(-energy_vector[index][0], 'gpm')
+        input_index = self.network.search_input_index()
+        input_node = self.network.node_at(input_index)
+        assert isinstance(input_node, InputNode)
+        input_node.set_output_flow(-energy_vector[self._supply_position][0],
+                                   'gpm')
+        for index in range(self._supply_position):
+            this_node = self.network.node_at(self._active_indexes[index])
+            this_node.set_energy(energy_vector[index][0], 'psi')
+
+
+class TreeSolver(RemoteNozzleSolver):
+    """
+    Solves the problem of :class:`RemoteNozzleSolver` on networks without
+    loops fed from their input node, with no matrix at all. Every branch
+    is reduced, leaves first, to an equivalent emitter Q = K * (E - B)^0.5
+    fitted where the branch currently works. The input node energy that
+    leaves the governing nozzle at its required pressure is then found
+    along the path to it, and the energies propagate down the tree through
+    the true edge losses. Each sweep takes time linear in the size of the
+    network and few sweeps are needed. :func:`RemoteNozzleSolver.for_network`
+    picks this solver for the networks it supports
+    """
+    MAX_SWEEPS = 50
+    MAX_STEPS = 100
+
+    def __init__(self, network, collect_stats=False):
+        RemoteNozzleSolver.__init__(self, network,
+                                    collect_stats=collect_stats)
+        self._tree = None
+        self._is_pipe = None
+        self._coefficients = None
+        self._is_active = None
+        self._demands = None
+        self._energies = None
+        self._curves = None
+
+    @staticmethod
+    def supports(network):
+        """
+        Tells whether the network is a single tree of pipes and nozzles
+        holding an input node
+        :rtype: bool
+        """
+        cache = network.topology_cache()
+        if 'tree_support' not in cache:
+            cache['tree_support'] = TreeSolver._find_support(network)
+        return cache['tree_support']
+
+    @staticmethod
+    def _find_support(network):
+        if network.search_input_index() is None:
+            return False
+        for edge in network.get_edges():
+            if not isinstance(edge, (Pipe, Nozzle)) or \
+                    isinstance(edge, TabulatedNozzle):
+                return False
+        return network.is_connected() and network.cyclomatic_number() == 0
+
+    def solve_system(self):
+        """
+        :return: whether the sweeps converged for the last governing nozzle,
+            :attr:`status` telling how they ended otherwise
+        """
+        if not TreeSolver.supports(self.network):
+            raise ValueError('The network is not a tree fed from an input '
+                             'node')
+        self.reset_stats()
+        self.remote_nozzle_initialize()
+        started = self.stats.clock()
+        self._tree = self._rooted_tree()
+        self._read_network()
+        nozzle_indexes = self._nozzle_indexes()
+        self.governing_index = self.initial_governing_index(nozzle_indexes)
+        self.governing_history = []
+        self._energies, flows = self._required_energies()
+        self.stats.add_time('guess', started)
+        while self.governing_index not in self.governing_history:
+            self.governing_history.append(self.governing_index)
+            converged = self._sweep(flows)
+            flows = None
+            self._write_energies()
+            if not converged:
+                break
+            self.governing_index = self._lowest_pressure_index(nozzle_indexes)
+        self.status = 'converged' if converged else 'max_iterations'
+        if converged:
+            self._settle_governing_node()
+        output_flow = 0
+        for edge in self.network.get_edges():
+            flow = edge.calculate_gpm_flow()
+            if isinstance(edge, Nozzle):
+                output_flow -= flow
+        input_index = self.network.search_input_index()
+        self.network.node_at(input_index).set_output_flow(output_flow, 'gpm')
+        self.stats.set_converged(converged)
+        return converged
+
+    def _rooted_tree(self):
+        """
+        :return: node indexes in breadth first order from the input node,
+            the (edge index, node index) pair every node hangs from, None
+            for the input node, and the pairs hanging from every node
+        """
+        cache = self.network.topology_cache()
+        if 'input_tree' not in cache:
+            network = self.network
+            root = network.search_input_index()
+            order = [root]
+            parents = {root: None}
+            children = {}
+            for node_index in order:
+                node = network.node_at(node_index)
+                children[node_index] = []
+                for edge in node.get_input_pipes() + node.get_output_pipes():
+                    edge_index = network.get_edge_index(edge)
+                    if parents[node_index] is not None and \
+                            parents[node_index][0] == edge_index:
+                        continue
+                    neighbour = edge.input_node if edge.output_node is node \
+                        else edge.output_node
+                    child = network.get_node_index(neighbour)
+                    parents[child] = (edge_index, node_index)
+                    children[node_index].append((edge_index, child))
+                    order.append(child)
+            cache['input_tree'] = (order, parents, children)
+        return cache['input_tree']
+
+    def _read_network(self):
+        nodes = self.network.get_nodes()
+        edges = self.network.get_edges()
+        self._is_active = [isinstance(node, ConnectionNode) for node in nodes]
+        self._demands = [node.get_output_flow('gpm') for node in nodes]
+        self._is_pipe = [isinstance(edge, Pipe) for edge in edges]
+        self._coefficients = [
+            edge.k_flow() if isinstance(edge, Pipe) else
+            edge.get_factor('gpm/psi^0.5') for edge in edges]
+        self._curves = [None] * len(edges)
+
+    def _edge_flow(self, edge_index, head):
+        """Flow through the edge under a head difference, and its slope"""
+        coefficient = self._coefficients[edge_index]
+        if head == 0:
+            return 0., float('inf')
+        if self._is_pipe[edge_index]:
+            flow = (abs(head) / coefficient) ** (1 / Pipe.C_POWER)
+            slope = flow / (Pipe.C_POWER * abs(head))
+        else:
+            flow = coefficient * sqrt(abs(head))
+            slope = flow / (2 * abs(head))
+        return (flow if head > 0 else -flow), slope
+
+    def _edge_head(self, edge_index, flow):
+        """Head difference driving a flow, and its slope"""
+        coefficient = self._coefficients[edge_index]
+        if self._is_pipe[edge_index]:
+            head = coefficient * abs(flow) ** Pipe.C_POWER
+            slope = Pipe.C_POWER * coefficient * abs(flow) ** (Pipe.C_POWER
+                                                                - 1)
+        else:
+            head = (flow / coefficient) ** 2
+            slope = 2 * abs(flow) / coefficient ** 2
+        return (head if flow > 0 else -head), slope
+
+    def _curve_flow(self, edge_index, energy):
+        """
+        Flow entering a branch through the edge it hangs from, and its
+        slope, for an energy at the upstream end of that edge
+        """
+        k_factor, base, flow = self._curves[edge_index]
+        if k_factor is None:
+            return flow, 0.
+        head = energy - base
+        if head == 0:
+            return 0., float('inf')
+        flow = k_factor * sqrt(abs(head))
+        return (flow if head > 0 else -flow), flow / (2 * abs(head))
+
+    def _branch_flow(self, node_index, energy):
+        """
+        Flow drawn by the branches hanging from a node, its own output flow
+        included, and its slope, for an energy at the node
+        """
+        flow = self._demands[node_index]
+        slope = 0.
+        for edge_index, child in self._tree[2][node_index]:
+            if self._is_active[child]:
+                edge_flow, edge_slope = self._curve_flow(edge_index, energy)
+            else:
+                edge_flow, edge_slope = self._edge_flow(
+                    edge_index, energy - self._energies[child])
+            flow += edge_flow
+            slope += edge_slope
+        return flow, slope
+
+    def _required_energies(self):
+        """
+        First energies of the nodes: every active node gets the energy it
+        would need for the nozzles hanging from it to reach their required
+        pressure, with every pipe carrying the required flows downstream
+        :return: the energies and those flows, both by node index
+        """
+        order, parents, children = self._tree
+        nodes = self.network.get_nodes()
+        unset = float('-inf')
+        energies = [unset if self._is_active[index] else
+                    node.get_energy('psi') for index, node in enumerate(nodes)]
+        flows = [0.] * len(nodes)
+        for node_index in reversed(order):
+            if not self._is_active[node_index]:
+                continue
+            flow = self._demands[node_index]
+            for edge_index, child in children[node_index]:
+                if self._is_active[child]:
+                    edge_flow = flows[child]
+                    if energies[child] != unset:
+                        head, _ = self._edge_head(edge_index, edge_flow)
+                        energies[node_index] = max(energies[node_index],
+                                                   energies[child] + head)
+                elif not self._is_pipe[edge_index]:
+                    nozzle = self.network.edge_at(edge_index)
+                    edge_flow = (nozzle.get_factor('gpm/psi^0.5') *
+                                 sqrt(nozzle.get_required_pressure('psi')))
+                    energies[node_index] = max(
+                        energies[node_index],
+                        self._required_energy(edge_index))
+                else:
+                    edge_flow = 0.
+                flow += edge_flow
+            flows[node_index] = flow
+        for node_index in order:
+            if energies[node_index] == unset:
+                energies[node_index] = energies[parents[node_index][1]]
+        return energies, flows
+
+    def _sweep(self, flows=None):
+        """
+        Reduces the branches and propagates the energies until the flow
+        balances converge, taking one more sweep after they do like the
+        newton solvers
+        :param flows: flows by node index the first reduction is fitted at
+        :return: whether the balances converged within MAX_SWEEPS
+        """
+        converged = False
+        for _ in range(TreeSolver.MAX_SWEEPS):
+            stats = self.stats
+            started = stats.clock()
+            self._reduce_branches(flows)
+            flows = None
+            stats.add_time('jacobian', started)
+            started = stats.clock()
+            self._propagate(self._root_energy())
+            stats.add_time('update', started)
+            stats.add_iteration()
+            if converged:
+                return True
+            started = stats.clock()
+            balances = self._balances()
+            stats.add_time('residual', started)
+            stats.add_flow_evaluations(len(self._coefficients))
+            stats.add_residual(balances)
+            converged = abs(balances).sum() < 1e-4
+        return converged
+
+    def _reduce_branches(self, flows=None):
+        """
+        Fits, leaves first, the equivalent emitter of every branch hanging
+        from an edge into an active node, matching the flow and slope of the
+        branch at its current energy. Branches whose flow does not depend on
+        the energy are kept as constant flows
+        :param flows: when given, each branch is fitted where it draws
+            the flow of its node instead
+        """
+        order, parents, _ = self._tree
+        for node_index in reversed(order):
+            if not self._is_active[node_index]:
+                continue
+            energy = self._energies[node_index]
+            if flows is not None:
+                energy = self._branch_energy(node_index, flows[node_index],
+                                             energy)
+                self._energies[node_index] = energy
+            if parents[node_index] is None:
+                continue
+            edge_index = parents[node_index][0]
+            flow, slope = self._branch_flow(node_index, energy)
+            if slope == 0:
+                self._curves[edge_index] = (None, None, flow)
+                continue
+            head, head_slope = self._edge_head(edge_index, flow)
+            slope = 1 / (1 / slope + head_slope)
+            offset = flow / (2 * slope)
+            if offset == 0:
+                self._curves[edge_index] = (None, None, 0.)
+                continue
+            self._curves[edge_index] = (abs(flow) / sqrt(abs(offset)),
+                                        energy + head - offset, None)
+
+    def _branch_energy(self, node_index, flow, energy):
+        """
+        Energy at which the branches of a node draw a given flow, by newton
+        steps from energy that fall back to bisection once the solution is
+        bracketed
+        """
+        low, high = None, None
+        for _ in range(TreeSolver.MAX_STEPS):
+            branch_flow, slope = self._branch_flow(node_index, energy)
+            if abs(branch_flow - flow) <= 1e-10 * max(1., abs(flow)):
+                break
+            if branch_flow > flow:
+                high = energy
             else:
-                this_node = self.network.node_at(self._active_indexes[index])
-                this_node.set_energy(energy_vector[index][0], 'psi')
-
-    def reinsert_nozzle(self):
-        ins_index = self.detached_nozzle_index
-        self.network.get_edges().insert(ins_index, self._deleted_edge)
-        unplugged_index = self.unplugged_node_index
-        self.network.node_at(unplugged_index).set_output_flow(0, 'gpm')
-        self.network.connect_node_downstream_edge(unplugged_index, ins_index)
-        self._deleted_edge = None
-        self.detached_nozzle_index = None
-
-    def _update_solved_nozzles(self):
-        for pair in self._nozzle_index_solved_status_hash:
-            cur_nozzle = self.network.edge_at(pair[0])
-            required_pressure = cur_nozzle.get_required_pressure('psi')
-            if cur_nozzle.input_node.get_pressure('psi') >= required_pressure:
-                pair[1] = True
+                low = energy
+            if slope == 0:
+                break
+            energy += (flow - branch_flow) / slope
+            if low is not None and high is not None and \
+                    not low < energy < high:
+                energy = (low + high) / 2
+        return energy
+
+    def _root_energy(self):
+        """
+        Solves for the input node energy that leaves the governing node at
+        its required energy, following the reduced branches along the path
+        between them. Newton steps fall back to bisection once the solution
+        is bracketed
+        """
+        order, parents, _ = self._tree
+        nozzle = self.network.edge_at(self.governing_index)
+        node_index = self.network.get_node_index(nozzle.input_node)
+        target = self._required_energy(self.governing_index)
+        path = []
+        while parents[node_index] is not None:
+            path.append(parents[node_index][0])
+            node_index = parents[node_index][1]
+        path.reverse()
+        root_energy = self._energies[order[0]]
+        low, high = None, None
+        for _ in range(TreeSolver.MAX_STEPS):
+            energy, derivative = root_energy, 1.
+            for edge_index in path:
+                flow, slope = self._curve_flow(edge_index, energy)
+                head, head_slope = self._edge_head(edge_index, flow)
+                energy -= head
+                derivative *= 1 - head_slope * slope
+            if abs(energy - target) <= 1e-12 * max(1., abs(target)):
+                break
+            if energy > target:
+                high = root_energy
+            else:
+                low = root_energy
+            root_energy -= (energy - target) / derivative
+            if low is not None and high is not None and \
+                    not low < root_energy < high:
+                root_energy = (low + high) / 2
+        return root_energy
+
+    def _propagate(self, root_energy):
+        order, _, children = self._tree
+        self._energies[order[0]] = root_energy
+        for node_index in order:
+            energy = self._energies[node_index]
+            for edge_index, child in children[node_index]:
+                if self._is_active[child]:
+                    flow, _ = self._curve_flow(edge_index, energy)
+                    head, _ = self._edge_head(edge_index, flow)
+                    self._energies[child] = energy - head
+
+    def _balances(self):
+        """
+        Flow balance of every active node but the input one, whose output
+        flow is the supply
+        :return: array of the balances, in breadth first order
+        """
+        order, parents, _ = self._tree
+        balances = []
+        for node_index in order[1:]:
+            if not self._is_active[node_index]:
+                continue
+            energy = self._energies[node_index]
+            edge_index, parent = parents[node_index]
+            entering, _ = self._edge_flow(edge_index,
+                                          self._energies[parent] - energy)
+            leaving = 0.
+            for child_edge, child in self._tree[2][node_index]:
+                flow, _ = self._edge_flow(child_edge,
+                                          energy - self._energies[child])
+                leaving += flow
+            balances.append(entering - leaving - self._demands[node_index])
+        return np.array(balances)
+
+    def _write_energies(self):
+        for node_index in self._tree[0]:
+            if self._is_active[node_index]:
+                self.network.node_at(node_index).set_energy(
+                    self._energies[node_index], 'psi')
@@ -1,9 +1,15 @@
 import unittest
 
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
 from pipe_network import PNetwork
 from edges import Pipe, Nozzle
 from nodes import ConnectionNode, EndNode, InputNode
-from solvers import UserSolver, RemoteNozzleSolver
+import network_generator
+from solvers import Solver, UserSolver, RemoteNozzleSolver, TreeSolver, \
+    GradientSolver, sparse_factor
 
 
 class UserDefinedNetworks(unittest.TestCase):
@@ -68,6 +74,27 @@ class ExampleTests(unittest.TestCase):
         self.check_4_reservoir_flow()
         self.check_4_reservoir_pressures()
 
+    def test_four_reservoir_sparse(self):
+        self.set_4_reservoir_network()
+        user_solve = UserSolver(self.pipe_network, sparse=True)
+        user_solve.solve_system()
+        self.check_4_reservoir_flow()
+        self.check_4_reservoir_pressures()
+
+    def test_sparse_jacobian_matches_dense(self):
+        self.set_reservoir_nozzles_network()
+        dense = UserSolver(self.pipe_network, sparse=False)
+        dense.prepare_solving_conditions()
+        dense.first_guess()
+        dense.fill_jacobian()
+        sparse = UserSolver(self.pipe_network, sparse=True)
+        sparse.prepare_solving_conditions()
+        sparse.fill_jacobian()
+        self.assertTrue(sparse.is_sparse())
+        self.assertFalse(dense.is_sparse())
+        difference = abs(sparse.jacobian.toarray() - dense.jacobian).max()
+        self.assertAlmostEqual(difference, 0)
+
     def set_4_reservoir_network(self):
         self.pipe_network = PNetwork()
         self.set_4_reservoir_nodes()
@@ -139,6 +166,314 @@ class ExampleTests(unittest.TestCase):
         self.check_reservoir_nozzle_nodes_energy()
         self.check_reservoir_nozzle_edge_flows()
 
+    def test_gradient_solver(self):
+        self.set_4_reservoir_network()
+        self.assertTrue(GradientSolver(self.pipe_network).solve_system())
+        self.check_4_reservoir_flow()
+        self.check_4_reservoir_pressures()
+        self.set_reservoir_nozzles_network()
+        self.assertTrue(GradientSolver(self.pipe_network).solve_system())
+        self.check_reservoir_nozzle_nodes_energy()
+        self.check_reservoir_nozzle_edge_flows()
+        deluge = network_generator.eductor_deluge(1, 2)
+        with self.assertRaises(ValueError):
+            GradientSolver(deluge).solve_system()
+
+    def test_gradient_solver_on_grid(self):
+        network = network_generator.gridded_system(20, 20)
+        gradient = GradientSolver(network, collect_stats=True)
+        gradient.solve_system()
+        energies = [node.get_energy('psi') for node in network.get_nodes()]
+        flows = [edge.get_vol_flow('gpm') for edge in network.get_edges()]
+        user_defined = UserSolver(network, collect_stats=True)
+        user_defined.solve_system()
+        self.assertTrue(gradient.stats.converged)
+        self.assertEqual(gradient.status, 'converged')
+        self.assertLess(gradient.stats.iterations,
+                        user_defined.stats.iterations)
+        for cont in range(len(energies)):
+            self.assertAlmostEqual(energies[cont],
+                                   network.node_at(cont).get_energy('psi'),
+                                   6)
+        for cont in range(len(flows)):
+            self.assertAlmostEqual(flows[cont],
+                                   network.edge_at(cont).get_vol_flow('gpm'),
+                                   6)
+
+    def test_gradient_solver_statuses(self):
+        class StalledSolver(GradientSolver):
+            def _gradient_step(self, energy_vector):
+                self.stats.add_iteration()
+                return energy_vector
+
+        class ExplodingSolver(GradientSolver):
+            def _gradient_step(self, energy_vector):
+                energy_vector = (energy_vector + 1.) * 1e6
+                self._update_energies(energy_vector)
+                return energy_vector
+
+        class NanStepSolver(GradientSolver):
+            def _gradient_step(self, energy_vector):
+                energy_vector = np.full(energy_vector.shape, float('nan'))
+                self._update_energies(energy_vector)
+                self.flows = self.flows * float('nan')
+                return energy_vector
+        network = network_generator.gridded_system(3, 3)
+        solver = StalledSolver(network, collect_stats=True)
+        self.assertFalse(solver.solve_system())
+        self.assertEqual(solver.status, 'stagnated')
+        self.assertEqual(solver.stats.iterations,
+                         Solver.STAGNATION_ITERATIONS)
+        for solver_class in (ExplodingSolver, NanStepSolver):
+            solver = solver_class(network)
+            self.assertFalse(solver.solve_system())
+            self.assertEqual(solver.status, 'diverged')
+        for node in network.get_nodes():
+            self.assertTrue(np.isfinite(node.get_energy('psi')))
+        for edge in network.get_edges():
+            self.assertTrue(np.isfinite(edge.get_vol_flow('gpm')))
+        self.assertTrue(GradientSolver(network).solve_system())
+
+    def test_conjugate_gradients(self):
+        network = network_generator.gridded_system(12, 12)
+        UserSolver(network).solve_system()
+        energies = [node.get_energy('psi') for node in network.get_nodes()]
+        for solver_class in (UserSolver, GradientSolver):
+            for preconditioner in Solver.PRECONDITIONERS:
+                solver = solver_class(network, collect_stats=True,
+                                      linear_solver='cg',
+                                      preconditioner=preconditioner)
+                solver.solve_system()
+                self.assertTrue(solver.stats.converged)
+                self.assertGreater(solver.stats.linear_iterations, 0)
+                for cont in range(len(energies)):
+                    self.assertAlmostEqual(
+                        energies[cont],
+                        network.node_at(cont).get_energy('psi'), 6)
+        with self.assertRaises(ValueError):
+            UserSolver(network, linear_solver='gmres')
+        with self.assertRaises(ValueError):
+            UserSolver(network, linear_solver='cg', preconditioner='ssor')
+
+    def test_conjugate_gradients_on_loops(self):
+        for make_network in (
+                lambda: network_generator.gridded_system(8, 8),
+                lambda: network_generator.multi_reservoir(3, 40)):
+            expected = make_network()
+            UserSolver(expected).solve_system()
+            for solver_class in (UserSolver, GradientSolver):
+                for preconditioner in Solver.PRECONDITIONERS:
+                    network = make_network()
+                    solver = solver_class(network, linear_solver='cg',
+                                          preconditioner=preconditioner)
+                    self.assertTrue(solver.solve_system())
+                    for node, other in zip(network.get_nodes(),
+                                           expected.get_nodes()):
+                        self.assertAlmostEqual(node.get_energy('psi'),
+                                               other.get_energy('psi'), 6)
+
+    def test_conjugate_gradients_breakdown(self):
+        for solver_class in (UserSolver, GradientSolver):
+            class BrokenSolver(solver_class):
+                def _preconditioner_of(self, matrix):
+                    return scipy.sparse.diags(
+                        np.full(matrix.shape[0], float('nan')))
+            solver = BrokenSolver(network_generator.gridded_system(3, 3),
+                                  linear_solver='cg')
+            self.assertFalse(solver.solve_system())
+            self.assertEqual(solver.status, 'diverged')
+
+    def test_quasi_newton(self):
+        for sparse in (False, True):
+            network = network_generator.gridded_system(12, 12)
+            newton = UserSolver(network, sparse=sparse, collect_stats=True)
+            newton.solve_system()
+            energies = [node.get_energy('psi')
+                        for node in network.get_nodes()]
+            for jacobian_update in ('chord', 'broyden'):
+                solver = UserSolver(network, sparse=sparse,
+                                    collect_stats=True,
+                                    jacobian_update=jacobian_update)
+                solver.solve_system()
+                self.assertTrue(solver.stats.converged)
+                self.assertEqual(solver.status, 'converged')
+                self.assertLess(solver.stats.factorizations,
+                                newton.stats.factorizations)
+                for cont in range(len(energies)):
+                    self.assertAlmostEqual(
+                        energies[cont],
+                        network.node_at(cont).get_energy('psi'), 6)
+        with self.assertRaises(ValueError):
+            UserSolver(network, jacobian_update='secant')
+        with self.assertRaises(ValueError):
+            UserSolver(network, linear_solver='cg', jacobian_update='chord')
+
+    def test_diverged_warm_start(self):
+        self.set_reservoir_nozzles_network()
+        user_defined = UserSolver(self.pipe_network)
+        self.assertTrue(user_defined.solve_system())
+        solution = user_defined.solution
+        solution.energies = [float('nan')] * len(solution.energies)
+        self.assertTrue(user_defined.solve_system(solution))
+        self.assertEqual(user_defined.status, 'converged')
+        self.check_reservoir_nozzle_nodes_energy()
+        self.check_reservoir_nozzle_edge_flows()
+
+    def test_failing_solve_stops(self):
+        class NanGuessSolver(RemoteNozzleSolver):
+            def first_guess(self):
+                guess = np.full([self.size, 1], float('nan'))
+                self._update_energies(guess)
+                return guess
+        network = network_generator.sprinkler_tree(3, 4, 'input')
+        solver = NanGuessSolver(network, collect_stats=True)
+        self.assertFalse(solver.solve_system())
+        self.assertEqual(solver.status, 'diverged')
+        self.assertFalse(solver.stats.converged)
+        self.assertEqual(solver.stats.iterations, 1 + Solver.MAX_RESTARTS)
+        self.assertTrue(RemoteNozzleSolver(network).solve_system())
+
+    def test_failing_steps_keep_finite_energies(self):
+        class InfiniteStepSolver(UserSolver):
+            starts = []
+
+            def _iterate(self, energy_vector, max_iterations=35):
+                self.starts.append(energy_vector.copy())
+                return UserSolver._iterate(self, energy_vector,
+                                           max_iterations)
+
+            def _search_direction(self, f_results):
+                return np.full(f_results.shape, float('inf'))
+
+        class SingularSolver(UserSolver):
+            def _search_direction(self, f_results):
+                raise np.linalg.LinAlgError('Singular matrix')
+        network = network_generator.gridded_system(3, 3)
+        for jacobian_update in UserSolver.JACOBIAN_UPDATES:
+            InfiniteStepSolver.starts = []
+            for solver_class in (InfiniteStepSolver, SingularSolver):
+                solver = solver_class(network,
+                                      jacobian_update=jacobian_update)
+                self.assertFalse(solver.solve_system())
+                self.assertEqual(solver.status, 'diverged')
+                for node in network.get_nodes():
+                    self.assertTrue(np.isfinite(node.get_energy('psi')))
+                for edge in network.get_edges():
+                    self.assertTrue(np.isfinite(edge.get_vol_flow('gpm')))
+            starts = InfiniteStepSolver.starts
+            self.assertEqual(len(starts), 1 + Solver.MAX_RESTARTS)
+            for cont in range(1, len(starts)):
+                self.assertFalse(np.allclose(starts[cont],
+                                             starts[cont - 1]))
+
+    def test_only_singular_errors_are_caught(self):
+        class FaultySolver(UserSolver):
+            def _search_direction(self, f_results):
+                raise RuntimeError('Not a singular jacobian')
+        with self.assertRaises(RuntimeError):
+            FaultySolver(network_generator.gridded_system(3, 3)).solve_system()
+        singular = scipy.sparse.csc_matrix(np.array([[1., 1.], [1., 1.]]))
+        with self.assertRaises(np.linalg.LinAlgError):
+            sparse_factor(scipy.sparse.linalg.splu, singular)
+
+    def test_trials_do_not_build_jacobian(self):
+        class CountingSolver(UserSolver):
+            builds = 0
+
+            def _build_jacobian(self, *args):
+                CountingSolver.builds += 1
+                return UserSolver._build_jacobian(self, *args)
+        solver = CountingSolver(network_generator.build('reservoirs', 60),
+                                collect_stats=True)
+        self.assertTrue(solver.solve_system())
+        iterations = solver.stats.iterations
+        self.assertGreater(len(solver.stats.residuals), iterations + 1)
+        self.assertEqual(CountingSolver.builds,
+                         Solver.GUESS_PASSES + iterations)
+
+    def test_fill_reducing_order(self):
+        network = network_generator.gridded_system(6, 6)
+        user_defined = UserSolver(network, sparse=True)
+        user_defined.solve_system()
+        order = user_defined.fill_reducing_order()
+        self.assertEqual(sorted(order), range(user_defined.size))
+        self.assertTrue(order is network.topology_cache()['active_order'])
+        jacobian = user_defined.jacobian.tocoo()
+        inverse = np.argsort(order)
+        bandwidth = abs(inverse[jacobian.row] - inverse[jacobian.col]).max()
+        self.assertLessEqual(bandwidth, 6)
+        remote = RemoteNozzleSolver(
+            network_generator.gridded_system(3, 3, 'input'), sparse=True)
+        remote.solve_system()
+        remote_order = remote.fill_reducing_order()
+        self.assertEqual(len(remote_order), remote.size)
+        self.assertEqual(remote_order[-1], remote.size - 1)
+
+    def test_reservoir_nozzle_object_path(self):
+        self.set_reservoir_nozzles_network()
+        user_defined = UserSolver(self.pipe_network, compiled=False)
+        user_defined.solve_system()
+        self.assertTrue(user_defined.compiled is None)
+        self.check_reservoir_nozzle_nodes_energy()
+        self.check_reservoir_nozzle_edge_flows()
+
+    def test_first_guess_is_reproducible(self):
+        self.set_reservoir_nozzles_network()
+        first = UserSolver(self.pipe_network)
+        first.solve_system()
+        self.set_reservoir_nozzles_network()
+        second = UserSolver(self.pipe_network, compiled=False)
+        second.solve_system()
+        self.assertLessEqual(len(first.active_energy_vectors), 5)
+        self.assertEqual(len(first.active_energy_vectors),
+                         len(second.active_energy_vectors))
+        self.assertTrue(np.allclose(first.active_energy_vectors[0],
+                                    second.active_energy_vectors[0]))
+
+    def test_solve_stats(self):
+        self.set_reservoir_nozzles_network()
+        user_defined = UserSolver(self.pipe_network)
+        user_defined.solve_system()
+        self.assertEqual(user_defined.stats.iterations, None)
+        user_defined = UserSolver(self.pipe_network, collect_stats=True)
+        user_defined.solve_system()
+        stats = user_defined.stats
+        iterations = len(user_defined.active_energy_vectors)
+        self.assertTrue(stats.converged)
+        self.assertEqual(stats.iterations, iterations)
+        self.assertEqual(len(stats.residuals), iterations + 1)
+        self.assertLess(stats.residuals[-1], 1e-4)
+        self.assertEqual(stats.flow_evaluations, 8 * (iterations + 1))
+
+    def test_warm_start_after_edit(self):
+        self.set_reservoir_nozzles_network()
+        user_defined = UserSolver(self.pipe_network, warm_start=True)
+        user_defined.solve_system()
+        self.pipe_network.edge_at(2).set_length(22, 'm')
+        user_defined.active_energy_vectors = []
+        user_defined.solve_system()
+        warm_energies = [node.get_energy('psi')
+                         for node in self.pipe_network.get_nodes()]
+        self.assertLessEqual(len(user_defined.active_energy_vectors), 3)
+        self.set_reservoir_nozzles_network()
+        self.pipe_network.edge_at(2).set_length(22, 'm')
+        UserSolver(self.pipe_network).solve_system()
+        for cont in range(len(warm_energies)):
+            cur_node = self.pipe_network.node_at(cont)
+            self.assertAlmostEqual(cur_node.get_energy('psi'),
+                                   warm_energies[cont], 4)
+
+    def test_solution_reuse(self):
+        self.set_reservoir_nozzles_network()
+        first = UserSolver(self.pipe_network)
+        first.solve_system()
+        self.set_reservoir_nozzles_network()
+        second = UserSolver(self.pipe_network)
+        second.solve_system(first.solution)
+        self.assertLessEqual(len(second.active_energy_vectors), 1)
+        self.check_reservoir_nozzle_nodes_energy()
+        self.check_reservoir_nozzle_edge_flows()
+
     def set_reservoir_nozzles_network(self):
         self.pipe_network = PNetwork()
         self.set_reservoir_nozzles_nodes()
@@ -203,6 +538,80 @@ class ExampleTests(unittest.TestCase):
             cur_flow = self.pipe_network.edge_at(e_index).calculate_gpm_flow()
             self.assertAlmostEqual(cur_flow, edge_flows[e_index], 4)
 
+    def set_stub_network(self, source):
+        """
+        A supply feeding one nozzle node, which also holds a dead end stub
+        pipe drawing no flow
+        """
+        self.pipe_network = PNetwork()
+        supply = InputNode() if source == 'input' else EndNode()
+        supply.set_elevation(0 if source == 'input' else 10, 'm')
+        nodes = [supply, ConnectionNode(), EndNode(), ConnectionNode()]
+        for cur_node in nodes:
+            if cur_node is not supply:
+                cur_node.set_elevation(0, 'm')
+            if isinstance(cur_node, ConnectionNode):
+                cur_node.set_pressure(0, 'psi')
+            self.pipe_network.add_node(cur_node)
+        for length, diameter in ((10, 2.067), (5, 1.049)):
+            cur_pipe = Pipe()
+            cur_pipe.set_length(length, 'm')
+            cur_pipe.set_inner_diam(diameter, 'in')
+            cur_pipe.set_c_coefficient(120)
+            self.pipe_network.add_edge(cur_pipe)
+        nozzle = Nozzle()
+        nozzle.set_factor(5.6, 'gpm/psi^0.5')
+        nozzle.set_required_pressure(7, 'psi')
+        self.pipe_network.add_edge(nozzle)
+        self.connect_edge_to_up_node_and_down_node(0, 0, 1)
+        self.connect_edge_to_up_node_and_down_node(1, 1, 3)
+        self.connect_edge_to_up_node_and_down_node(2, 1, 2)
+
+    def test_dead_end_stub(self):
+        for solver_class in (UserSolver, GradientSolver):
+            self.set_stub_network('reservoir')
+            self.assertTrue(solver_class(self.pipe_network).solve_system())
+            stub_energy = self.pipe_network.node_at(3).get_energy('psi')
+            self.assertAlmostEqual(
+                stub_energy, self.pipe_network.node_at(1).get_energy('psi'))
+            self.assertAlmostEqual(
+                self.pipe_network.edge_at(1).get_vol_flow('gpm'), 0)
+        self.set_stub_network('input')
+        self.assertTrue(RemoteNozzleSolver(self.pipe_network).solve_system())
+        for index in (1, 3):
+            self.assertAlmostEqual(
+                self.pipe_network.node_at(index).get_pressure('psi'), 7)
+
+    def test_symmetric_ring(self):
+        for solver_class in (UserSolver, GradientSolver):
+            network = network_generator.multi_reservoir(1, 5)
+            self.assertTrue(solver_class(network).solve_system())
+            pressures = [node.get_pressure('psi')
+                         for node in network.get_nodes()]
+            self.assertTrue(np.isfinite(pressures).all())
+            self.assertAlmostEqual(pressures[1], pressures[4])
+            self.assertAlmostEqual(pressures[2], pressures[3])
+
+    def test_dead_end_stub_in_loop_object_path(self):
+        self.pipe_network = network_generator.gridded_system(3, 3)
+        stub = ConnectionNode()
+        stub.set_elevation(0, 'm')
+        stub.set_pressure(0, 'psi')
+        self.pipe_network.add_node(stub)
+        cur_pipe = Pipe()
+        cur_pipe.set_length(1, 'm')
+        cur_pipe.set_inner_diam(1.049, 'in')
+        cur_pipe.set_c_coefficient(120)
+        self.pipe_network.add_edge(cur_pipe)
+        stub_index = len(self.pipe_network.get_nodes()) - 1
+        edge_index = len(self.pipe_network.get_edges()) - 1
+        self.connect_edge_to_up_node_and_down_node(edge_index, 1, stub_index)
+        solver = UserSolver(self.pipe_network, compiled=False)
+        self.assertTrue(solver.solve_system())
+        self.assertAlmostEqual(stub.get_energy('psi'),
+                               self.pipe_network.node_at(1).get_energy('psi'))
+        self.assertAlmostEqual(cur_pipe.get_vol_flow('gpm'), 0)
+
     def connect_edge_to_up_node_and_down_node(self, edge_index, up_node,
                                               down_node):
         self.pipe_network.connect_node_downstream_edge(up_node, edge_index)
@@ -262,6 +671,88 @@ class ExampleTests(unittest.TestCase):
         self.connect_edge_to_up_node_and_down_node(4, 2, 5)
         self.connect_edge_to_up_node_and_down_node(5, 3, 6)
 
+    def test_remote_nozzle_sparse(self):
+        self.set_remote_3_nozzles_network()
+        three_nozzles = RemoteNozzleSolver(self.pipe_network, sparse=True)
+        three_nozzles.solve_system()
+        self.check_3_nozzles_nodes_pressure()
+        self.check_3_nozzles_edges_gpm_flow()
+
+    def test_remote_nozzle_governing_index(self):
+        self.set_remote_3_nozzles_network()
+        three_nozzles = RemoteNozzleSolver(self.pipe_network)
+        self.assertEqual(three_nozzles.rank_nozzles([3, 4, 5]), [5, 4, 3])
+        three_nozzles.solve_system()
+        self.assertEqual(three_nozzles.governing_history, [5])
+        self.assertEqual(three_nozzles.get_problem_size(), 5)
+        input_flow = self.pipe_network.node_at(0).get_output_flow('gpm')
+        self.assertAlmostEqual(input_flow, -30.5718, 4)
+
+    def test_rank_nozzles_on_tree(self):
+        network = network_generator.sprinkler_tree(3, 4, 'input')
+        solver = RemoteNozzleSolver(network)
+        nozzle_indexes = solver._nozzle_indexes()
+        ranking = solver.rank_nozzles(nozzle_indexes)
+        self.assertEqual(sorted(ranking), nozzle_indexes)
+        self.assertEqual(ranking[0], nozzle_indexes[-1])
+        self.assertEqual(ranking[-1], nozzle_indexes[0])
+        for branch in range(3):
+            line = nozzle_indexes[4 * branch:4 * branch + 4]
+            positions = [ranking.index(noz_index) for noz_index in line]
+            self.assertEqual(positions, sorted(positions, reverse=True))
+
+    def test_tree_solver(self):
+        self.set_remote_3_nozzles_network()
+        tree_solver = TreeSolver(self.pipe_network, collect_stats=True)
+        self.assertTrue(tree_solver.solve_system())
+        self.assertEqual(tree_solver.status, 'converged')
+        self.assertTrue(tree_solver.stats.converged)
+        self.assertEqual(tree_solver.governing_history, [5])
+        self.check_3_nozzles_nodes_pressure()
+        self.check_3_nozzles_edges_gpm_flow()
+        input_flow = self.pipe_network.node_at(0).get_output_flow('gpm')
+        self.assertAlmostEqual(input_flow, -30.5718, 4)
+
+    def test_tree_solver_matches_remote_nozzle_solver(self):
+        network = network_generator.sprinkler_tree(4, 5, 'input')
+        TreeSolver(network).solve_system()
+        tree_energies = [node.get_energy('psi')
+                         for node in network.get_nodes()]
+        RemoteNozzleSolver(network).solve_system()
+        for cont in range(len(tree_energies)):
+            self.assertAlmostEqual(tree_energies[cont],
+                                   network.node_at(cont).get_energy('psi'),
+                                   6)
+
+    def test_tree_solver_needs_a_tree(self):
+        self.set_reservoir_nozzles_network()
+        self.assertFalse(TreeSolver.supports(self.pipe_network))
+        network = network_generator.gridded_system(2, 2, 'input')
+        self.assertEqual(network.cyclomatic_number(), 1)
+        self.assertFalse(TreeSolver.supports(network))
+        with self.assertRaises(ValueError):
+            TreeSolver(network).solve_system()
+
+    def test_tree_solver_stops_after_max_sweeps(self):
+        network = network_generator.sprinkler_tree(4, 5, 'input')
+        max_sweeps = TreeSolver.MAX_SWEEPS
+        TreeSolver.MAX_SWEEPS = 1
+        try:
+            tree_solver = TreeSolver(network)
+            self.assertFalse(tree_solver.solve_system())
+        finally:
+            TreeSolver.MAX_SWEEPS = max_sweeps
+        self.assertEqual(tree_solver.status, 'max_iterations')
+        self.assertEqual(len(tree_solver.governing_history), 1)
+
+    def test_remote_solver_for_network(self):
+        tree = network_generator.sprinkler_tree(2, 3, 'input')
+        self.assertIs(type(RemoteNozzleSolver.for_network(tree)), TreeSolver)
+        grid = network_generator.gridded_system(2, 2, 'input')
+        solver = RemoteNozzleSolver.for_network(grid, sparse=True)
+        self.assertIs(type(solver), RemoteNozzleSolver)
+        self.assertTrue(solver.solve_system())
+
     def check_3_nozzles_nodes_pressure(self):
         checked_pressures = [31.4923, 27.3997, 25.5167, 25]
         for cont in range(4):
@@ -290,32 +781,6 @@ class NozzleNetworkTest(unittest.TestCase):
         self.end_node0.set_elevation(10, 'm')
         self.end_node0.name = 'end'
 
-    def test_delete_nozzle(self):
-        self.set_single_nozzle()
-        nozzle2 = Nozzle()
-        nozzle2.name = "nozzle2"
-        self.nozzle_network.add_edge(nozzle2)
-        self.nozzle_network.connect_node_downstream_edge(0, 1)
-        nozzle_solver = RemoteNozzleSolver(self.nozzle_network)
-        nozzle_solver.hold_nozzle(0)
-        self.assertEqual(len(self.nozzle_network.get_edges()), 1)
-        self.assert_nozzle_deletion(nozzle2, nozzle_solver)
-        nozzle_solver.reinsert_nozzle()
-        self.assert_nozzle_insertion()
-
-    def assert_nozzle_insertion(self):
-        self.assertEqual(len(self.nozzle_network.get_edges()), 2)
-        self.assertTrue(self.nozzle_network.edge_at(0) is self.nozzle0)
-        output_flow = self.nozzle_network.node_at(0).get_output_flow('gpm')
-        self.assertEqual(output_flow, 0)
-
-    def assert_nozzle_deletion(self, nozzle2, nozzle_solver):
-        self.assertEqual(nozzle_solver.detached_nozzle_index, 0)
-        input_node = self.nozzle_network.node_at(0)
-        self.assertEqual(input_node.get_output_pipes(), [nozzle2])
-        self.assertEqual(input_node.get_output_flow('gpm'), 10)
-        self.assertEqual(input_node.get_pressure('psi'), 25)
-
     def test_single_nozzle(self):
         self.set_single_nozzle()
         nozzle_solver = RemoteNozzleSolver(self.nozzle_network)
@@ -352,6 +817,7 @@ class NozzleNetworkTest(unittest.TestCase):
         self.nozzle_network.connect_node_upstream_edge(2, 1)
         nozzle_solver = RemoteNozzleSolver(self.nozzle_network)
         nozzle_solver.solve_system()
+        self.assertEqual(nozzle_solver.governing_history, [1])
         self.check_nozzle_flow(1, 6)
         self.check_nozzle_flow(0, 12)
         self.assertEqual(self.input_node.get_output_flow('gpm'), -18)
@@ -375,6 +841,27 @@ class NozzleNetworkTest(unittest.TestCase):
         self.assertAlmostEqual(self.input_node.get_output_flow('gpm'), -15)
         self.assertEqual(self.input_node.get_pressure('psi'), 25)
 
+    def test_tree_solver_nozzles(self):
+        self.set_single_nozzle()
+        nozzle_solver = TreeSolver(self.nozzle_network)
+        nozzle_solver.solve_system()
+        self.check_nozzle_flow(0, 10)
+        self.assertAlmostEqual(self.input_node.get_output_flow('gpm'), -10)
+        end_node1 = EndNode()
+        end_node1.set_elevation(10, 'm')
+        self.nozzle_network.add_node(end_node1)
+        nozzle1 = Nozzle()
+        nozzle1.set_factor(1, 'gpm/psi^0.5')
+        nozzle1.set_required_pressure(36, 'psi')
+        self.nozzle_network.add_edge(nozzle1)
+        self.nozzle_network.connect_node_downstream_edge(0, 1)
+        self.nozzle_network.connect_node_upstream_edge(2, 1)
+        nozzle_solver.solve_system()
+        self.assertEqual(nozzle_solver.governing_history, [1])
+        self.check_nozzle_flow(1, 6)
+        self.check_nozzle_flow(0, 12)
+        self.assertAlmostEqual(self.input_node.get_output_flow('gpm'), -18)
+
     def test_double_input(self):
         self.set_single_nozzle()
         input2 = InputNode()
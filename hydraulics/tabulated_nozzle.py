@@ -0,0 +1,115 @@
+"""Nozzles whose factor drifts with the pressure across them.
+
+A :class:`TabulatedNozzle` reads its factor from a :class:`FactorTable`,
+which is how :mod:`branch_reduction` stands a whole branch line for a
+single emitter.
+
+"""
+from bisect import bisect_right
+from math import exp, log, sqrt
+
+from edges import Edge, Nozzle
+
+
+class FactorTable(object):
+    """
+    Factor of an equivalent emitter against the pressure across it, as
+    ln K over ln P with its slope at every point, read through cubic
+    hermite interpolation. Pressures outside the table extend the end
+    slopes
+    """
+    def __init__(self, log_pressures, log_factors, slopes):
+        assert len(log_pressures) > 1
+        self.log_pressures = log_pressures
+        self.log_factors = log_factors
+        self.slopes = slopes
+
+    def factor(self, pressure):
+        """
+        :param pressure: positive pressure in psi
+        :return: factor (gpm/psi^0.5) and its derivative with respect to
+            the pressure
+        """
+        position = log(pressure)
+        index = bisect_right(self.log_pressures, position) - 1
+        if index < 0 or index >= len(self.log_pressures) - 1:
+            index = 0 if index < 0 else len(self.log_pressures) - 1
+            slope = self.slopes[index]
+            log_factor = (self.log_factors[index] + slope *
+                          (position - self.log_pressures[index]))
+        else:
+            width = self.log_pressures[index + 1] - self.log_pressures[index]
+            t = (position - self.log_pressures[index]) / width
+            start, end = self.log_factors[index], self.log_factors[index + 1]
+            start_slope = self.slopes[index] * width
+            end_slope = self.slopes[index + 1] * width
+            log_factor = (start * (2 * t ** 3 - 3 * t ** 2 + 1) +
+                          start_slope * (t ** 3 - 2 * t ** 2 + t) +
+                          end * (3 * t ** 2 - 2 * t ** 3) +
+                          end_slope * (t ** 3 - t ** 2))
+            slope = (start * (6 * t ** 2 - 6 * t) +
+                     start_slope * (3 * t ** 2 - 4 * t + 1) +
+                     end * (6 * t - 6 * t ** 2) +
+                     end_slope * (3 * t ** 2 - 2 * t)) / width
+        k_factor = exp(log_factor)
+        return k_factor, k_factor * slope / pressure
+
+
+class TabulatedNozzle(Nozzle):
+    """
+    Nozzle whose factor follows a :class:`FactorTable` instead of staying
+    fixed. Its factor, as given by :func:`get_factor`, is the one at the
+    required pressure
+    """
+    def __init__(self, table):
+        super(TabulatedNozzle, self).__init__()
+        self.table = table
+
+    def _head_flow(self, energy_diff):
+        """
+        :return: flow and its derivative with respect to the energy
+            difference
+        """
+        head = abs(energy_diff)
+        k_factor, k_slope = self.table.factor(head)
+        root = sqrt(head)
+        flow = k_factor * root
+        if energy_diff < 0:
+            flow = -flow
+        return flow, k_slope * root + 0.5 * k_factor / root
+
+    def _energy_diff(self):
+        return (self.input_node.get_energy('psi') -
+                self.output_node.get_energy('psi'))
+
+    def calculate_gpm_flow(self):
+        energy_diff = self._energy_diff()
+        if abs(energy_diff) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(energy_diff)[0]
+        q_flow = self._head_flow(energy_diff)[0]
+        self.set_vol_flow(q_flow, 'gpm')
+        return q_flow
+
+    def get_node_jacobian(self, node):
+        energy_diff = self._energy_diff()
+        if self.input_node != node:
+            return 0
+        if energy_diff == 0:
+            return float('inf')
+        return self._head_flow(energy_diff)[1]
+
+    def get_flow_and_slopes(self):
+        energy_diff = self._energy_diff()
+        if abs(energy_diff) < Edge.HEAD_FLOOR:
+            return self._floored_flow_and_slopes(energy_diff)
+        q_flow, slope = self._head_flow(energy_diff)
+        self.set_vol_flow(q_flow, 'gpm')
+        return q_flow, slope, -slope
+
+    def get_conductance(self, head):
+        return self.table.factor(head)[0] / sqrt(head)
+
+    def set_required_pressure(self, value, unit):
+        super(TabulatedNozzle, self).set_required_pressure(value, unit)
+        k_factor = self.table.factor(self.get_required_pressure('psi'))[0]
+        self.set_factor(k_factor, 'gpm/psi^0.5')